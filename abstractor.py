@@ -1,41 +1,114 @@
-from openai import OpenAI
-import os
 import time
 import logging
-import random
-from typing import List, Optional
-from dotenv import load_dotenv
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, as_completed, wait
+from typing import Dict, List, Optional, Tuple, Union
+from clue_bank import ClueBank, DEFAULT_CLUE_BANK_DB, params_key
+from clue_backends import ClueBackend, LocalClueBackend, DEFAULT_BACKEND, OPENAI_BACKEND, create_backend
+from metrics import LatencyHistogram
+from rate_limit import TokenBucket
 
 RETRIES = 3
 DEFAULT_MODEL = "gpt-4"
+DEFAULT_MAX_TOKENS = 20
+DEFAULT_TEMPERATURE = 0.9
+DEFAULT_TOP_P = 0.8
+DEFAULT_SOFT_DEADLINE = 2.5
+DEFAULT_HARD_DEADLINE = 8.0
+DEFAULT_CANDIDATE_CLUES = 8
+DEFAULT_CONCURRENT_CLUES = 4
 
 logger = logging.getLogger('text_processing')
 
 class Abstractor:
-    def __init__(self, api_key: Optional[str] = None, model_name: str = DEFAULT_MODEL):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            logger.error("API key is required for OpenAI.")
-            raise ValueError("API key is required for OpenAI")
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_name: str = DEFAULT_MODEL,
+        base_url: Optional[str] = None,
+        clue_bank: Optional[ClueBank] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        backend: Union[str, ClueBackend, None] = None,
+        similarity=None,
+        nlp=None,
+        soft_deadline: Optional[float] = DEFAULT_SOFT_DEADLINE,
+        hard_deadline: Optional[float] = DEFAULT_HARD_DEADLINE,
+        max_concurrent_clues: int = DEFAULT_CONCURRENT_CLUES
+    ):
+        """
+        Initialize the Abstractor.
+
+        Args:
+            api_key (Optional[str]): OpenAI API key. Defaults to the OPENAI_API_KEY environment variable.
+            model_name (str): The chat model used to generate clues.
+            base_url (Optional[str]): Alternative API endpoint, e.g. a local stand-in server for tests.
+            clue_bank (Optional[ClueBank]): Pre-generated clues to sample from before calling the backend.
+                Defaults to the bank in data/json if it has been built.
+            rate_limiter (Optional[TokenBucket]): Shared limiter acquired before every OpenAI request.
+            backend (Union[str, ClueBackend, None]): A backend instance, or "openai" / "local".
+                Defaults to the ABSTRACTOR_BACKEND environment variable, else "openai".
+            similarity: ImageTextSimilarity used by the local backend to rank words.
+            nlp: spaCy pipeline used by the local backend.
+            soft_deadline (Optional[float]): Seconds after which a hedged second request is sent.
+                None disables hedging.
+            hard_deadline (Optional[float]): Seconds after which a locally built clue is returned.
+                None waits for the backend indefinitely.
+            max_concurrent_clues (int): Backend clue requests handled at once; more callers wait
+                before their deadlines start.
+        """
+        if not isinstance(backend, ClueBackend):
+            name = backend or DEFAULT_BACKEND
+            if name == OPENAI_BACKEND:
+                backend = create_backend(
+                    name, api_key=api_key, model_name=model_name, base_url=base_url, rate_limiter=rate_limiter
+                )
+            else:
+                backend = create_backend(name, similarity=similarity, nlp=nlp)
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.clue_bank = clue_bank or ClueBank.open_if_exists(DEFAULT_CLUE_BANK_DB)
+        self.fallback_backend = (
+            backend if isinstance(backend, LocalClueBackend) else LocalClueBackend(similarity=similarity, nlp=nlp)
+        )
+        self.soft_deadline = soft_deadline
+        self.hard_deadline = hard_deadline
+        self.time_to_clue = LatencyHistogram()
+        self.clue_sources: Counter = Counter()
+        # Each request in flight has a worker for its primary and one for its hedge, so no
+        # time spent queueing for a worker counts toward the soft and hard deadlines.
+        self._request_slots = threading.BoundedSemaphore(max_concurrent_clues)
+        self._pool_size = 2 * max_concurrent_clues
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cancel_events: set = set()
+        self._executor_lock = threading.Lock()
+        logger.info(f"Abstractor initialized with {type(backend).__name__} and model: {self.model_name}")
 
-        self.model_name = model_name
-        logger.info(f"Abstractor initialized with model: {self.model_name}")
+    @staticmethod
+    def clue_params(
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P
+    ) -> str:
+        """Return the clue bank key for a set of generation parameters."""
+        return params_key(max_tokens=max_tokens, temperature=temperature, top_p=top_p)
 
     def generate_creative_abstract(
         self,
         description: str,
         other_cards: Optional[List[str]] = None,
         banned_phrases: Optional[List[str]] = None,
-        max_tokens: int = 20,
-        temperature: float = 0.9,
-        top_p: float = 0.8
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P
     ) -> str:
         """
         Generate a creative and abstract clue for a given description.
 
+        Clues are drawn from the clue bank when it holds unused ones for this
+        description and parameters; the backend is only called once it runs dry,
+        and only within the soft/hard latency budget (see _generate_within_budget).
+
         Args:
             description (str): The main description for which the clue is generated.
             other_cards (Optional[List[str]]): Descriptions of other cards, if any.
@@ -47,10 +120,107 @@ class Abstractor:
         Returns:
             str: A creative and abstract clue.
         """
+        start_time = time.perf_counter()
+        if banned_phrases is None:
+            banned_phrases = ["whispers of grace"]
+
+        clue, source = self._draw_from_bank(description, banned_phrases, max_tokens, temperature, top_p), "bank"
+        if clue is None:
+            clue, source = self._generate_within_budget(description, banned_phrases, max_tokens, temperature, top_p)
+
+        self.time_to_clue.record(time.perf_counter() - start_time)
+        self.clue_sources[source] += 1
+        return clue
+
+    def candidate_clues(
+        self,
+        description: str,
+        count: int = DEFAULT_CANDIDATE_CLUES,
+        banned_phrases: Optional[List[str]] = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P
+    ) -> List[str]:
+        """
+        Return up to `count` distinct candidate clues for a description, best source first.
+
+        Undrawn clue bank clues come first; the backend is only asked, within
+        the latency budget, when the bank has none. The local backend fills up
+        the rest, so candidates never cost more than one backend round trip.
+        Nothing is drawn from the bank here: pass the chosen candidate to
+        mark_used() once the clue is actually played.
+        """
         if banned_phrases is None:
             banned_phrases = ["whispers of grace"]
+        start_time = time.perf_counter()
+        candidates, source = [], "bank"
+        if self.clue_bank is not None:
+            params = self.clue_params(max_tokens, temperature, top_p)
+            candidates = [
+                clue for clue in self.clue_bank.undrawn(description, self.model_name, params)
+                if self._is_allowed(clue, banned_phrases)
+            ]
+        if not candidates:
+            clue, source = self._generate_within_budget(description, banned_phrases, max_tokens, temperature, top_p)
+            candidates = [clue]
+        self.time_to_clue.record(time.perf_counter() - start_time)
+        self.clue_sources[source] += 1
+
+        candidates = list(dict.fromkeys(candidates))
+        if len(candidates) < count:
+            try:
+                local = self.fallback_backend.generate_clues(description, count - len(candidates), temperature)
+                candidates = list(dict.fromkeys(candidates + local))
+            except Exception as e:
+                logger.error(f"Local candidate clue generation failed: {e}")
+        return candidates[:count]
+
+    def mark_used(
+        self,
+        description: str,
+        clue: str,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P
+    ):
+        """Mark the clue chosen from candidate_clues as drawn, so banked clues aren't offered again."""
+        if self.clue_bank is not None and clue:
+            self.clue_bank.mark_drawn(description, self.model_name, self.clue_params(max_tokens, temperature, top_p), clue)
+
+    def _draw_from_bank(
+        self,
+        description: str,
+        banned_phrases: List[str],
+        max_tokens: int,
+        temperature: float,
+        top_p: float
+    ) -> Optional[str]:
+        if self.clue_bank is None:
+            return None
+        params = self.clue_params(max_tokens, temperature, top_p)
+        while True:
+            banked_clue = self.clue_bank.draw(description, self.model_name, params)
+            if banked_clue is None:
+                return None
+            if self._is_allowed(banked_clue, banned_phrases):
+                logger.info("Clue drawn from the clue bank.")
+                return banked_clue
 
-        other_cards_description = " | ".join(other_cards or [])
+    def _generate_from_backend(
+        self,
+        description: str,
+        banned_phrases: List[str],
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        cancelled: Optional[threading.Event] = None
+    ) -> Optional[str]:
+        """
+        Ask the backend for a clue, retrying on banned phrases. Returns None on failure.
+
+        Once `cancelled` is set no further attempts are made, so a request that
+        lost the hedge race or was abandoned stops spending API calls.
+        """
         prompt = (
             f"You are a storyteller in a creative and abstract game called Dixit. Your goal is to give a clue for "
             f"the following image description: '{description}'. The clue should be poetic, abstract, and evocative, "
@@ -59,43 +229,179 @@ class Abstractor:
         )
 
         for attempt in range(RETRIES):
+            if cancelled is not None and cancelled.is_set():
+                return None
             try:
-                logger.debug(f"Attempt {attempt + 1} to generate a clue.")
-                response = client.chat.completions.create(model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p)
-                generated_clue = response.choices[0].message.content.strip()
-
-                if all(
-                    banned.lower() not in generated_clue.lower()
-                    for banned in banned_phrases
-                ):
+                generated_clue = self.backend.generate(prompt, description, max_tokens, temperature, top_p)
+
+                if self._is_allowed(generated_clue, banned_phrases):
                     logger.info("Clue generated successfully.")
                     return generated_clue
                 else:
                     logger.warning(f"Generated clue contained banned phrases: {generated_clue}")
 
+            except Exception as e:
+                logger.error(f"An error occurred while generating a clue: {e}")
+                return None
 
-            except OpenAI.RateLimitError:
-                if attempt < RETRIES - 1:
-                    wait_time = 2 ** attempt + random.uniform(0, 1)
-                    logger.warning(
-                        f"Rate limit exceeded. Retrying in {wait_time:.2f} seconds..."
-                    )
-                    time.sleep(wait_time)
-                else:
-                    logger.error("Rate limit exceeded after multiple retries.")
-                    raise
-            except OpenAI.APIStatusError as e:
-                logger.error(f"OpenAI API error occurred: {e}")
-                if attempt == RETRIES - 1:
-                    return "Abstract Clue"
+        logger.warning("No acceptable clue after all retries.")
+        return None
 
-            except Exception as e:
-                logger.error(f"An unexpected error occurred: {e}")
-                return "Abstract Clue"
+    def _generate_within_budget(
+        self,
+        description: str,
+        banned_phrases: List[str],
+        max_tokens: int,
+        temperature: float,
+        top_p: float
+    ) -> Tuple[str, str]:
+        """
+        Get a clue from the backend within the latency budget.
+
+        If the first request hasn't answered by the soft deadline, a hedged
+        second request is sent and whichever answers first wins. At the hard
+        deadline, or if the backend fails, a clue is built locally from the
+        caption instead. Callers beyond max_concurrent_clues wait for a free
+        slot before their deadlines start.
+
+        Returns:
+            The clue and where it came from: "primary", "hedge" or "fallback".
+        """
+        if self.backend is self.fallback_backend:
+            clue = self._generate_from_backend(description, banned_phrases, max_tokens, temperature, top_p)
+            return (clue, "primary") if clue else (self._local_clue(description, temperature), "fallback")
+
+        self._request_slots.acquire()
+        cancelled = threading.Event()
+        args = (description, banned_phrases, max_tokens, temperature, top_p, cancelled)
+        futures: Dict[Future, str] = {}
+        start_time = time.perf_counter()
+        try:
+            executor = self._request_executor(cancelled)
+            primary = executor.submit(self._generate_from_backend, *args)
+            futures[primary] = "primary"
+            if self.soft_deadline is not None and not wait([primary], timeout=self.soft_deadline).done:
+                logger.info(f"No clue after {self.soft_deadline:.1f}s; sending a hedged request.")
+                futures[executor.submit(self._generate_from_backend, *args)] = "hedge"
+
+            remaining = None
+            if self.hard_deadline is not None:
+                remaining = max(0.0, self.hard_deadline - (time.perf_counter() - start_time))
+            for future in as_completed(futures, timeout=remaining):
+                clue = future.result()
+                if clue:
+                    return clue, futures[future]
+        except TimeoutError:
+            logger.warning(f"No clue within the {self.hard_deadline:.1f}s deadline; building one locally.")
+        except RuntimeError as e:
+            # close() shut the pool down while this request was in flight.
+            logger.warning(f"Clue request interrupted: {e}")
+        finally:
+            # The losing or abandoned request stops retrying, and a queued one never starts.
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+            self._release_slot_when_done(list(futures), cancelled)
+
+        return self._local_clue(description, temperature), "fallback"
+
+    def _request_executor(self, cancelled: threading.Event) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix="clue-request")
+            self._cancel_events.add(cancelled)
+            return self._executor
+
+    def _release_slot_when_done(self, futures: List[Future], cancelled: threading.Event):
+        """Free a request slot once all of its futures have finished, so its workers are really free again."""
+        def release():
+            with self._executor_lock:
+                self._cancel_events.discard(cancelled)
+            self._request_slots.release()
+
+        if not futures:
+            release()
+            return
+        lock = threading.Lock()
+        outstanding = [len(futures)]
+
+        def finished(_):
+            with lock:
+                outstanding[0] -= 1
+                if outstanding[0]:
+                    return
+            release()
+
+        for future in futures:
+            future.add_done_callback(finished)
+
+    def close(self):
+        """
+        Stop the clue requests still in flight and release their worker threads.
+
+        Abstractors are shared by every bot in a process, so a later request
+        simply starts a new pool.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+            for cancelled in self._cancel_events:
+                cancelled.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _local_clue(self, description: str, temperature: float) -> str:
+        try:
+            return self.fallback_backend.generate_clues(description, 1, temperature)[0]
+        except Exception as e:
+            logger.error(f"Local clue generation failed: {e}")
+            return "Fallback Clue"
+
+    def latency_summary(self) -> Dict[str, object]:
+        """Return time-to-clue percentiles and how many clues came from each source."""
+        return {"time_to_clue": self.time_to_clue.summary(), "sources": dict(self.clue_sources)}
+
+    def generate_clue_batch(
+        self,
+        descriptions: List[str],
+        clues_per_card: int,
+        banned_phrases: Optional[List[str]] = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P
+    ) -> List[List[str]]:
+        """
+        Generate several distinct clues for each of several descriptions in one request.
+
+        Args:
+            descriptions (List[str]): The image descriptions to write clues for.
+            clues_per_card (int): Number of clues wanted per description.
+            banned_phrases (Optional[List[str]]): Phrases that should be avoided in the clues.
+            max_tokens (int): Token budget per clue; the request budget is scaled from it.
+            temperature (float): Sampling temperature.
+            top_p (float): Nucleus sampling.
+
+        Returns:
+            List[List[str]]: The clues for each description, in input order.
+        """
+        if banned_phrases is None:
+            banned_phrases = ["whispers of grace"]
+
+        numbered = "\n".join(f"{i + 1}. {description}" for i, description in enumerate(descriptions))
+        prompt = (
+            f"You are a storyteller in a creative and abstract game called Dixit. For each of the numbered image "
+            f"descriptions below, give {clues_per_card} different clues. Each clue should be poetic, abstract, and "
+            f"evocative, yet concise and complete: a unique phrase or word (1-3 words) that captures the essence of "
+            f"the card while making it challenging for others to guess correctly. Avoid common phrases or too obvious "
+            f"clues, and make the clues for the same description differ from each other.\n\n"
+            f"{numbered}\n\n"
+            f"Answer with exactly one line per description, in the form '<number>: clue | clue | ...'."
+        )
+        batches = self.backend.generate_batch(prompt, descriptions, clues_per_card, max_tokens, temperature, top_p)
+        return [
+            [clue for clue in dict.fromkeys(clues) if clue and self._is_allowed(clue, banned_phrases)]
+            for clues in batches
+        ]
 
-        logger.warning("Returning fallback clue after all retries.")
-        return "Fallback Clue"
+    @staticmethod
+    def _is_allowed(clue: str, banned_phrases: List[str]) -> bool:
+        return all(banned.lower() not in clue.lower() for banned in banned_phrases)
@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import zlib
+import platform
+import numpy as np
+import torch
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('benchmark')
+
+CARDS_DIRECTORY = "data/images/cards"
+DEFAULT_BATCH_SIZES = [1, 4, 16]
+DEFAULT_WARMUP = 3
+DEFAULT_REPEATS = 20
+DEFAULT_OUTPUT = "bench_results.json"
+BENCHMARK_CLUES = [
+    "silent longing", "a journey home", "forgotten dream", "fragile balance",
+    "midnight escape", "golden memory", "restless wonder", "hidden shelter",
+]
+# open_clip's CLIP normalization, so the stand-in preprocesses exactly like the real transform.
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+START_TOKEN, END_TOKEN = 49406, 49407
+
+
+class TinyClipStandIn(torch.nn.Module):
+    """
+    A few-layer model exposing the open_clip CoCa interface used by the game.
+
+    Lets the benchmark (and CI) exercise every hot path without downloading
+    or loading ViT-L-14 weights.
+    """
+
+    def __init__(self, embed_dim: int = 64, vocab_size: int = 49408, caption_length: int = 12):
+        super().__init__()
+        self.visual = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 32, kernel_size=16, stride=16),
+            torch.nn.GELU(),
+            torch.nn.AdaptiveAvgPool2d(1),
+            torch.nn.Flatten(),
+            torch.nn.Linear(32, embed_dim),
+        )
+        self.token_embedding = torch.nn.Embedding(vocab_size, 32)
+        self.text_projection = torch.nn.Linear(32, embed_dim)
+        self.caption_head = torch.nn.Linear(embed_dim, vocab_size)
+        self.caption_length = caption_length
+
+    def encode_image(self, image: torch.Tensor, normalize: bool = False) -> torch.Tensor:
+        features = self.visual(image)
+        return torch.nn.functional.normalize(features, dim=-1) if normalize else features
+
+    def encode_text(self, text: torch.Tensor, normalize: bool = False) -> torch.Tensor:
+        features = self.text_projection(self.token_embedding(text).mean(dim=1))
+        return torch.nn.functional.normalize(features, dim=-1) if normalize else features
+
+    def generate(self, image: torch.Tensor, **kwargs) -> torch.Tensor:
+        logits = self.caption_head(self.encode_image(image))
+        # Skip the special tokens at the top of the vocabulary.
+        tokens = logits[:, :49400].topk(self.caption_length, dim=-1).indices
+        start = torch.full((image.shape[0], 1), 49406, dtype=tokens.dtype)
+        end = torch.full((image.shape[0], 1), 49407, dtype=tokens.dtype)
+        return torch.cat([start, tokens, end], dim=1)
+
+
+def _to_rgb(image):
+    return image.convert("RGB")
+
+
+class StandInTokenizer:
+    """Hashes whitespace-separated words to token ids; enough for timing without open_clip."""
+
+    context_length = 77
+
+    def __call__(self, texts) -> torch.Tensor:
+        if isinstance(texts, str):
+            texts = [texts]
+        tokens = torch.zeros((len(texts), self.context_length), dtype=torch.long)
+        for row, text in enumerate(texts):
+            ids = [zlib.crc32(word.encode("utf-8")) % 49400 for word in text.lower().split()]
+            ids = [START_TOKEN] + ids[:self.context_length - 2] + [END_TOKEN]
+            tokens[row, :len(ids)] = torch.tensor(ids)
+        return tokens
+
+    @staticmethod
+    def decode(tokens: torch.Tensor) -> str:
+        names = {START_TOKEN: "<start_of_text>", END_TOKEN: "<end_of_text>"}
+        return " ".join(names.get(token, f"word{token}") for token in tokens.tolist() if token)
+
+
+class StandInNLP:
+    """Whitespace stand-in for a spaCy pipeline: lowercased words are their own lemmas, and none are stop words."""
+
+    pipe_names: List[str] = []
+
+    def __call__(self, text: str):
+        return [SimpleNamespace(lemma_=word.lower(), is_alpha=word.isalpha(), is_stop=False) for word in text.split()]
+
+    def pipe(self, texts, disable=(), batch_size=None):
+        return [self(text) for text in texts]
+
+
+class StandInModelManager:
+    """Duck-typed ModelManager serving TinyClipStandIn on the CPU, without open_clip or a spaCy model."""
+
+    def __init__(self):
+        from torchvision import transforms as T
+
+        torch.manual_seed(0)
+        self.model_name = "tiny-standin"
+        self.pretrained = "none"
+        self.quantize = False
+        self.precision = "fp32"
+        self.device = torch.device("cpu")
+        self.model = TinyClipStandIn().eval()
+        self.transform = T.Compose([
+            T.Resize(224, interpolation=T.InterpolationMode.BICUBIC),
+            T.CenterCrop(224),
+            T.Lambda(_to_rgb),
+            T.ToTensor(),
+            T.Normalize(CLIP_MEAN, CLIP_STD),
+        ])
+        self.tokenizer = StandInTokenizer()
+        self.nlp = StandInNLP()
+
+    def get_model(self):
+        return self.model
+
+    def get_transform(self):
+        return self.transform
+
+    def get_tokenizer(self):
+        return self.tokenizer
+
+    def get_decoder(self):
+        return self.tokenizer.decode
+
+    def get_device(self):
+        return self.device
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in MiB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return 0.0
+
+
+def time_case(fn: Callable[[], object], warmup: int, repeats: int) -> Dict[str, float]:
+    """Run `fn` warmup + repeats times and return latency percentiles in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.asarray(samples)
+    return {
+        "repeats": repeats,
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _build_components(model_manager):
+    """Build the similarity engine, caption generator and two bots for benchmarking."""
+    from abstractor import Abstractor
+    from generate_image_caption import ImageCaptionGenerator
+    from players import Bot
+    from resources import ResourceRegistry, get_similarity, get_spacy_pipeline
+    from similarity import ImageTextSimilarity
+    from text_cache import TextFeatureCache
+    from text_processor import TextProcessor
+
+    registry = ResourceRegistry()
+    # The stand-in brings its own whitespace pipeline, so --standin needs no spaCy model.
+    nlp = model_manager.nlp if isinstance(model_manager, StandInModelManager) else get_spacy_pipeline()
+    registry.get("text_processor", lambda: TextProcessor(nlp_model=nlp))
+    similarity = registry.get(
+        f"similarity:{model_manager.model_name}:{model_manager.pretrained}",
+        lambda: ImageTextSimilarity(
+            model_manager,
+            text_cache=TextFeatureCache(model_manager.model_name, model_manager.pretrained)
+        )
+    )
+    # Clues come from the local backend so a bot turn never touches the network.
+    registry.get("abstractor", lambda: Abstractor(
+        backend="local", similarity=get_similarity(model_manager), nlp=nlp
+    ))
+    caption_generator = ImageCaptionGenerator(model_manager)
+    story_bot = Bot(name="Benchmark storyteller", model_manager=model_manager, prefetch_workers=1)
+    guess_bot = Bot(name="Benchmark guesser", model_manager=model_manager, prefetch_workers=1)
+    return similarity, caption_generator, story_bot, guess_bot
+
+
+def _simulated_round(story_bot, guess_bot, deck: List[str], hand_size: int, rng: random.Random):
+    """Play one main.py-style round: storyteller clue, guesser picks cards, both vote."""
+    cards = rng.sample(deck, hand_size + 1)
+    story_bot.hand = [cards[0]]
+    guess_bot.hand = cards[1:]
+    story_card, clue = story_bot.storyteller_turn()
+    selected = guess_bot.choose_card_based_on_clue(clue)
+    table = [story_card] + [card for _, card in selected]
+    rng.shuffle(table)
+    guess_bot.vote(table, clue)
+    rng.randrange(len(table))  # scripted stand-in for the human vote
+
+
+def default_threads() -> List[int]:
+    """Thread counts benchmarked by default: single-threaded and torch's current setting."""
+    return sorted({1, torch.get_num_threads()})
+
+
+def run_benchmarks(
+    model_manager,
+    batch_sizes: List[int] = DEFAULT_BATCH_SIZES,
+    threads: Optional[List[int]] = None,
+    warmup: int = DEFAULT_WARMUP,
+    repeats: int = DEFAULT_REPEATS,
+    cases: Optional[List[str]] = None
+) -> List[Dict[str, object]]:
+    """
+    Time the inference hot paths at every batch size and thread count.
+
+    Args:
+        model_manager: ModelManager or StandInModelManager serving the model.
+        batch_sizes: Number of images/texts/cards per call.
+        threads: torch intra-op thread counts to try. Defaults to default_threads().
+        warmup: Untimed calls before measuring.
+        repeats: Timed calls per configuration.
+        cases: Subset of case names to run. Defaults to all.
+
+    Returns:
+        One result row per (case, batch size, thread count).
+    """
+    from text_cache import TextFeatureCache
+    from embedding_index import list_card_images
+
+    threads = threads or default_threads()
+    similarity, caption_generator, story_bot, guess_bot = _build_components(model_manager)
+    deck = list_card_images(CARDS_DIRECTORY)
+    rng = random.Random(0)
+    # Cold text tower and visual tower: no cache or index hits while timing encoders.
+    cold_text_cache = TextFeatureCache(model_manager.model_name, model_manager.pretrained, max_entries=0)
+
+    def encode_image(b):
+        index, similarity.embedding_index = similarity.embedding_index, None
+        try:
+            similarity.encode_images(deck[:b])
+        finally:
+            similarity.embedding_index = index
+
+    def encode_text(b):
+        cache, similarity.text_cache = similarity.text_cache, cold_text_cache
+        try:
+            similarity.encode_texts((BENCHMARK_CLUES * b)[:b])
+        finally:
+            similarity.text_cache = cache
+
+    def compare_image_and_text(b):
+        for card in deck[:b]:
+            similarity.compare_image_and_text(card, BENCHMARK_CLUES[0])
+
+    def score_cards(b):
+        similarity.score_cards(deck[:b], BENCHMARK_CLUES[0])
+
+    def generate_caption(b):
+        caption_generator.batch_size = b
+        caption_generator.generate_captions(deck[:b])
+
+    def bot_vote(b):
+        guess_bot.vote(deck[:max(b, 2)], BENCHMARK_CLUES[0])
+
+    def simulated_round(b):
+        _simulated_round(story_bot, guess_bot, deck, max(b, 5), rng)
+
+    all_cases = {
+        "encode_image": encode_image,
+        "encode_text": encode_text,
+        "compare_image_and_text": compare_image_and_text,
+        "score_cards": score_cards,
+        "generate_caption": generate_caption,
+        "bot_vote": bot_vote,
+        "simulated_round": simulated_round,
+    }
+    selected = {name: fn for name, fn in all_cases.items() if not cases or name in cases}
+
+    results = []
+    original_threads = torch.get_num_threads()
+    try:
+        for thread_count in threads:
+            torch.set_num_threads(thread_count)
+            for name, fn in selected.items():
+                for b in batch_sizes:
+                    row = {"case": name, "batch_size": b, "threads": thread_count}
+                    with torch.no_grad():
+                        row.update(time_case(lambda: fn(b), warmup, repeats))
+                    logger.info(
+                        f"{name:<24} batch={b:<3} threads={thread_count:<3} "
+                        f"p50={row['p50_ms']:.2f}ms p95={row['p95_ms']:.2f}ms p99={row['p99_ms']:.2f}ms"
+                    )
+                    results.append(row)
+    finally:
+        torch.set_num_threads(original_threads)
+        story_bot.close()
+        guess_bot.close()
+    return results
+
+
+def write_results(results: List[Dict[str, object]], output_file: str, model_manager):
+    """Write results plus run metadata as JSON."""
+    payload = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_name": model_manager.model_name,
+            "pretrained": model_manager.pretrained,
+            "device": str(model_manager.get_device()),
+            "torch_version": torch.__version__,
+            "python_version": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(output_file, "w") as f:
+        json.dump(payload, f, indent=4)
+    logger.info(f"Benchmark results written to {output_file}.")
+
+
+def compare_results(baseline_file: str, current_file: str, tolerance: float = 0.10) -> List[str]:
+    """
+    Compare two result files and return the configurations whose p50 regressed.
+
+    Args:
+        baseline_file: Earlier benchmark output.
+        current_file: New benchmark output.
+        tolerance: Allowed relative slowdown before a row counts as a regression.
+    """
+    def load(path):
+        with open(path, "r") as f:
+            return {(r["case"], r["batch_size"], r["threads"]): r for r in json.load(f)["results"]}
+
+    baseline, current = load(baseline_file), load(current_file)
+    regressions = []
+    for key, row in current.items():
+        before = baseline.get(key)
+        if before and row["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{key[0]} batch={key[1]} threads={key[2]}: "
+                f"p50 {before['p50_ms']:.2f}ms -> {row['p50_ms']:.2f}ms"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Latency benchmarks for the inference hot paths.")
+    parser.add_argument("--standin", action="store_true", help="Use a tiny stand-in model (offline, for CI).")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="Defaults to 1 and all available threads.")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--cases", nargs="+", default=None)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=None, help="Earlier results file to check for regressions.")
+    args = parser.parse_args()
+
+    if args.standin:
+        manager = StandInModelManager()
+    else:
+        from model_manager import ModelManager
+        manager = ModelManager()
+
+    results = run_benchmarks(manager, args.batch_sizes, args.threads, args.warmup, args.repeats, args.cases)
+    write_results(results, args.output, manager)
+
+    if args.baseline:
+        regressions = compare_results(args.baseline, args.output)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,136 @@
+import os
+import re
+import csv
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('caption_store')
+
+DEFAULT_CAPTION_CSV = "cache.csv"
+DEFAULT_CAPTION_JSON = "data/json/cards_captions.json"
+
+# cache.csv was written by concatenating the directory and file name without a
+# separator, so "data/images/cards/card_00001.jpg" appears as "data/images/cardscard_00001.jpg".
+_GLUED_CARDS_DIR = re.compile(r"^cards(?=card_)")
+
+
+def canonical_card_key(path: str) -> str:
+    """
+    Return the canonical identity of a card: its file name.
+
+    Card file names are unique across the deck, while the directory prefixes
+    recorded in cache.csv, cards_captions.json and the live deck all differ.
+    """
+    name = os.path.basename(os.path.normpath(path.strip()))
+    return _GLUED_CARDS_DIR.sub("", name)
+
+
+class CaptionStore:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(CaptionStore, cls).__new__(cls)
+                    cls._instance.__initialized = False
+        return cls._instance
+
+    def __init__(self, csv_path: str = DEFAULT_CAPTION_CSV, json_path: str = DEFAULT_CAPTION_JSON):
+        """
+        Load every known caption once per process.
+
+        Args:
+            csv_path: The "path,caption" cache file; new captions are appended here.
+            json_path: The caption JSON produced by generate_image_caption.py.
+        """
+        if self.__initialized:
+            return
+        self.csv_path = csv_path
+        self.json_path = json_path
+        self._captions: Dict[str, str] = {}
+        self._write_lock = threading.Lock()
+        self._load_json(json_path)
+        # Loaded last so captions written back at runtime take precedence.
+        self._load_csv(csv_path)
+        self.__initialized = True
+        logger.info(f"CaptionStore loaded {len(self._captions)} captions.")
+
+    def _load_json(self, json_path: str):
+        if not os.path.exists(json_path):
+            logger.debug(f"Caption file {json_path} not found.")
+            return
+        try:
+            with open(json_path, "r") as f:
+                for path, caption in json.load(f).items():
+                    self._captions[canonical_card_key(path)] = caption.strip()
+        except Exception as e:
+            logger.error(f"Failed to load captions from {json_path}: {e}")
+
+    def _load_csv(self, csv_path: str):
+        if not os.path.exists(csv_path):
+            logger.debug(f"Caption cache {csv_path} not found.")
+            return
+        try:
+            with open(csv_path, "r", newline="") as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2 and row[0].strip():
+                        self._captions[canonical_card_key(row[0])] = row[1].strip()
+        except Exception as e:
+            logger.error(f"Failed to load captions from {csv_path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._captions)
+
+    def __contains__(self, card: str) -> bool:
+        return canonical_card_key(card) in self._captions
+
+    def items(self) -> List[Tuple[str, str]]:
+        """Return (card key, caption) pairs for every known card."""
+        return list(self._captions.items())
+
+    def get(self, card: str, caption_generator=None) -> Optional[str]:
+        """
+        Return the caption for a card.
+
+        Args:
+            card: The card path, in any of the known path spellings.
+            caption_generator: Optional ImageCaptionGenerator used to caption unknown cards.
+
+        Returns:
+            The caption, or None if the card is unknown and could not be captioned.
+        """
+        caption = self._captions.get(canonical_card_key(card))
+        if caption is None and caption_generator is not None:
+            logger.info(f"No cached caption for {card}; generating one.")
+            caption = caption_generator.generate_caption(card)
+            if caption:
+                self.add(card, caption)
+        return caption
+
+    def get_many(self, cards: Iterable[str], caption_generator=None) -> Dict[str, Optional[str]]:
+        """Return a mapping of each card to its caption (None when unavailable)."""
+        return {card: self.get(card, caption_generator) for card in cards}
+
+    def add(self, card: str, caption: str, persist: bool = True):
+        """Record a caption and, by default, append it to the CSV cache."""
+        caption = caption.strip()
+        self._captions[canonical_card_key(card)] = caption
+        if not persist:
+            return
+        with self._write_lock:
+            try:
+                with open(self.csv_path, "a", newline="") as f:
+                    if f.tell() > 0 and not self._ends_with_newline():
+                        f.write("\n")
+                    csv.writer(f, lineterminator="\n").writerow([os.path.normpath(card), caption])
+            except Exception as e:
+                logger.error(f"Failed to write caption for {card} to {self.csv_path}: {e}")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.csv_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
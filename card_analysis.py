@@ -0,0 +1,185 @@
+import copy
+import time
+import logging
+import numpy as np
+import torch
+from typing import Iterable, Iterator, List, Optional, Tuple
+from caption_store import CaptionStore
+from embedding_index import DEFAULT_INDEX_DIR, ImageEmbeddingIndex, list_card_images, update_index
+from generate_image_caption import ImageCaptionGenerator, DEFAULT_BATCH_SIZE, DEFAULT_NUM_WORKERS
+
+logger = logging.getLogger('card_analysis')
+
+# Cards analyzed between index writes during ingestion, bounding lost work on a crash.
+DEFAULT_SAVE_EVERY = 256
+
+
+def _reusing_visual_output(model, images: torch.Tensor, image_latent: torch.Tensor, image_embs: torch.Tensor):
+    """
+    Return a view of `model` whose `_encode_image` returns an already computed visual output for `images`.
+
+    CoCa's generate() calls _encode_image itself, on the batch repeated once per
+    beam. Calls on any other input fall through to the real visual tower. The
+    view is a shallow copy sharing every submodule and weight with `model`, so
+    the shared model itself is never patched and other users of it (similarity,
+    captioning, the inference server) are unaffected.
+    """
+    original = model._encode_image
+    batch = images.shape[0]
+
+    def cached_encode_image(inputs, normalize: bool = True):
+        if normalize and inputs.shape[0] % batch == 0:
+            repeats = inputs.shape[0] // batch
+            if torch.equal(inputs[::repeats], images):
+                if repeats == 1:
+                    return image_latent, image_embs
+                return image_latent.repeat_interleave(repeats, dim=0), image_embs.repeat_interleave(repeats, dim=0)
+        return original(inputs, normalize=normalize)
+
+    view = copy.copy(model)
+    view._encode_image = cached_encode_image
+    return view
+
+
+class CardAnalyzer:
+    def __init__(self, model_manager, batch_size: int = DEFAULT_BATCH_SIZE, num_workers: int = DEFAULT_NUM_WORKERS):
+        """
+        Caption and embed cards with a single pass through the visual tower.
+
+        Args:
+            model_manager: The ModelManager instance managing the model and device.
+            batch_size: Number of images per visual pass.
+            num_workers: Threads decoding and preprocessing images ahead of the model.
+        """
+        self.model = model_manager.get_model()
+        self.device = model_manager.get_device()
+        self.caption_generator = ImageCaptionGenerator(model_manager, batch_size=batch_size, num_workers=num_workers)
+        self.batch_size = self.caption_generator.batch_size
+        self.shared_visual_pass = hasattr(self.model, "_encode_image")
+        if not self.shared_visual_pass:
+            logger.warning("Model has no CoCa _encode_image; captions and embeddings will use separate visual passes.")
+
+    def analyze_batch(self, image_tensors: List[torch.Tensor]) -> Tuple[List[str], np.ndarray]:
+        """
+        Return the captions and (N, D) L2-normalized embeddings of a batch of preprocessed images.
+
+        The visual tower runs once in full precision; the caption decoder then
+        reuses its output under the same autocast as ImageCaptionGenerator.
+        """
+        images = torch.stack(image_tensors).to(self.device)
+        with torch.no_grad():
+            if self.shared_visual_pass:
+                image_latent, image_embs = self.model._encode_image(images)
+                view = _reusing_visual_output(self.model, images, image_latent, image_embs)
+                with torch.autocast(device_type=self.device.type):
+                    generated = view.generate(images)
+            else:
+                image_latent = self.model.encode_image(images)
+                with torch.autocast(device_type=self.device.type):
+                    generated = self.model.generate(images)
+            embeddings = torch.nn.functional.normalize(image_latent.float(), dim=-1).cpu().numpy()
+        captions = [self.caption_generator._decode_caption(tokens) for tokens in generated]
+        return captions, embeddings
+
+    def iter_analyze(self, image_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str], Optional[np.ndarray]]]:
+        """
+        Analyze many images in batches, yielding (path, caption, embedding) in input order.
+
+        Caption and embedding are None for images that fail to load or analyze.
+        """
+        # Failed images wait in `buffered` with the batch around them, so results keep the input order.
+        buffered, batch_tensors = [], []
+
+        def flush():
+            loaded = [path for path, ok in buffered if ok]
+            results = iter(())
+            if loaded:
+                try:
+                    captions, embeddings = self.analyze_batch(batch_tensors)
+                    results = zip(captions, embeddings)
+                except Exception as e:
+                    logger.error(f"Error analyzing batch starting at {loaded[0]}: {e}", exc_info=True)
+                    results = iter([(None, None)] * len(loaded))
+            for path, ok in buffered:
+                yield (path, *next(results)) if ok else (path, None, None)
+
+        for path, tensor in self.caption_generator._prefetch(list(image_paths)):
+            buffered.append((path, tensor is not None))
+            if tensor is not None:
+                batch_tensors.append(tensor)
+            if len(batch_tensors) == self.batch_size:
+                yield from flush()
+                buffered, batch_tensors = [], []
+        if buffered:
+            yield from flush()
+
+
+def ingest_deck(
+    directory: str,
+    model_manager,
+    caption_store: Optional[CaptionStore] = None,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_workers: int = DEFAULT_NUM_WORKERS,
+    skip_known: bool = True,
+    save_every: int = DEFAULT_SAVE_EVERY
+) -> int:
+    """
+    Caption and embed every card in a directory, writing both stores together.
+
+    Args:
+        directory: The card image directory.
+        model_manager: The centralized ModelManager instance.
+        caption_store: Caption store to add captions to. Defaults to the shared CaptionStore.
+        index_dir: Embedding index directory to add embeddings to.
+        batch_size: Number of images per visual pass.
+        num_workers: Image decoding threads.
+        skip_known: Skip cards that already have both a caption and an up-to-date embedding.
+        save_every: Cards analyzed between embedding index writes.
+
+    Returns:
+        The number of cards analyzed.
+    """
+    caption_store = caption_store or CaptionStore()
+    paths = list_card_images(directory)
+    if skip_known:
+        index = ImageEmbeddingIndex.load_if_exists(index_dir, model_manager.model_name, model_manager.pretrained)
+        paths = [
+            path for path in paths
+            if caption_store.get(path) is None or index is None or not index.is_current(path)
+        ]
+    if not paths:
+        logger.info(f"Every card in {directory} is already captioned and embedded.")
+        return 0
+
+    analyzer = CardAnalyzer(model_manager, batch_size=batch_size, num_workers=num_workers)
+    start_time = time.perf_counter()
+    pending = {}
+    analyzed = 0
+    for path, caption, embedding in analyzer.iter_analyze(paths):
+        if caption is None:
+            continue
+        caption_store.add(path, caption)
+        pending[path] = embedding
+        analyzed += 1
+        if len(pending) >= save_every:
+            update_index(pending, model_manager.model_name, model_manager.pretrained, index_dir)
+            pending = {}
+            logger.info(f"Analyzed {analyzed}/{len(paths)} cards.")
+    if pending:
+        update_index(pending, model_manager.model_name, model_manager.pretrained, index_dir)
+
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Ingested {analyzed} cards in {elapsed:.2f} seconds "
+        f"({analyzed / elapsed if elapsed else 0.0:.2f} images/sec)."
+    )
+    return analyzed
+
+
+if __name__ == "__main__":
+    from model_manager import ModelManager
+
+    logging.basicConfig(level=logging.INFO)
+
+    ingest_deck("data/images/cards", ModelManager())
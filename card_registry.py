@@ -0,0 +1,156 @@
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+from embedding_index import canonical_path, list_card_images
+
+logger = logging.getLogger('card_registry')
+
+EMPTY_SLOT = -1
+
+
+class CardRegistry:
+    def __init__(self, paths: Sequence[str], captions: Optional[Sequence[str]] = None, embedding_index=None):
+        """
+        Assign every card a dense integer ID, with per-card data in parallel arrays.
+
+        Args:
+            paths: Card image paths; card i gets ID i.
+            captions: Optional captions, aligned with `paths`.
+            embedding_index: Optional ImageEmbeddingIndex used to resolve embedding rows.
+        """
+        self.paths = np.asarray([canonical_path(path) for path in paths], dtype=object)
+        self.captions = np.asarray(list(captions) if captions is not None else [""] * len(self.paths), dtype=object)
+        self.embedding_index = embedding_index
+        self.embedding_rows = np.full(len(self.paths), EMPTY_SLOT, dtype=np.int32)
+        if embedding_index is not None:
+            for card_id, path in enumerate(self.paths):
+                row = embedding_index.lookup_row(path)
+                if row is not None:
+                    self.embedding_rows[card_id] = row
+        self._ids: Dict[str, int] = {path: card_id for card_id, path in enumerate(self.paths)}
+
+    @classmethod
+    def from_directory(cls, directory: str, caption_store=None, embedding_index=None) -> "CardRegistry":
+        """Build a registry for every card image in a directory."""
+        paths = list_card_images(directory)
+        captions = [caption_store.get(path) or "" for path in paths] if caption_store is not None else None
+        registry = cls(paths, captions, embedding_index)
+        logger.info(
+            f"CardRegistry built for {len(registry)} cards "
+            f"({int((registry.embedding_rows >= 0).sum())} with indexed embeddings)."
+        )
+        return registry
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def id_of(self, path: str) -> int:
+        return self._ids[canonical_path(path)]
+
+    def ids_of(self, paths: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.id_of(path) for path in paths), dtype=np.int32)
+
+    def paths_of(self, card_ids: np.ndarray) -> List[str]:
+        return self.paths[np.asarray(card_ids)].tolist()
+
+    def captions_of(self, card_ids: np.ndarray) -> List[str]:
+        return self.captions[np.asarray(card_ids)].tolist()
+
+    def has_embeddings(self, card_ids: np.ndarray) -> bool:
+        return self.embedding_index is not None and bool((self.embedding_rows[np.asarray(card_ids)] >= 0).all())
+
+    def embeddings(self, card_ids: np.ndarray) -> np.ndarray:
+        """Return the (N, D) float32 embeddings of the given cards by pure array indexing."""
+        rows = self.embedding_rows[np.asarray(card_ids)]
+        if self.embedding_index is None or (rows < 0).any():
+            raise KeyError("Some cards have no indexed embedding.")
+        return np.asarray(self.embedding_index.embeddings[rows], dtype=np.float32)
+
+
+class ArrayDeck:
+    def __init__(self, num_cards: int, hand_sizes: Sequence[int], rng: Optional[np.random.Generator] = None):
+        """
+        Draw pile, discard pile and hands of one game as compact int32 arrays.
+
+        Args:
+            num_cards: Number of cards in the registry; IDs are 0..num_cards-1.
+            hand_sizes: Hand size of each player.
+            rng: Random generator used for shuffling.
+        """
+        self.rng = rng or np.random.default_rng()
+        self.num_cards = num_cards
+        self.hand_sizes = np.asarray(hand_sizes, dtype=np.int32)
+        max_hand = int(self.hand_sizes.max()) if len(self.hand_sizes) else 0
+        self.hands = np.full((len(self.hand_sizes), max_hand), EMPTY_SLOT, dtype=np.int32)
+        self._slot_mask = np.arange(max_hand)[None, :] < self.hand_sizes[:, None]
+        self.draw_pile = self.rng.permutation(num_cards).astype(np.int32)
+        self._top = num_cards
+        self.discard_pile = np.empty(num_cards, dtype=np.int32)
+        self._discarded = 0
+
+    @property
+    def cards_left(self) -> int:
+        return self._top
+
+    @property
+    def cards_discarded(self) -> int:
+        return self._discarded
+
+    def hand(self, player: int) -> np.ndarray:
+        """Return the card IDs in a player's hand."""
+        row = self.hands[player, :self.hand_sizes[player]]
+        return row[row != EMPTY_SLOT]
+
+    def reshuffle_discards(self):
+        """Shuffle the discard pile back under the remaining draw pile."""
+        if not self._discarded:
+            return
+        remaining = self.draw_pile[:self._top].copy()
+        discards = self.rng.permutation(self.discard_pile[:self._discarded])
+        self.draw_pile[:self._discarded] = discards
+        self.draw_pile[self._discarded:self._discarded + self._top] = remaining
+        self._top += self._discarded
+        self._discarded = 0
+        logger.info("Reshuffling discard pile into the deck.")
+
+    def deal(self) -> int:
+        """
+        Fill every empty hand slot from the top of the draw pile in one step.
+
+        Returns:
+            The number of cards dealt.
+        """
+        empty = np.flatnonzero((self.hands == EMPTY_SLOT) & self._slot_mask)
+        if len(empty) > self._top:
+            self.reshuffle_discards()
+        count = min(len(empty), self._top)
+        if count < len(empty):
+            logger.warning("Not every hand could be filled due to insufficient cards.")
+        self.hands.flat[empty[:count]] = self.draw_pile[self._top - count:self._top][::-1]
+        self._top -= count
+        return count
+
+    def play(self, player: int, card_id: int) -> int:
+        """Remove a card from a player's hand and return it."""
+        slots = np.flatnonzero(self.hands[player] == card_id)
+        if not len(slots):
+            raise ValueError(f"Card {card_id} is not in player {player}'s hand.")
+        self.hands[player, slots[0]] = EMPTY_SLOT
+        return card_id
+
+    def discard(self, card_ids: np.ndarray):
+        card_ids = np.asarray(card_ids, dtype=np.int32)
+        self.discard_pile[self._discarded:self._discarded + len(card_ids)] = card_ids
+        self._discarded += len(card_ids)
+
+    def discard_hands(self):
+        """Move every card still held to the discard pile, leaving all hands empty."""
+        self.discard(self.hands[self.hands != EMPTY_SLOT])
+        self.hands.fill(EMPTY_SLOT)
+
+    def collect_all(self):
+        """Return every hand and discard to the draw pile and shuffle it, for a fresh game."""
+        self.hands.fill(EMPTY_SLOT)
+        self.draw_pile = self.rng.permutation(self.num_cards).astype(np.int32)
+        self._top = self.num_cards
+        self._discarded = 0
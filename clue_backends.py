@@ -0,0 +1,240 @@
+import os
+import re
+import time
+import random
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from metrics import metrics
+
+logger = logging.getLogger('text_processing')
+
+RETRIES = 3
+OPENAI_BACKEND = "openai"
+LOCAL_BACKEND = "local"
+DEFAULT_BACKEND = os.getenv("ABSTRACTOR_BACKEND", OPENAI_BACKEND)
+
+# Vocabulary the local backend builds clues from. Clues never reuse words from
+# the caption itself, they pick abstract words that sit near it in CLIP space.
+EVOCATIVE_ADJECTIVES = [
+    "silent", "hidden", "fragile", "endless", "forgotten", "restless", "gentle", "wild",
+    "lonely", "golden", "distant", "secret", "broken", "floating", "quiet", "burning",
+    "frozen", "ancient", "curious", "tender", "hollow", "electric", "drifting", "patient",
+    "midnight", "dreaming", "wandering", "shimmering", "bitter", "sweet",
+]
+EVOCATIVE_NOUNS = [
+    "longing", "solitude", "wonder", "memory", "escape", "journey", "harmony", "chaos",
+    "freedom", "silence", "hope", "courage", "illusion", "nostalgia", "balance", "dream",
+    "shelter", "whisper", "horizon", "echo", "curiosity", "patience", "innocence", "desire",
+    "mystery", "home", "flight", "growth", "sorrow", "joy", "time", "destiny",
+]
+
+
+class ClueBackend(ABC):
+    model_name: str = ""
+
+    @abstractmethod
+    def generate(self, prompt: str, description: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        """Return one clue for a description, given the full storyteller prompt."""
+        pass
+
+    @abstractmethod
+    def generate_batch(
+        self,
+        prompt: str,
+        descriptions: List[str],
+        clues_per_card: int,
+        max_tokens: int,
+        temperature: float,
+        top_p: float
+    ) -> List[List[str]]:
+        """Return several clues for each description, given a multi-card prompt."""
+        pass
+
+
+class OpenAIBackend(ClueBackend):
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gpt-4", base_url: Optional[str] = None, rate_limiter=None):
+        """
+        Generate clues with an OpenAI chat model.
+
+        Args:
+            api_key: OpenAI API key. Defaults to the OPENAI_API_KEY environment variable.
+            model_name: The chat model used to generate clues.
+            base_url: Alternative API endpoint, e.g. a local stand-in server for tests.
+            rate_limiter: Optional shared TokenBucket acquired before every request.
+        """
+        from dotenv import load_dotenv
+        import openai
+
+        load_dotenv()
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            logger.error("API key is required for OpenAI.")
+            raise ValueError("API key is required for OpenAI")
+        self._openai = openai
+        self.client = openai.OpenAI(api_key=self.api_key, base_url=base_url)
+        self.model_name = model_name
+        self.rate_limiter = rate_limiter
+
+    def _request_completion(self, prompt: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        """Send one chat completion request, waiting on the rate limiter first."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with metrics.span("llm_call"):
+            response = self.client.chat.completions.create(model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p)
+        metrics.increment("llm_calls")
+        return response.choices[0].message.content.strip()
+
+    def _backoff(self, attempt: int):
+        """Sleep before retrying after a rate-limit error, pausing the shared limiter too."""
+        wait_time = 2 ** attempt + random.uniform(0, 1)
+        logger.warning(
+            f"Rate limit exceeded. Retrying in {wait_time:.2f} seconds..."
+        )
+        if self.rate_limiter is not None:
+            self.rate_limiter.pause(wait_time)
+        time.sleep(wait_time)
+
+    def _complete_with_retries(self, prompt: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        for attempt in range(RETRIES):
+            try:
+                logger.debug(f"Attempt {attempt + 1} to generate a clue.")
+                return self._request_completion(prompt, max_tokens, temperature, top_p)
+            except self._openai.RateLimitError:
+                if attempt < RETRIES - 1:
+                    self._backoff(attempt)
+                else:
+                    logger.error("Rate limit exceeded after multiple retries.")
+                    raise
+            except self._openai.APIStatusError as e:
+                logger.error(f"OpenAI API error occurred: {e}")
+                if attempt == RETRIES - 1:
+                    raise
+
+    def generate(self, prompt: str, description: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        return self._complete_with_retries(prompt, max_tokens, temperature, top_p)
+
+    def generate_batch(
+        self,
+        prompt: str,
+        descriptions: List[str],
+        clues_per_card: int,
+        max_tokens: int,
+        temperature: float,
+        top_p: float
+    ) -> List[List[str]]:
+        request_tokens = max_tokens * clues_per_card * len(descriptions) + 10 * len(descriptions)
+        response = self._complete_with_retries(prompt, request_tokens, temperature, top_p)
+
+        results: List[List[str]] = [[] for _ in descriptions]
+        for line in response.splitlines():
+            match = re.match(r"^\s*(\d+)\s*[:.)-]\s*(.+)$", line)
+            if not match:
+                continue
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(descriptions):
+                results[index].extend(clue.strip().strip("\"'").strip() for clue in match.group(2).split("|"))
+        return results
+
+
+class LocalClueBackend(ClueBackend):
+    model_name = LOCAL_BACKEND
+
+    def __init__(self, similarity=None, nlp=None, seed: int = 0):
+        """
+        Derive clues from the card caption on CPU, without any network access.
+
+        With a similarity engine, candidate words are ranked by CLIP text-tower
+        similarity to the caption and drawn from just below the top, so the clue
+        is related but not obvious. Without one, words are drawn deterministically
+        from the caption's hash. Either way the same caption, seed and
+        temperature always give the same clue.
+
+        Args:
+            similarity: Optional ImageTextSimilarity whose text tower ranks the vocabulary.
+            nlp: Optional spaCy pipeline used to drop caption words from the vocabulary.
+            seed: Seed mixed into every draw, for reproducible experiments.
+        """
+        self.similarity = similarity
+        self.nlp = nlp
+        self.seed = seed
+        self._adjective_features = None
+        self._noun_features = None
+
+    def _rng(self, description: str, temperature: float, salt: int = 0) -> random.Random:
+        digest = hashlib.sha1(f"{self.seed}|{temperature}|{salt}|{description}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _caption_words(self, description: str) -> set:
+        if self.nlp is not None:
+            return {token.lemma_.lower() for token in self.nlp(description) if token.is_alpha}
+        return set(description.lower().split())
+
+    def _ranked(self, description: str, words: List[str], features_attr: str) -> List[str]:
+        """Return the vocabulary ordered from most to least similar to the description."""
+        if self.similarity is None:
+            return list(words)
+        features = getattr(self, features_attr)
+        if features is None:
+            features = self.similarity.encode_texts(words)
+            setattr(self, features_attr, features)
+        scores = (self.similarity.encode_texts([description]) @ features.T)[0]
+        order = scores.argsort(descending=True).tolist()
+        return [words[i] for i in order]
+
+    def _pick(self, ranked: List[str], rng: random.Random, temperature: float, exclude: set) -> str:
+        candidates = [word for word in ranked if word not in exclude]
+        if self.similarity is None:
+            return rng.choice(candidates)
+        # Skip the closest word (too obvious) and widen the band with temperature.
+        band = candidates[1:2 + max(1, int(len(candidates) * min(temperature, 2.0) / 4))]
+        return rng.choice(band or candidates)
+
+    def generate_clues(self, description: str, count: int, temperature: float) -> List[str]:
+        """Return up to `count` distinct two-word clues for a description."""
+        exclude = self._caption_words(description)
+        adjectives = self._ranked(description, EVOCATIVE_ADJECTIVES, "_adjective_features")
+        nouns = self._ranked(description, EVOCATIVE_NOUNS, "_noun_features")
+        clues = []
+        for salt in range(count * 4):
+            rng = self._rng(description, temperature, salt)
+            clue = f"{self._pick(adjectives, rng, temperature, exclude)} {self._pick(nouns, rng, temperature, exclude)}"
+            if clue not in clues:
+                clues.append(clue)
+            if len(clues) == count:
+                break
+        return clues
+
+    def generate(self, prompt: str, description: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        return self.generate_clues(description, 1, temperature)[0]
+
+    def generate_batch(
+        self,
+        prompt: str,
+        descriptions: List[str],
+        clues_per_card: int,
+        max_tokens: int,
+        temperature: float,
+        top_p: float
+    ) -> List[List[str]]:
+        return [self.generate_clues(description, clues_per_card, temperature) for description in descriptions]
+
+
+def create_backend(name: str = DEFAULT_BACKEND, **kwargs) -> ClueBackend:
+    """
+    Build a clue backend by name.
+
+    Args:
+        name: "openai" or "local".
+        **kwargs: Forwarded to the backend constructor.
+    """
+    if name == OPENAI_BACKEND:
+        return OpenAIBackend(**kwargs)
+    if name == LOCAL_BACKEND:
+        return LocalClueBackend(**kwargs)
+    raise ValueError(f"Unknown clue backend: {name}")
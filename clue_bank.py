@@ -0,0 +1,193 @@
+import os
+import json
+import random
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('text_processing')
+
+DEFAULT_CLUE_BANK_DB = "data/json/clue_bank.sqlite"
+DEFAULT_CLUES_PER_CARD = 10
+DEFAULT_CARDS_PER_PROMPT = 5
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+
+def caption_hash(caption: str) -> str:
+    """Hash a caption after collapsing whitespace and case."""
+    return hashlib.sha1(" ".join(caption.split()).lower().encode("utf-8")).hexdigest()
+
+
+def params_key(**params) -> str:
+    """Serialize generation parameters into a stable key."""
+    return json.dumps(params, sort_keys=True)
+
+
+class ClueBank:
+    def __init__(self, db_path: str = DEFAULT_CLUE_BANK_DB, seed: Optional[int] = None):
+        """
+        Persistent store of pre-generated clues keyed by (caption hash, model, params).
+
+        Args:
+            db_path: SQLite file holding the clues.
+            seed: Optional seed for reproducible sampling.
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS clues ("
+            "caption_hash TEXT NOT NULL, model TEXT NOT NULL, params TEXT NOT NULL, clue TEXT NOT NULL, "
+            "PRIMARY KEY (caption_hash, model, params, clue))"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._drawn: Dict[Tuple[str, str, str], Set[str]] = {}
+        self._random = random.Random(seed)
+
+    @classmethod
+    def open_if_exists(cls, db_path: str = DEFAULT_CLUE_BANK_DB) -> Optional["ClueBank"]:
+        """Open the bank if it has been built, otherwise return None."""
+        if not os.path.exists(db_path):
+            return None
+        try:
+            return cls(db_path)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open clue bank {db_path}: {e}")
+            return None
+
+    def add(self, caption: str, model: str, params: str, clues: Iterable[str]) -> int:
+        """Store clues for a caption, ignoring duplicates. Returns the number of new clues."""
+        key = caption_hash(caption)
+        rows = [(key, model, params, clue.strip()) for clue in clues if clue and clue.strip()]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO clues VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def _query(self, key: Tuple[str, str, str]) -> List[str]:
+        rows = self._db.execute(
+            "SELECT clue FROM clues WHERE caption_hash = ? AND model = ? AND params = ?", key
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def clues(self, caption: str, model: str, params: str) -> List[str]:
+        """Return every stored clue for a caption."""
+        with self._lock:
+            return self._query((caption_hash(caption), model, params))
+
+    def undrawn(self, caption: str, model: str, params: str) -> List[str]:
+        """Return the stored clues for a caption that have not been drawn yet in this process."""
+        key = (caption_hash(caption), model, params)
+        with self._lock:
+            drawn = self._drawn.get(key, ())
+            return [clue for clue in self._query(key) if clue not in drawn]
+
+    def count(self, caption: str, model: str, params: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM clues WHERE caption_hash = ? AND model = ? AND params = ?",
+                (caption_hash(caption), model, params)
+            ).fetchone()[0]
+
+    def mark_drawn(self, caption: str, model: str, params: str, clue: str):
+        """Record that a clue was used, so draw() and undrawn() no longer return it."""
+        with self._lock:
+            self._drawn.setdefault((caption_hash(caption), model, params), set()).add(clue.strip())
+
+    def draw(self, caption: str, model: str, params: str) -> Optional[str]:
+        """
+        Sample a clue for a caption that has not been drawn yet in this process.
+
+        Returns:
+            A clue, or None once every stored clue for the key has been used.
+        """
+        key = (caption_hash(caption), model, params)
+        # Filter, choice and mark happen under one lock so concurrent draws never share a clue.
+        with self._lock:
+            drawn = self._drawn.setdefault(key, set())
+            remaining = [clue for clue in self._query(key) if clue not in drawn]
+            if not remaining:
+                return None
+            clue = self._random.choice(remaining)
+            drawn.add(clue)
+        return clue
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def build_clue_bank(
+    captions: Iterable[str],
+    abstractor,
+    bank: ClueBank,
+    clues_per_card: int = DEFAULT_CLUES_PER_CARD,
+    cards_per_prompt: int = DEFAULT_CARDS_PER_PROMPT,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    **generation_params
+) -> int:
+    """
+    Pre-generate clues for many captions and store them in the bank.
+
+    Captions that already have `clues_per_card` clues are skipped, so the job
+    can be rerun to top up the bank. Several captions are sent per request to
+    cut the request count; the abstractor's rate limiter bounds request rate.
+
+    Args:
+        captions: The card captions to generate clues for.
+        abstractor: The Abstractor used to talk to the model.
+        bank: The ClueBank receiving the clues.
+        clues_per_card: Target number of distinct clues per caption.
+        cards_per_prompt: Number of captions combined into one request.
+        max_concurrency: Maximum number of requests in flight.
+        **generation_params: temperature/top_p/max_tokens forwarded to the abstractor.
+
+    Returns:
+        The number of new clues stored.
+    """
+    params = abstractor.clue_params(**generation_params)
+    pending = [
+        caption for caption in dict.fromkeys(c.strip() for c in captions if c and c.strip())
+        if bank.count(caption, abstractor.model_name, params) < clues_per_card
+    ]
+    logger.info(f"Generating clues for {len(pending)} captions ({cards_per_prompt} per request).")
+
+    groups = [pending[i:i + cards_per_prompt] for i in range(0, len(pending), cards_per_prompt)]
+
+    def run(group: List[str]) -> int:
+        try:
+            batches = abstractor.generate_clue_batch(group, clues_per_card, **generation_params)
+        except Exception as e:
+            logger.error(f"Clue batch starting with '{group[0]}' failed: {e}")
+            return 0
+        return sum(
+            bank.add(caption, abstractor.model_name, params, clues)
+            for caption, clues in zip(group, batches)
+        )
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for count in executor.map(run, groups):
+            added += count
+    logger.info(f"Clue bank build complete: {added} new clues stored in {bank.db_path}.")
+    return added
+
+
+if __name__ == "__main__":
+    from abstractor import Abstractor
+    from caption_store import CaptionStore
+    from rate_limit import TokenBucket
+
+    logging.basicConfig(level=logging.INFO)
+
+    store = CaptionStore()
+    abstractor = Abstractor(rate_limiter=TokenBucket.per_minute(DEFAULT_REQUESTS_PER_MINUTE))
+    build_clue_bank((caption for _, caption in store.items()), abstractor, ClueBank())
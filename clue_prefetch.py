@@ -0,0 +1,64 @@
+import logging
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger('game_logic')
+
+DEFAULT_PREFETCH_WORKERS = 2
+
+
+class CluePrefetcher:
+    def __init__(self, generate_fn: Callable[[str], Any], max_workers: int = DEFAULT_PREFETCH_WORKERS):
+        """
+        Generate clues for cards in the background, ahead of the storyteller turn.
+
+        Args:
+            generate_fn: Blocking function that prepares a clue for a card path. Its result is
+                returned by get() as is.
+            max_workers: Maximum number of clue requests in flight at once.
+        """
+        self._generate_fn = generate_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clue-prefetch")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def sync(self, hand: Iterable[str]):
+        """Start prefetching for new cards in the hand and cancel cards that left it."""
+        hand = set(hand)
+        with self._lock:
+            for card in list(self._futures):
+                if card not in hand:
+                    self._futures.pop(card).cancel()
+                    logger.debug(f"Cancelled clue prefetch for {card}.")
+            for card in hand:
+                if card not in self._futures:
+                    self._futures[card] = self._executor.submit(self._generate_fn, card)
+                    logger.debug(f"Started clue prefetch for {card}.")
+
+    def get(self, card: str, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Take the prefetched clue for a card, waiting for it if it is still in flight.
+
+        Returns:
+            What generate_fn returned for the card, or None if no prefetch was started or it failed or timed out.
+        """
+        with self._lock:
+            future = self._futures.pop(card, None)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except CancelledError:
+            return None
+        except Exception as e:
+            logger.error(f"Clue prefetch for {card} failed: {e}")
+            return None
+
+    def shutdown(self):
+        """Cancel queued prefetches and release the worker threads."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -4,6 +4,8 @@ import logging
 from players import Player
 from typing import List, Tuple
 
+logger = logging.getLogger('game_logic')
+
 CARDSPATH = "/data/images/cards"
 
 def setup_deck() -> Tuple[List[str], List[str]]:
@@ -29,6 +31,7 @@ def deal_cards(players: List['Player'], cur_deck: List[str], discard_pile: List[
         if needed_cards > 0:
             available_cards = min(needed_cards, len(cur_deck))
             player.hand.extend(cur_deck.pop() for _ in range(available_cards))
+            player.on_hand_changed()
             if len(player.hand) < num_cards:
                 logger.warning(f"{player.name} was not dealt a full hand due to insufficient cards.")
 
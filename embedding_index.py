@@ -0,0 +1,291 @@
+import os
+import json
+import hashlib
+import logging
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('embedding_index')
+
+DEFAULT_INDEX_DIR = "data/embeddings"
+EMBEDDINGS_FILE = "cards_embeddings.npy"
+INDEX_FILE = "cards_index.json"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def canonical_path(path: str) -> str:
+    """Normalize a card path so the same file always maps to the same key."""
+    return os.path.normpath(path)
+
+
+def list_card_images(directory: str) -> List[str]:
+    """Return the sorted image paths found in a card directory."""
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+class ImageEmbeddingIndex:
+    def __init__(self, embeddings: np.ndarray, entries: Dict[str, dict], model_name: str, pretrained: str):
+        """
+        Initialize the index from an embedding matrix and its path entries.
+
+        Args:
+            embeddings: (N, D) matrix of L2-normalized image embeddings, usually a float16 memmap.
+            entries: Mapping of canonical card path to {"row", "sha1", "size", "mtime_ns"}.
+            model_name: The open_clip model the embeddings were produced with.
+            pretrained: The pretrained tag the embeddings were produced with.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.pretrained = pretrained
+        self._entries = entries
+        self._rows_by_hash = {entry["sha1"]: entry["row"] for entry in entries.values()}
+        # Path -> (size, mtime_ns) of files already hashed and found missing, so repeated misses skip the read.
+        self._misses: Dict[str, Tuple[int, int]] = {}
+
+    @classmethod
+    def load(cls, index_dir: str = DEFAULT_INDEX_DIR) -> "ImageEmbeddingIndex":
+        """Load an index from disk, memory-mapping the embedding matrix."""
+        with open(os.path.join(index_dir, INDEX_FILE), "r") as f:
+            meta = json.load(f)
+        embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        logger.info(f"Loaded embedding index with {embeddings.shape[0]} cards from {index_dir}")
+        return cls(embeddings, meta["entries"], meta["model_name"], meta["pretrained"])
+
+    @classmethod
+    def load_if_exists(
+        cls,
+        index_dir: str = DEFAULT_INDEX_DIR,
+        model_name: Optional[str] = None,
+        pretrained: Optional[str] = None
+    ) -> Optional["ImageEmbeddingIndex"]:
+        """
+        Load the index if it has been built, otherwise return None.
+
+        An index built with a different model or pretrained tag is ignored, since
+        its embeddings do not live in the same space as the running model.
+        """
+        if not os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+            logger.debug(f"No embedding index found in {index_dir}.")
+            return None
+        try:
+            index = cls.load(index_dir)
+        except Exception as e:
+            logger.error(f"Failed to load embedding index from {index_dir}: {e}")
+            return None
+        if (model_name and index.model_name != model_name) or (pretrained and index.pretrained != pretrained):
+            logger.warning(
+                f"Embedding index in {index_dir} was built for {index.model_name}/{index.pretrained}, "
+                f"not {model_name}/{pretrained}; ignoring it."
+            )
+            return None
+        return index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, image_path: str) -> bool:
+        return self.lookup_row(image_path) is not None
+
+    def is_current(self, image_path: str) -> bool:
+        """
+        Return True if the image has an entry whose recorded size and mtime still match the file.
+
+        Unlike lookup_row this never hashes, so a touched but unchanged file counts as not current.
+        """
+        key = canonical_path(image_path)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return False
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def lookup_row(self, image_path: str) -> Optional[int]:
+        """
+        Return the embedding row for an image, or None if it is unknown or stale.
+
+        The file's size and mtime are compared with the values recorded at build
+        time; only when they differ is the content re-hashed, so a touched but
+        unchanged file is still served from the index while an edited one is not.
+        A file that hashed to no known row is not hashed again until its size or
+        mtime changes.
+        """
+        key = canonical_path(image_path)
+        entry = self._entries.get(key)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            # Nothing on disk to compare against; trust the recorded row.
+            return entry["row"] if entry else None
+
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["row"]
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self._misses.get(key) == signature:
+            return None
+
+        sha1 = file_content_hash(key)
+        row = self._rows_by_hash.get(sha1)
+        if row is None:
+            if entry:
+                logger.warning(f"Embedding index entry for {key} is stale; falling back to the model.")
+            self._misses[key] = signature
+            return None
+
+        # Same content under a new stat or a new path: remember it for next time.
+        self._entries[key] = {"row": row, "sha1": sha1, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return row
+
+    def lookup(self, image_path: str) -> Optional[np.ndarray]:
+        """Return the normalized float32 embedding for an image, or None if unknown."""
+        row = self.lookup_row(image_path)
+        if row is None:
+            return None
+        return np.asarray(self.embeddings[row], dtype=np.float32)
+
+    @staticmethod
+    def save(index_dir: str, embeddings: np.ndarray, entries: Dict[str, dict], model_name: str, pretrained: str):
+        """Atomically write the embedding matrix (float16) and path index to disk."""
+        os.makedirs(index_dir, exist_ok=True)
+        embeddings_path = os.path.join(index_dir, EMBEDDINGS_FILE)
+        index_path = os.path.join(index_dir, INDEX_FILE)
+
+        tmp_embeddings = embeddings_path + ".tmp"
+        with open(tmp_embeddings, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float16))
+        tmp_index = index_path + ".tmp"
+        with open(tmp_index, "w") as f:
+            json.dump({"model_name": model_name, "pretrained": pretrained, "entries": entries}, f, indent=4)
+
+        os.replace(tmp_embeddings, embeddings_path)
+        os.replace(tmp_index, index_path)
+        logger.info(f"Saved embedding index with {len(entries)} cards to {index_dir}")
+
+
+def _file_entry(path: str, row: int) -> dict:
+    """Return the index entry recording a card's row and the file state it was encoded from."""
+    stat = os.stat(path)
+    return {"row": row, "sha1": file_content_hash(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _encode_batch(model, preprocessor, device, image_paths: List[str]) -> np.ndarray:
+    """Encode a batch of images and return their L2-normalized embeddings."""
+    import torch
+
+    images = [preprocessor(path) for path in image_paths]
+    image_input = torch.stack(images).to(device)
+    with torch.no_grad():
+        features = model.encode_image(image_input)
+        features = torch.nn.functional.normalize(features.float(), dim=-1)
+    return features.cpu().numpy()
+
+
+def build_index(
+    image_paths: Iterable[str],
+    model_manager,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    batch_size: int = 16
+) -> ImageEmbeddingIndex:
+    """
+    Encode every card once and persist the embeddings as a memory-mappable index.
+
+    Args:
+        image_paths: The card image paths to encode.
+        model_manager: The centralized ModelManager instance.
+        index_dir: Directory where the embedding matrix and index are written.
+        batch_size: Number of images per visual forward pass.
+
+    Returns:
+        The freshly loaded ImageEmbeddingIndex.
+    """
+    from preprocess import DEFAULT_PIXEL_CACHE_DIR, PixelCache, Preprocessor
+
+    model = model_manager.get_model()
+    preprocessor = Preprocessor(model_manager.get_transform())
+    preprocessor.pixel_cache = PixelCache.load_if_exists(DEFAULT_PIXEL_CACHE_DIR, preprocessor)
+    device = model_manager.get_device()
+
+    paths = [canonical_path(path) for path in image_paths]
+    start_time = time.time()
+    chunks = []
+    entries = {}
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        chunks.append(_encode_batch(model, preprocessor, device, batch))
+        for offset, path in enumerate(batch):
+            entries[path] = _file_entry(path, start + offset)
+        logger.info(f"Encoded {min(start + batch_size, len(paths))}/{len(paths)} cards.")
+
+    embeddings = np.concatenate(chunks) if chunks else np.zeros((0, 0), dtype=np.float16)
+    ImageEmbeddingIndex.save(index_dir, embeddings, entries, model_manager.model_name, model_manager.pretrained)
+    logger.info(f"Embedding index built in {time.time() - start_time:.2f} seconds.")
+    return ImageEmbeddingIndex.load(index_dir)
+
+
+def update_index(
+    embeddings_by_path: Dict[str, np.ndarray],
+    model_name: str,
+    pretrained: str,
+    index_dir: str = DEFAULT_INDEX_DIR
+) -> ImageEmbeddingIndex:
+    """
+    Add or replace card embeddings in the on-disk index, rewriting it atomically.
+
+    Cards already in the index keep their row; new cards are appended. An
+    index built for another model is replaced.
+
+    Args:
+        embeddings_by_path: L2-normalized embedding per card path.
+        model_name: The open_clip model the embeddings were produced with.
+        pretrained: The pretrained tag the embeddings were produced with.
+        index_dir: Directory holding the index.
+
+    Returns:
+        The updated ImageEmbeddingIndex.
+    """
+    existing = ImageEmbeddingIndex.load_if_exists(index_dir, model_name, pretrained)
+    if existing is not None and len(existing):
+        # Copy out of the memmap: the file is about to be replaced.
+        rows = list(np.array(existing.embeddings, dtype=np.float16))
+        entries = {path: dict(entry) for path, entry in existing._entries.items()}
+    else:
+        rows, entries = [], {}
+
+    for path, embedding in embeddings_by_path.items():
+        key = canonical_path(path)
+        row = entries[key]["row"] if key in entries else len(rows)
+        embedding = np.asarray(embedding, dtype=np.float16)
+        if row == len(rows):
+            rows.append(embedding)
+        else:
+            rows[row] = embedding
+        entries[key] = _file_entry(key, row)
+
+    embeddings = np.stack(rows) if rows else np.zeros((0, 0), dtype=np.float16)
+    ImageEmbeddingIndex.save(index_dir, embeddings, entries, model_name, pretrained)
+    return ImageEmbeddingIndex.load(index_dir)
+
+
+if __name__ == "__main__":
+    from model_manager import ModelManager
+
+    logging.basicConfig(level=logging.INFO)
+
+    cards_directory = "data/images/cards"
+    build_index(list_card_images(cards_directory), ModelManager())
@@ -1,9 +1,12 @@
 import logging
-from typing import List
-from model_manager import ModelManager
+from typing import TYPE_CHECKING, List
 from players import Player, Human, Bot
 from deck import setup_deck, deal_cards
 from scoring import collect_cards_from_players, collect_votes_from_players, handle_round_end
+from resources import report_session
+
+if TYPE_CHECKING:
+    from model_manager import ModelManager
 
 logger = logging.getLogger('game_logic')
 
@@ -11,6 +14,9 @@ WINNING_SCORE = 30
 NUM_CARDS = 6
 
 def terminal_game_loop():
+    # torch and open_clip are only imported once a game actually starts.
+    from model_manager import ModelManager
+
     model_manager = ModelManager()
     players = setup_players(model_manager)
     deck, discard_pile = setup_deck()
@@ -33,9 +39,10 @@ def terminal_game_loop():
         storyteller = rotate_storyteller(players, storyteller)
 
     print("Game Over! Thanks for playing!")
+    report_session()
 
 
-def setup_players(model_manager: ModelManager) -> List[Player]:
+def setup_players(model_manager: "ModelManager") -> List[Player]:
     player_names = input("Enter player names, separated by commas: ").split(',')
     player_names = [name.strip() for name in player_names if name.strip()]
     num_bots = int(input("Enter the number of bots: "))
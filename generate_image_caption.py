@@ -1,11 +1,15 @@
 import os
 import warnings
 import logging
+import time
 import torch
-import open_clip
 import json
-from PIL import Image
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from preprocess import DEFAULT_PIXEL_CACHE_DIR, PixelCache, Preprocessor
+from metrics import metrics
+from embedding_index import list_card_images
 
 warnings.filterwarnings(
     "ignore", category=FutureWarning, message=".*weights_only=False.*"
@@ -13,17 +17,35 @@ warnings.filterwarnings(
 
 logger = logging.getLogger('image_captioning')
 
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_NUM_WORKERS = 4
+
 
 class ImageCaptionGenerator:
-    def __init__(self, model_manager):
+    def __init__(self, model_manager, batch_size: int = 1, num_workers: int = DEFAULT_NUM_WORKERS, client=None):
         """
         Initialize the ImageCaptionGenerator with a centralized ModelManager.
 
         Args:
             model_manager: The ModelManager instance managing the model and device.
+            batch_size: Number of images stacked into each `generate` call in batched mode.
+            num_workers: Threads decoding and preprocessing images ahead of the model.
+            client: Optional InferenceClient. When given, captions come from the
+                inference server and this process never loads the model.
         """
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.num_workers = max(1, num_workers)
+        if client is not None:
+            self.model = self.transform = self.preprocessor = self.decode = None
+            self.device = torch.device("cpu")
+            logger.info(f"ImageCaptionGenerator initialized as a client of the inference server at {client.address}")
+            return
         self.model = model_manager.get_model()
         self.transform = model_manager.get_transform()
+        self.decode = model_manager.get_decoder()
+        self.preprocessor = Preprocessor(self.transform)
+        self.preprocessor.pixel_cache = PixelCache.load_if_exists(DEFAULT_PIXEL_CACHE_DIR, self.preprocessor)
         self.device = model_manager.get_device()
         logger.info(f"ImageCaptionGenerator initialized with model on device: {self.device}")
 
@@ -37,103 +59,321 @@ class ImageCaptionGenerator:
         Returns:
             The generated caption as a string, or None if an error occurs.
         """
-        image = self._load_image(image_path)
-        if image is None:
-            return None
-
-        image_tensor = self._prepare_image_tensor(image, image_path)
+        if self.client is not None:
+            return self.client.caption([image_path])[0]
+        image_tensor = self._load_and_transform(image_path)
         if image_tensor is None:
             return None
 
-        return self._generate_caption_from_tensor(image_tensor, image_path)
+        return self._generate_caption_from_tensor(image_tensor.unsqueeze(0).to(self.device), image_path)
 
-    def _load_image(self, image_path: str) -> Optional[Image.Image]:
-        """Load an image from the given path."""
+    def _generate_caption_from_tensor(self, image_tensor: torch.Tensor, image_path: str) -> Optional[str]:
+        """Generate a caption from the image tensor using the model."""
         try:
-            image = Image.open(image_path).convert("RGB")
-            logger.info(f"Image {image_path} loaded successfully.")
-            return image
+            with metrics.span("caption"), torch.no_grad(), torch.autocast(device_type=self.device.type):
+                generated = self.model.generate(image_tensor)
+            metrics.increment("caption_model_calls")
+            caption = self._decode_caption(generated[0])
+            logger.debug("Caption generated for %s: %s", image_path, caption)
+            return caption
         except Exception as e:
-            logger.error(f"Failed to load image {image_path}: {e}")
+            logger.error(f"Error generating caption for {image_path}: {e}")
             return None
 
-    def _prepare_image_tensor(self, image: Image.Image, image_path: str) -> Optional[torch.Tensor]:
-        """Transform the image into a tensor suitable for model input."""
+    def _decode_caption(self, tokens: torch.Tensor) -> str:
+        """Turn generated token ids into a clean caption string."""
+        return (
+            self.decode(tokens)
+            .split("<end_of_text>")[0]
+            .replace("<start_of_text>", "")
+            .strip()
+        )
+
+    def _load_and_transform(self, image_path: str) -> Optional[torch.Tensor]:
+        """Decode and preprocess one image on a worker thread, leaving it on the CPU. Uses the pixel cache when possible."""
         try:
-            image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            logger.debug(f"Image tensor created for {image_path}, shape: {image_tensor.shape}.")
-            return image_tensor
+            return self.preprocessor(image_path)
         except Exception as e:
-            logger.error(f"Failed to transform image {image_path} into tensor: {e}")
+            logger.error(f"Failed to load image {image_path}: {e}")
             return None
 
-    def _generate_caption_from_tensor(self, image_tensor: torch.Tensor, image_path: str) -> Optional[str]:
-        """Generate a caption from the image tensor using the model."""
+    def _prefetch(self, image_paths: Sequence[str]) -> Iterator[Tuple[str, Optional[torch.Tensor]]]:
+        """
+        Yield (path, tensor) pairs in order while worker threads decode ahead.
+
+        At most two batches are in flight, so the model never waits on JPEG
+        decoding and memory stays bounded regardless of deck size.
+        """
+        lookahead = self.batch_size * 2
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            pending = deque()
+            paths = iter(image_paths)
+            for path in paths:
+                pending.append((path, executor.submit(self._load_and_transform, path)))
+                if len(pending) >= lookahead:
+                    break
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(self._load_and_transform, next_path)))
+                yield path, future.result()
+
+    def _generate_captions_from_batch(self, image_tensors: List[torch.Tensor], image_paths: List[str]) -> List[Optional[str]]:
+        """Generate captions for a stacked batch with a single `generate` call."""
         try:
-            with torch.no_grad(), torch.autocast(device_type=self.device.type):
-                generated = self.model.generate(image_tensor)
-            caption = (
-                open_clip.decode(generated[0])
-                .split("<end_of_text>")[0]
-                .replace("<start_of_text>", "")
-            )
-            logger.info(f"Caption generated for {image_path}: {caption}")
-            return caption.strip()
+            batch = torch.stack(image_tensors).to(self.device)
+            with metrics.span("caption"), torch.no_grad(), torch.autocast(device_type=self.device.type):
+                generated = self.model.generate(batch)
+            metrics.increment("caption_model_calls")
+            return [self._decode_caption(tokens) for tokens in generated]
         except Exception as e:
-            logger.error(f"Error generating caption for {image_path}: {e}")
-            return None
+            logger.error(f"Error generating captions for batch starting at {image_paths[0]}: {e}")
+            return [None] * len(image_paths)
+
+    def iter_captions(self, image_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Caption many images in batches of `batch_size`, yielding results as they finish.
+
+        Args:
+            image_paths: The image files to caption.
+
+        Yields:
+            (image_path, caption) pairs in input order; caption is None on failure.
+        """
+        if self.client is not None:
+            image_paths = list(image_paths)
+            for start in range(0, len(image_paths), self.batch_size):
+                batch_paths = image_paths[start:start + self.batch_size]
+                yield from zip(batch_paths, self.client.caption(batch_paths))
+            return
+        # Failed images wait in `buffered` with the batch around them, so results keep the input order.
+        buffered, batch_tensors = [], []
+        for path, tensor in self._prefetch(list(image_paths)):
+            buffered.append((path, tensor is not None))
+            if tensor is not None:
+                batch_tensors.append(tensor)
+            if len(batch_tensors) == self.batch_size:
+                yield from self._caption_buffered(buffered, batch_tensors)
+                buffered, batch_tensors = [], []
+        if buffered:
+            yield from self._caption_buffered(buffered, batch_tensors)
 
+    def _caption_buffered(
+        self,
+        buffered: List[Tuple[str, bool]],
+        batch_tensors: List[torch.Tensor]
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """Caption a batch and yield it with the failed images between its entries, in input order."""
+        loaded = [path for path, ok in buffered if ok]
+        captions = iter(self._generate_captions_from_batch(batch_tensors, loaded) if loaded else [])
+        for path, ok in buffered:
+            yield path, next(captions) if ok else None
 
-def generate_captions_for_all_images(directory: str, model_manager) -> dict:
+    def generate_captions(self, image_paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Caption many images in batched mode and return a path-to-caption mapping."""
+        return dict(self.iter_captions(image_paths))
+
+
+def generate_captions_for_all_images(
+    directory: str,
+    model_manager,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_workers: int = DEFAULT_NUM_WORKERS
+) -> dict:
     """
     Generate captions for all image files in the specified directory.
 
     Args:
         directory: The path to the directory containing the images.
         model_manager: The centralized ModelManager instance.
+        batch_size: Number of images captioned per `generate` call.
+        num_workers: Threads decoding and preprocessing images ahead of the model.
 
     Returns:
         A dictionary mapping image paths to their generated captions.
     """
     logger.info(f"Generating captions for all images in directory: {directory}")
-    caption_generator = ImageCaptionGenerator(model_manager)
+    caption_generator = ImageCaptionGenerator(model_manager, batch_size=batch_size, num_workers=num_workers)
     captions = {}
 
-    for filename in os.listdir(directory):
-        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
-            image_path = os.path.join(directory, filename)
-            caption = caption_generator.generate_caption(image_path)
-            if caption:
-                captions[image_path] = caption
-                logger.debug(f"Caption generated for {filename}: {caption}")
-            else:
-                logger.warning(f"Caption generation failed for {filename}.")
-
-    logger.info(f"Caption generation completed for directory: {directory}")
+    start_time = time.perf_counter()
+    processed = 0
+    for image_path, caption in caption_generator.iter_captions(list_card_images(directory)):
+        processed += 1
+        if caption:
+            captions[image_path] = caption
+            logger.debug(f"Caption generated for {image_path}: {caption}")
+        else:
+            logger.warning(f"Caption generation failed for {image_path}.")
+
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Caption generation completed for directory: {directory} "
+        f"({processed} images, {processed / elapsed if elapsed else 0.0:.2f} images/sec at batch size {batch_size})"
+    )
     return captions
 
 
+def benchmark_caption_throughput(
+    image_paths: List[str],
+    model_manager,
+    batch_sizes: Sequence[int] = (1, 2, 4, 8, 16),
+    num_workers: int = DEFAULT_NUM_WORKERS
+) -> Dict[int, float]:
+    """
+    Measure captioning throughput for several batch sizes.
+
+    Args:
+        image_paths: The images to caption for each batch size.
+        model_manager: The centralized ModelManager instance.
+        batch_sizes: The batch sizes to try.
+        num_workers: Threads decoding and preprocessing images ahead of the model.
+
+    Returns:
+        A dictionary mapping batch size to images/sec.
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        caption_generator = ImageCaptionGenerator(model_manager, batch_size=batch_size, num_workers=num_workers)
+        start_time = time.perf_counter()
+        count = sum(1 for _ in caption_generator.iter_captions(image_paths))
+        elapsed = time.perf_counter() - start_time
+        results[batch_size] = count / elapsed if elapsed else 0.0
+        logger.info(f"Batch size {batch_size}: {results[batch_size]:.2f} images/sec")
+    return results
+
+
 def save_captions_to_file(captions: dict, output_file: str):
     """
     Save the generated captions to a JSON file.
 
+    The file is written to a temporary path and renamed into place, so an
+    interrupted save never leaves a truncated caption file behind.
+
     Args:
         captions: The dictionary of captions to save.
         output_file: The path to the JSON file to save the captions.
     """
+    tmp_file = output_file + ".tmp"
     try:
-        with open(output_file, "w") as f:
+        with open(tmp_file, "w") as f:
             json.dump(captions, f, indent=4)
+        os.replace(tmp_file, output_file)
         logger.info(f"All captions have been generated and saved to {output_file}.")
     except Exception as e:
         logger.error(f"Failed to save captions to {output_file}: {e}")
 
 
+def _file_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_caption_checkpoint(checkpoint_file: str) -> Tuple[Dict[str, dict], bool]:
+    """
+    Read a JSONL caption checkpoint.
+
+    Args:
+        checkpoint_file: The append-only checkpoint written by build_captions.
+
+    Returns:
+        A mapping of image path to its latest record, and whether any line was
+        unreadable (e.g. cut short by a crash mid-write).
+    """
+    records = {}
+    damaged = False
+    if not os.path.exists(checkpoint_file):
+        return records, damaged
+    with open(checkpoint_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                records[record["path"]] = record
+            except (ValueError, KeyError):
+                damaged = True
+    return records, damaged
+
+
+def _write_checkpoint(records: Iterable[dict], checkpoint_file: str):
+    """Atomically rewrite the checkpoint with one line per image."""
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_file, checkpoint_file)
+
+
+def build_captions(
+    directory: str,
+    model_manager,
+    output_file: str,
+    checkpoint_file: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_workers: int = DEFAULT_NUM_WORKERS
+) -> dict:
+    """
+    Caption a directory resumably, streaming each caption to a JSONL checkpoint.
+
+    Images whose size and mtime match their checkpoint record are skipped, so
+    a restart after a crash, or a run after adding a few cards, only captions
+    what is missing or changed. When all images are done the checkpoint is
+    compacted and the final JSON caption file is written.
+
+    Args:
+        directory: The path to the directory containing the images.
+        model_manager: The centralized ModelManager instance.
+        output_file: The final JSON caption file.
+        checkpoint_file: The JSONL checkpoint. Defaults to `output_file` with a .jsonl suffix.
+        batch_size: Number of images captioned per `generate` call.
+        num_workers: Threads decoding and preprocessing images ahead of the model.
+
+    Returns:
+        A dictionary mapping image paths to their captions.
+    """
+    checkpoint_file = checkpoint_file or os.path.splitext(output_file)[0] + ".jsonl"
+    records, damaged = load_caption_checkpoint(checkpoint_file)
+    if damaged:
+        logger.warning(f"Dropping unreadable lines from checkpoint {checkpoint_file}.")
+        _write_checkpoint(records.values(), checkpoint_file)
+
+    image_paths = list_card_images(directory)
+    pending = [
+        path for path in image_paths
+        if path not in records
+        or {k: records[path].get(k) for k in ("size", "mtime_ns")} != _file_signature(path)
+    ]
+    logger.info(
+        f"{len(image_paths) - len(pending)} of {len(image_paths)} images already captioned; "
+        f"captioning {len(pending)}."
+    )
+
+    if pending:
+        caption_generator = ImageCaptionGenerator(model_manager, batch_size=batch_size, num_workers=num_workers)
+        with open(checkpoint_file, "a") as f:
+            for image_path, caption in caption_generator.iter_captions(pending):
+                if not caption:
+                    logger.warning(f"Caption generation failed for {image_path}.")
+                    continue
+                record = {"path": image_path, "caption": caption, **_file_signature(image_path)}
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                records[image_path] = record
+
+    current = [records[path] for path in image_paths if path in records]
+    _write_checkpoint(current, checkpoint_file)
+    captions = {record["path"]: record["caption"] for record in current}
+    save_captions_to_file(captions, output_file)
+    return captions
+
+
 if __name__ == "__main__":
-    from src.main import model_manager  # Import the centralized ModelManager
+    from model_manager import ModelManager
 
     logging.basicConfig(level=logging.INFO)
     
     cards_directory = "data/images/cards"
-    captions = generate_captions_for_all_images(cards_directory, model_manager)
-    save_captions_to_file(captions, "data/json/cards_captions.json")
+    build_captions(cards_directory, ModelManager(), "data/json/cards_captions.json")
@@ -0,0 +1,64 @@
+import os
+import re
+import sys
+import logging
+import subprocess
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('import_budget')
+
+# Modules that must stay cheap to import: a human-only game or a results
+# script should reach its first prompt without loading any model stack.
+BUDGETED_MODULES = ["players", "game_logic"]
+IMPORT_BUDGET_SECONDS = 0.25
+HEAVY_MODULES = ["torch", "open_clip", "spacy", "openai", "dotenv", "numpy", "PIL"]
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    Import a module in a fresh interpreter under `python -X importtime`.
+
+    Returns:
+        The cumulative import time of the module in seconds, and the top-level
+        packages it pulled in.
+    """
+    # Run from the repository root, where the flat modules live, whatever the caller's cwd.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    cumulative: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    imported = sorted({name.split(".")[0] for name in cumulative})
+    return cumulative.get(module, 0) / 1e6, imported
+
+
+def check_import_budget(
+    modules: List[str] = BUDGETED_MODULES,
+    budget_seconds: float = IMPORT_BUDGET_SECONDS
+) -> List[str]:
+    """Return a list of budget violations; empty when every module is within budget."""
+    failures = []
+    for module in modules:
+        seconds, imported = measure_import(module)
+        heavy = [name for name in HEAVY_MODULES if name in imported]
+        logger.info(f"import {module}: {seconds * 1000:.1f} ms")
+        if heavy:
+            failures.append(f"import {module} pulls in {', '.join(heavy)}")
+        if seconds > budget_seconds:
+            failures.append(f"import {module} took {seconds:.3f}s (budget {budget_seconds:.3f}s)")
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    failures = check_import_budget()
+    for failure in failures:
+        logger.error(failure)
+    sys.exit(1 if failures else 0)
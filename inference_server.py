@@ -0,0 +1,390 @@
+import os
+import time
+import queue
+import socket
+import secrets
+import logging
+import argparse
+import threading
+import numpy as np
+from collections import defaultdict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger('inference_server')
+
+DEFAULT_ADDRESS = "/tmp/humanstoryteller-inference.sock" if hasattr(socket, "AF_UNIX") else "localhost:6123"
+AUTHKEY_ENV = "INFERENCE_SERVER_AUTHKEY"
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+# Longest a connection waits for its batch before answering with an error.
+DEFAULT_REQUEST_TIMEOUT = 300.0
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Address:
+    """Turn "host:port" into a TCP address tuple; anything else is a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return address
+
+
+def _family(address: Address) -> str:
+    return "AF_INET" if isinstance(address, tuple) else "AF_UNIX"
+
+
+def key_path(address: Address) -> Optional[str]:
+    """Return the file a Unix socket server writes its generated authkey to, or None for TCP."""
+    return None if isinstance(address, tuple) else address + ".key"
+
+
+def _environment_authkey() -> Optional[bytes]:
+    value = os.getenv(AUTHKEY_ENV)
+    return value.encode() if value else None
+
+
+def client_authkey(address: Address, authkey: Optional[bytes] = None) -> bytes:
+    """
+    Return the key a client presents: the explicit one, else INFERENCE_SERVER_AUTHKEY,
+    else (Unix sockets only) the key file written by the running server.
+    """
+    authkey = authkey or _environment_authkey()
+    path = key_path(address)
+    if authkey is None and path is not None and os.path.exists(path):
+        with open(path, "rb") as f:
+            authkey = f.read()
+    if not authkey:
+        raise ValueError(f"No authkey for the inference server at {address}; set {AUTHKEY_ENV}.")
+    return authkey
+
+
+class _PendingRequest:
+    __slots__ = ("op", "payload", "done", "result", "error", "abandoned")
+
+    def __init__(self, op: str, payload: Any):
+        self.op = op
+        self.payload = payload
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[str] = None
+        # Set once the connection stopped waiting, so the batcher skips the request.
+        self.abandoned = False
+
+    @property
+    def size(self) -> int:
+        return len(self.payload["cards"]) if self.op == "score" else len(self.payload)
+
+
+class InferenceServer:
+    def __init__(
+        self,
+        model_manager,
+        address: Address = DEFAULT_ADDRESS,
+        authkey: Optional[bytes] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        similarity=None,
+        caption_generator=None
+    ):
+        """
+        Serve one shared model to many game processes over a local socket.
+
+        Requests from all connected clients go into one queue. A batcher thread
+        takes the first waiting request, keeps collecting for up to
+        `max_wait_ms` (or until `max_batch_size` items are queued), and runs
+        each operation once for the whole group.
+
+        Args:
+            model_manager: The ModelManager owning the model. Only the server loads it.
+            address: Unix socket path or (host, port).
+            authkey: Shared secret clients must present. Required for TCP; for a
+                Unix socket a random key is generated per run and written to
+                key_path(address), readable only by the current user.
+            max_batch_size: Items (images, texts or cards) that close a batch early.
+            max_wait_ms: Longest time the first request of a batch waits for company.
+            request_timeout: Seconds a request may wait for its batch before failing. A request
+                that timed out before its batch started is dropped, not computed.
+            similarity: ImageTextSimilarity to serve. Defaults to one built on model_manager.
+            caption_generator: ImageCaptionGenerator to serve. Defaults to one built on model_manager.
+        """
+        self.model_manager = model_manager
+        self.address = address
+        # Connections unpickle what they receive, so the server never runs without a secret key.
+        authkey = authkey or _environment_authkey()
+        self._generated_key = authkey is None
+        if self._generated_key:
+            if isinstance(address, tuple):
+                raise ValueError(f"A TCP inference server needs an explicit authkey (set {AUTHKEY_ENV}).")
+            authkey = secrets.token_bytes(32)
+        self.authkey = authkey
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.request_timeout = request_timeout
+        if similarity is None:
+            from similarity import ImageTextSimilarity
+            similarity = ImageTextSimilarity(model_manager)
+        if caption_generator is None:
+            from generate_image_caption import ImageCaptionGenerator
+            caption_generator = ImageCaptionGenerator(model_manager, batch_size=self.max_batch_size)
+        self.similarity = similarity
+        self.caption_generator = caption_generator
+        self._handlers = {
+            "encode_image": self._encode_images,
+            "encode_text": self._encode_texts,
+            "score": self._score,
+            "caption": self._caption,
+        }
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._listener: Optional[Listener] = None
+        self.batches = 0
+        self.batched_requests = 0
+
+    def info(self) -> Dict[str, str]:
+        return {
+            "model_name": self.model_manager.model_name,
+            "pretrained": self.model_manager.pretrained,
+            "precision": getattr(self.model_manager, "precision", "fp32"),
+        }
+
+    def serve_forever(self):
+        """Accept clients until shutdown() is called."""
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        self._listener = Listener(self.address, family=_family(self.address), authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0o600)
+            if self._generated_key:
+                fd = os.open(key_path(self.address), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self.authkey)
+        threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True).start()
+        logger.info(
+            f"Inference server listening on {self.address} "
+            f"(max batch {self.max_batch_size}, max wait {self.max_wait * 1000:.1f} ms)."
+        )
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if not self._stopped.is_set():
+                        logger.warning(f"Failed to accept a client: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if isinstance(self.address, str):
+            for path in (self.address, key_path(self.address) if self._generated_key else None):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        # Fail whatever the batcher will no longer pick up.
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request.error = "Inference server shut down."
+            request.done.set()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopped.is_set():
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if op == "info":
+                    conn.send(("ok", self.info()))
+                    continue
+                if op not in self._handlers:
+                    conn.send(("error", f"Unknown operation {op!r}."))
+                    continue
+                request = _PendingRequest(op, payload)
+                self._queue.put(request)
+                if not request.done.wait(self.request_timeout):
+                    request.abandoned = True
+                    logger.error(f"A {op} request timed out after {self.request_timeout:.0f} seconds.")
+                    conn.send(("error", f"Timed out after {self.request_timeout:.0f} seconds waiting for a batch."))
+                    continue
+                conn.send(("error", request.error) if request.error else ("ok", request.result))
+
+    def _batch_loop(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if first.abandoned:
+                continue
+            batch = [first]
+            size = first.size
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request.abandoned:
+                    continue
+                batch.append(request)
+                size += request.size
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_PendingRequest]):
+        by_op: Dict[str, List[_PendingRequest]] = defaultdict(list)
+        for request in batch:
+            by_op[request.op].append(request)
+        for op, requests in by_op.items():
+            start_time = time.perf_counter()
+            try:
+                self._handlers[op](requests)
+            except Exception as e:
+                logger.error(f"Inference server failed on a {op} batch: {e}", exc_info=True)
+                for request in requests:
+                    request.error = f"{type(e).__name__}: {e}"
+            logger.debug(
+                f"{op}: {len(requests)} requests, {sum(r.size for r in requests)} items "
+                f"in {(time.perf_counter() - start_time) * 1000:.1f} ms"
+            )
+            for request in requests:
+                request.done.set()
+        self.batches += 1
+        self.batched_requests += len(batch)
+
+    @staticmethod
+    def _unique(requests: List[_PendingRequest], items_of) -> Tuple[List[str], Dict[str, int]]:
+        unique = list(dict.fromkeys(item for request in requests for item in items_of(request)))
+        return unique, {item: i for i, item in enumerate(unique)}
+
+    def _encode_images(self, requests: List[_PendingRequest]):
+        paths, rows = self._unique(requests, lambda r: r.payload)
+        features = self.similarity.encode_images(paths).cpu().numpy()
+        for request in requests:
+            request.result = features[[rows[path] for path in request.payload]]
+
+    def _encode_texts(self, requests: List[_PendingRequest]):
+        texts, rows = self._unique(requests, lambda r: r.payload)
+        features = self.similarity.encode_texts(texts).cpu().numpy()
+        for request in requests:
+            request.result = features[[rows[text] for text in request.payload]]
+
+    def _score(self, requests: List[_PendingRequest]):
+        from ranking import top_k_indices
+
+        cards, card_rows = self._unique(requests, lambda r: r.payload["cards"])
+        clues, clue_rows = self._unique(requests, lambda r: r.payload["clues"])
+        image_features = self.similarity.encode_images(cards)
+        text_features = self.similarity.encode_texts(clues)
+        scores = (text_features @ image_features.T).cpu().numpy()
+        for request in requests:
+            sub = scores[np.ix_(
+                [clue_rows[clue] for clue in request.payload["clues"]],
+                [card_rows[card] for card in request.payload["cards"]]
+            )]
+            request.result = (sub, top_k_indices(sub, request.payload["top_k"]))
+
+    def _caption(self, requests: List[_PendingRequest]):
+        paths, _ = self._unique(requests, lambda r: r.payload)
+        captions = self.caption_generator.generate_captions(paths)
+        for request in requests:
+            request.result = [captions.get(path) for path in request.payload]
+
+
+class InferenceClient:
+    def __init__(self, address: Address = DEFAULT_ADDRESS, authkey: Optional[bytes] = None):
+        """
+        Client for an InferenceServer. Thread-safe: each thread gets its own connection,
+        so concurrent bots in one process can land in the same server batch.
+
+        The authkey defaults to INFERENCE_SERVER_AUTHKEY, or for a Unix socket to
+        the key file the server generated.
+
+        Card paths are sent as given, so the server must run from the same
+        working directory as the games (the repository root).
+        """
+        self.address = address
+        self.authkey = client_authkey(address, authkey)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        info = self._call("info", None)
+        self.model_name = info["model_name"]
+        self.pretrained = info["pretrained"]
+        self.precision = info["precision"]
+        logger.info(f"Connected to inference server at {address} serving {self.model_name}.")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family=_family(self.address), authkey=self.authkey)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, op: str, payload: Any):
+        conn = self._connection()
+        conn.send((op, payload))
+        status, result = conn.recv()
+        if status == "error":
+            raise RuntimeError(f"Inference server failed on {op}: {result}")
+        return result
+
+    def encode_images(self, image_paths: List[str]) -> np.ndarray:
+        """Return the (N, D) L2-normalized features of the images."""
+        return self._call("encode_image", list(image_paths))
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Return the (M, D) L2-normalized features of the texts."""
+        return self._call("encode_text", list(texts))
+
+    def score(self, card_paths: List[str], clues: List[str], top_k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (M, N) clues-by-cards similarities and the (M, k) top card indices per clue."""
+        payload = {"cards": list(card_paths), "clues": list(clues), "top_k": top_k}
+        return self._call("score", payload)
+
+    def caption(self, image_paths: List[str]) -> List[Optional[str]]:
+        """Return a caption per image, None where captioning failed."""
+        return self._call("caption", list(image_paths))
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+if __name__ == "__main__":
+    from model_manager import ModelManager
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Serve the model to local game processes with dynamic batching.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path or host:port.")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--precision", default=None)
+    args = parser.parse_args()
+
+    manager = ModelManager(precision=args.precision)
+    manager.initialize_model()
+    server = InferenceServer(manager, parse_address(args.address), max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Shutting down after {server.batches} batches ({server.batched_requests} requests).")
@@ -1,11 +1,18 @@
 import os 
 import sys
 import random
-import csv
+import time
 from model_manager import ModelManager
 from players import Player, Human, Bot
+from results_writer import ResultsWriter
+from resources import report_session
 from typing import List, Tuple
 
+RESULT_COLUMNS = [
+    "human_guesser", "round", "storyteller_success", "bot_correct", "human_correct",
+    "clue_seconds", "bot_pick_seconds", "bot_vote_seconds",
+]
+
 ### locked in ###
 def load_images_from_directory(directory):
     initial_deck = []
@@ -35,9 +42,12 @@ def collect_cards_from_player(player, storytellerCard, clue):
     random.shuffle(table)
     return table
 
-def collect_votes_from_players(bot, human, table, clue):
+def collect_votes_from_players(bot, human, table, clue, timings=None):
     votes = []
+    start = time.perf_counter()
     botVote = bot.vote(table, clue)
+    if timings is not None:
+        timings["bot_vote_seconds"] = time.perf_counter() - start
     humanVote = human.vote(table, clue)
     votes.append(botVote)
     votes.append(humanVote)
@@ -51,6 +61,7 @@ def main():
     roundNums = int(sys.argv[1])
     botCards = int(sys.argv[2])
     model_manager = ModelManager()
+    results = ResultsWriter(f'resultsRounds{roundNums}botCards{botCards}_timed.csv', RESULT_COLUMNS, flush_every=10)
     
     i = 0
     while i < roundNums:
@@ -63,7 +74,11 @@ def main():
         print("\n...bot selecting storyteller card...")
         cur_card = deck.pop(0)
         storyBot.hand.append(cur_card)
+        storyBot.on_hand_changed()
+        timings = {}
+        start = time.perf_counter()
         storyTellerCard, clue = storyBot.storyteller_turn()
+        timings["clue_seconds"] = time.perf_counter() - start
 
         j = 0
         print("\n...bot getting cards added to hand...")
@@ -73,9 +88,11 @@ def main():
             guessBot.hand.append(bot_cur)
             j += 1
         print("\n...bot picking cards to play for clue...")
+        start = time.perf_counter()
         table = collect_cards_from_player(guessBot, storyTellerCard, clue)
+        timings["bot_pick_seconds"] = time.perf_counter() - start
         print("\n...voting phase commencing...")
-        votes = collect_votes_from_players(guessBot, human, table, clue)
+        votes = collect_votes_from_players(guessBot, human, table, clue, timings)
         
         print("\n...finding which card was storyteller's...")
         correctIndex = 0
@@ -100,14 +117,22 @@ def main():
             humanCorrect = 1    
         storyTellerSuccess = abs(humanCorrect-botCorrect)
 
-        print("\n...writing results to csv...")
-        with open(f'resultsRounds{roundNums}botCards{botCards}.csv','a', newline='') as csvfile:
-            resultWriter = csv.writer(csvfile, delimiter=' ')
-            resultWriter.writerow(["human guesser", ",", "round in game", ",", "storyteller success (binary)", ",", "bot correct (binary)", ",", "human correct (binary)"])
-            resultWriter.writerow([human.name, ",",  i+1, ",", storyTellerSuccess, ",", botCorrect, ",", humanCorrect])
+        print("\n...recording results...")
+        results.write_row({
+            "human_guesser": human.name,
+            "round": i + 1,
+            "storyteller_success": storyTellerSuccess,
+            "bot_correct": botCorrect,
+            "human_correct": humanCorrect,
+            **timings,
+        })
 
-        
+        # Bots are rebuilt every round; stop this round's clue prefetching.
+        storyBot.close()
+        guessBot.close()
         i += 1 
+    results.close()
+    report_session()
     print(" --- ROUND LIMIT REACHED TERMINATING PROGRAM----")
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('metrics')
+
+# Set to an output file to turn instrumentation on for a session, e.g.
+# STORYTELLER_METRICS=metrics.json or STORYTELLER_METRICS=metrics.prom.
+METRICS_ENV = "STORYTELLER_METRICS"
+PROMETHEUS_PREFIX = "storyteller"
+
+# Bucket upper bounds in seconds: roughly three per decade from 1ms to ~2 minutes.
+DEFAULT_BUCKETS = [
+    round(base * 10 ** exponent, 6)
+    for exponent in range(-3, 3)
+    for base in (1.0, 2.0, 5.0)
+]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Optional[List[float]] = None):
+        """
+        Fixed-bucket latency histogram with approximate percentiles.
+
+        Args:
+            buckets: Sorted bucket upper bounds in seconds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = list(buckets or DEFAULT_BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        Return the approximate p-th percentile (0-100) in seconds.
+
+        The answer is the upper bound of the bucket holding the percentile,
+        clamped to the largest value actually observed.
+        """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = p / 100.0 * self.count
+            seen = 0
+            for i, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank and bucket_count:
+                    bound = self.buckets[i] if i < len(self.buckets) else self.max
+                    return min(bound, self.max)
+            return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class _NullSpan:
+    """Shared do-nothing span handed out while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False, output: Optional[str] = None):
+        """
+        Timing spans and counters for the hot paths.
+
+        While disabled, span() returns a shared no-op context manager and
+        increment() returns immediately, so instrumented code pays one
+        attribute check per call.
+
+        Args:
+            enabled: Whether to record anything.
+            output: File export_session() writes to; .prom or .txt selects the
+                Prometheus text format, anything else JSON.
+        """
+        self.enabled = enabled
+        self.output = output
+        self._spans: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._reports: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def span(self, name: str):
+        """Return a context manager timing its block into the `name` histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self._spans[name])
+
+    def increment(self, name: str, amount: float = 1):
+        if not self.enabled or not amount:
+            return
+        with self._lock:
+            self._counters[name] += amount
+
+    def add_report(self, name: str, values: dict):
+        """Attach a summary computed elsewhere (e.g. cache stats) to the session export."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._reports[name] = values
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+            self._reports.clear()
+            self._started = time.time()
+
+    def snapshot(self) -> Dict[str, object]:
+        """Return span summaries (in seconds), counter values and reports recorded so far."""
+        spans = {}
+        for name, histogram in list(self._spans.items()):
+            summary = histogram.summary()
+            summary["total"] = histogram.total
+            spans[name] = summary
+        with self._lock:
+            counters = dict(self._counters)
+            reports = dict(self._reports)
+        return {
+            "session_started": self._started,
+            "session_seconds": time.time() - self._started,
+            "spans": spans,
+            "counters": counters,
+            "reports": reports,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """
+        Render spans as Prometheus histograms, counters as counters and the
+        numeric fields of reports as gauges (text exposition format).
+        """
+        lines = []
+        for name, histogram in sorted(self._spans.items()):
+            metric = f"{PROMETHEUS_PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            with histogram._lock:
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.total:.6f}")
+                lines.append(f"{metric}_count {histogram.count}")
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for name, value in counters:
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        with self._lock:
+            reports = sorted(self._reports.items())
+        for name, values in reports:
+            for key, value in sorted(_numeric_fields(values).items()):
+                metric = f"{PROMETHEUS_PREFIX}_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write the current snapshot to `path`, as Prometheus text for .prom/.txt files and JSON otherwise."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        logger.info(f"Session metrics written to {path}.")
+
+    def export_session(self):
+        """Export to the configured output at the end of a game session, if enabled."""
+        if self.enabled and self.output:
+            self.export(self.output)
+
+
+def _numeric_fields(values: dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten a nested report into {"a_b": number} pairs, dropping non-numeric values."""
+    fields = {}
+    for key, value in values.items():
+        name = "".join(c if c.isalnum() else "_" for c in f"{prefix}{key}")
+        if isinstance(value, dict):
+            fields.update(_numeric_fields(value, name + "_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields[name] = value
+    return fields
+
+
+def _from_environment() -> Metrics:
+    output = os.getenv(METRICS_ENV)
+    return Metrics(enabled=bool(output), output=output)
+
+
+# Process-wide instance used by the instrumented hot paths.
+metrics = _from_environment()
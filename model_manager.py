@@ -5,9 +5,16 @@ import warnings
 import logging
 import time
 import threading
+from precision import (
+    FP32, DYNAMIC_INT8, STATIC_INT8, CARDS_DIRECTORY, DEFAULT_CALIBRATION_IMAGES, DEFAULT_CALIBRATION_TEXTS,
+    apply_precision, load_calibration_images
+)
 
 logger = logging.getLogger('model')
 
+DEFAULT_SNAPSHOT_DIR = "data/models"
+SNAPSHOT_FORMAT = 2
+
 class ModelManager:
     _instance = None
     _lock = threading.Lock()
@@ -28,7 +35,10 @@ class ModelManager:
         self,
         model_name="coca_ViT-L-14",
         pretrained="mscoco_finetuned_laion2B-s13B-b90k",
-        quantize=False
+        quantize=False,
+        snapshot_dir=DEFAULT_SNAPSHOT_DIR,
+        use_snapshot=True,
+        precision=None
     ):
         if self.__initialized:
             return
@@ -41,6 +51,10 @@ class ModelManager:
         self.tokenizer = None
         self.transform = None
         self.quantize = quantize
+        # quantize=True predates precision modes and means dynamic int8.
+        self.precision = precision or (DYNAMIC_INT8 if quantize else FP32)
+        self.snapshot_dir = snapshot_dir
+        self.use_snapshot = use_snapshot
         self.__initialized = True
         self.model_loading_complete = False
         logger.info(f"ModelManager initialized with device {self.device}")
@@ -48,6 +62,10 @@ class ModelManager:
     def initialize_model(self):
         with self._lock:
             if self.model is None or self.transform is None:
+                if self.use_snapshot and self._load_snapshot(self.snapshot_path()):
+                    self.model_loading_complete = True
+                    return self.model, self.transform, self.device
+
                 logger.info(f"Loading model {self.model_name} with pretrained weights: {self.pretrained}")
                 try:
                     start_time = time.time()
@@ -56,16 +74,102 @@ class ModelManager:
                     )
                     self.model = self.model.to(self.device)
                     self.tokenizer = open_clip.get_tokenizer(self.model_name)
-                    if self.quantize:
-                        self.apply_quantization()
+                    if self.precision in (DYNAMIC_INT8, STATIC_INT8):
+                        self.apply_precision()
                     load_duration = time.time() - start_time
                     logger.info(f"Model loaded in {load_duration:.2f} seconds on device: {self.device}.")
                     self.model_loading_complete = True
                 except Exception as e:
                     logger.error(f"Error initializing model: {e}", exc_info=True)
                     raise
+
+                if self.use_snapshot:
+                    try:
+                        self.save_snapshot(build_seconds=load_duration)
+                    except Exception as e:
+                        logger.warning(f"Could not save model snapshot: {e}")
         return self.model, self.transform, self.device
 
+    @property
+    def weights_precision(self):
+        """The precision the stored weights are in; bf16 autocasts fp32 weights at run time."""
+        return self.precision if self.precision in (DYNAMIC_INT8, STATIC_INT8) else FP32
+
+    def snapshot_path(self):
+        """Return the snapshot file for the current model name, pretrained tag and weights precision."""
+        suffix = "" if self.weights_precision == FP32 else f"-{self.weights_precision}"
+        filename = f"{self.model_name}__{self.pretrained}{suffix}.pt".replace("/", "_")
+        return os.path.join(self.snapshot_dir, filename)
+
+    def save_snapshot(self, path=None, build_seconds=None):
+        """
+        Save the fully prepared model (quantized if enabled) and its transform to a single file.
+
+        Later processes load it with memory-mapped weights instead of rebuilding
+        the architecture, reading the pretrained checkpoint and re-quantizing.
+        """
+        if self.model is None:
+            raise ValueError("Model must be initialized before saving a snapshot.")
+        path = path or self.snapshot_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "model_name": self.model_name,
+            "pretrained": self.pretrained,
+            "precision": self.weights_precision,
+            "torch_version": torch.__version__,
+            "open_clip_version": getattr(open_clip, "__version__", "unknown"),
+            "build_seconds": build_seconds,
+            "model": self.model,
+            "transform": self.transform,
+            "tokenizer_name": self.model_name,
+        }
+        tmp_path = path + ".tmp"
+        torch.save(snapshot, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Model snapshot saved to {path}.")
+
+    def _load_snapshot(self, path):
+        """Load a matching snapshot if one exists. Returns True on success."""
+        if not os.path.exists(path):
+            return False
+        start_time = time.time()
+        try:
+            try:
+                snapshot = torch.load(path, map_location=self.device, mmap=True, weights_only=False)
+            except TypeError:
+                # torch < 2.1 has no memory-mapped loading.
+                snapshot = torch.load(path, map_location=self.device)
+        except Exception as e:
+            logger.warning(f"Could not read model snapshot {path}: {e}")
+            return False
+
+        expected = {
+            "format": SNAPSHOT_FORMAT,
+            "model_name": self.model_name,
+            "pretrained": self.pretrained,
+            "precision": self.weights_precision,
+            "torch_version": torch.__version__,
+        }
+        mismatched = [key for key, value in expected.items() if snapshot.get(key) != value]
+        if mismatched:
+            logger.info(f"Ignoring model snapshot {path}: {', '.join(mismatched)} differ.")
+            return False
+
+        self.model = snapshot["model"].to(self.device)
+        self.transform = snapshot["transform"]
+        self.tokenizer = open_clip.get_tokenizer(snapshot["tokenizer_name"])
+        load_duration = time.time() - start_time
+        build_seconds = snapshot.get("build_seconds")
+        if build_seconds:
+            logger.info(
+                f"Model loaded from snapshot in {load_duration:.2f} seconds "
+                f"({build_seconds - load_duration:.2f} seconds faster than building it)."
+            )
+        else:
+            logger.info(f"Model loaded from snapshot in {load_duration:.2f} seconds.")
+        return True
+
     def apply_quantization(self):
         """Apply dynamic quantization to reduce model size and improve inference speed."""
         if self.model is None:
@@ -80,6 +184,30 @@ class ModelManager:
             logger.error(f"Error during model quantization: {e}", exc_info=True)
             raise
 
+    def apply_precision(self, calibration_dir=CARDS_DIRECTORY):
+        """
+        Quantize the model for the configured precision mode.
+
+        Static int8 is calibrated on card images from `calibration_dir` and on
+        the known card captions; bf16 needs no change to the weights.
+        """
+        if self.model is None:
+            raise ValueError("Model must be initialized before applying a precision mode.")
+        if self.precision == DYNAMIC_INT8:
+            self.apply_quantization()
+            return
+        if self.precision != STATIC_INT8:
+            return
+        if self.device.type != "cpu":
+            raise ValueError("Static int8 quantization is only supported on CPU.")
+        from caption_store import CaptionStore
+
+        logger.info(f"Calibrating static int8 quantization on {calibration_dir}.")
+        calibration_images = load_calibration_images(calibration_dir, self.transform)
+        captions = [caption for _, caption in CaptionStore().items()][:DEFAULT_CALIBRATION_IMAGES]
+        calibration_tokens = self.tokenizer(captions or DEFAULT_CALIBRATION_TEXTS)
+        self.model = apply_precision(self.model, STATIC_INT8, calibration_images, calibration_tokens)
+
     def load_model_weights(self, weights_path):
         """Load custom model weights from a given path."""
         if not os.path.exists(weights_path):
@@ -132,6 +260,10 @@ class ModelManager:
             self.initialize_model()
         return self.tokenizer
 
+    def get_decoder(self):
+        """Return the function that turns generated token ids back into text."""
+        return open_clip.decode
+
     def initialize_model_async(self, callback=None):
         """Initialize the model asynchronously to keep the UI responsive."""
         def load_model():
@@ -1,16 +1,38 @@
+import os
 import random
 import logging
-import csv
 from abc import ABC, abstractmethod
-from typing import Tuple, Optional, List
-from model_manager import ModelManager
-from generate_image_caption import ImageCaptionGenerator
-from abstractor import Abstractor
-from text_processor import TextProcessor
-from similarity import ImageTextSimilarity
+from typing import TYPE_CHECKING, Dict, Tuple, Optional, List
+from caption_store import CaptionStore
+from resources import get_abstractor, get_caption_generator, get_similarity, get_text_processor
+from clue_prefetch import CluePrefetcher, DEFAULT_PREFETCH_WORKERS
+
+if TYPE_CHECKING:
+    import numpy as np
+    from model_manager import ModelManager
+    from card_registry import CardRegistry
 
 logger = logging.getLogger('game_logic')
 
+# Bot storytellers aim for a clue that ranks their card in this band of the
+# whole deck, as fractions of the deck ranked above it: close to the top, so
+# some players find it, but not the single best match, so not all of them do.
+STORYTELLER_RANK_BAND = (0.01, 0.1)
+
+# Card directory -> (canonical card paths, path -> index), listed once per process.
+_DIRECTORY_DECKS: Dict[str, Tuple[List[str], Dict[str, int]]] = {}
+
+
+def _directory_deck(directory: str) -> Tuple[List[str], Dict[str, int]]:
+    """Return the cards of a directory and their positions, listing it only the first time."""
+    deck = _DIRECTORY_DECKS.get(directory)
+    if deck is None:
+        from embedding_index import canonical_path, list_card_images
+
+        paths = [canonical_path(path) for path in list_card_images(directory)]
+        deck = _DIRECTORY_DECKS.setdefault(directory, (paths, {path: i for i, path in enumerate(paths)}))
+    return deck
+
 class Player(ABC):
     def __init__(self, name: str, player_id: int, model_manager=None):
         self.name = name
@@ -19,6 +41,10 @@ class Player(ABC):
         self.score = 0
         self._model_manager = model_manager
 
+    def on_hand_changed(self) -> None:
+        """Called after cards are dealt into or taken out of the hand."""
+        pass
+
     @abstractmethod
     def storyteller_turn(self) -> Tuple[str, str]:
         pass
@@ -90,65 +116,154 @@ class Human(Player):
 
 
 class Bot(Player):
-    def __init__(self, name: str, model_manager: ModelManager):
+    def __init__(
+        self,
+        name: str,
+        model_manager: "ModelManager",
+        prefetch_workers: int = DEFAULT_PREFETCH_WORKERS,
+        registry: Optional["CardRegistry"] = None
+    ):
         super().__init__(name=name, player_id=None, model_manager=model_manager)
-        self._caption_generator = ImageCaptionGenerator(self._model_manager)
-        self._similarity_checker = ImageTextSimilarity(self._model_manager)
-        self._abstractor = Abstractor()
-        self._text_processor = TextProcessor()
+        # With a registry, cards are scored by ID through its embedding rows instead of by path.
+        self._registry = registry
+        self._registry_deck = registry.paths.tolist() if registry is not None else None
+        # Models, spaCy pipelines and API clients are loaded once per process and shared by all bots.
+        self._caption_generator = get_caption_generator(self._model_manager)
+        self._similarity_checker = get_similarity(self._model_manager)
+        self._text_processor = get_text_processor()
+        self._abstractor = get_abstractor(self._model_manager)
+        self._caption_store = CaptionStore()
+        self._clue_prefetcher = CluePrefetcher(self._prepare_clue, max_workers=prefetch_workers)
         self.storyteller_card = ""
 
+    def on_hand_changed(self) -> None:
+        # Clues for every card in hand are generated in the background, so the
+        # storyteller turn doesn't block on the LLM round trip.
+        self._clue_prefetcher.sync(self.hand)
+
+    def close(self) -> None:
+        """Stop any clue generation still running in the background."""
+        self._clue_prefetcher.shutdown()
+        self._abstractor.close()
+
     def storyteller_turn(self) -> Tuple[str, str]:
         card = random.choice(self.hand)
         self.storyteller_card = card
-        clue = self.generate_clue(card)
+        prepared = self._clue_prefetcher.get(card)
+        if prepared is None:
+            prepared = self._prepare_clue(card)
+        clue, caption, source = prepared
+        # Only the clue that is actually played uses up its clue bank entry.
+        self._abstractor.mark_used(caption, source)
         # line for debugging, players shouldn't see the card the storyteller picks
         # print(f"{self.name} (Storyteller) selected card: {card} with clue: '{clue}'")
         print(f"{self.name} (Storyteller) selected card and provided the clue: '{clue}'")
         return card, clue
 
     def generate_clue(self, card: str) -> str:
-        caption = ""
-        with open("cache.csv", "r") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                cur_card = row[0].strip()
-                description = row[1].strip()
-                if (cur_card == card):
-                    caption = description
-                    break
-        obfuscated_caption = self._text_processor.obfuscate_description(caption, self._abstractor)
-        return obfuscated_caption
+        clue, caption, source = self._prepare_clue(card)
+        self._abstractor.mark_used(caption, source)
+        return clue
+
+    def _prepare_clue(self, card: str) -> Tuple[str, str, str]:
+        """
+        Pick a clue for a card without using it up, so it can be prefetched for cards that are never played.
+
+        Returns:
+            The clue, the card's caption and the candidate it came from, for Abstractor.mark_used().
+        """
+        caption = self._caption_store.get(card, self._caption_generator) or ""
+        # Only already known captions: a clue shouldn't wait on captioning the rest of the hand.
+        other_captions = [self._caption_store.get(other) for other in list(self.hand) if other != card]
+        candidates = self._abstractor.candidate_clues(caption)
+        ranked = self._text_processor.rank_clues(candidates, caption, [c for c in other_captions if c])
+        if ranked:
+            clue = self.choose_clue_for_deck(card, [clue for clue, _ in ranked])
+        else:
+            # Every candidate leaked the caption; the first one is still the best available.
+            clue = self._text_processor.remove_repetitions(candidates[0]) if candidates else ""
+        return clue, caption, self._text_processor.source_candidate(clue, candidates)
+
+    def _deck_cards(self, card: str) -> Tuple[List[str], int]:
+        """Return the deck `card` belongs to and its index in it: the registry's cards, else its directory's."""
+        from embedding_index import canonical_path
+
+        if self._registry is not None:
+            try:
+                return self._registry_deck, self._registry.id_of(card)
+            except KeyError:
+                pass
+        deck, index = _directory_deck(os.path.dirname(card) or ".")
+        key = canonical_path(card)
+        if key in index:
+            return deck, index[key]
+        return deck + [key], len(deck)
+
+    def choose_clue_for_deck(self, card: str, clues: List[str]) -> str:
+        """
+        Pick the clue that ranks `card` inside STORYTELLER_RANK_BAND of the whole deck.
+
+        All clues are scored against every card in one matrix product. Clues
+        outside the band are ranked by how far they miss it, then by how
+        narrowly the card wins or loses; remaining ties keep the input order.
+
+        Args:
+            card: The storyteller's card.
+            clues: Candidate clues that passed caption validation, best first.
+
+        Returns:
+            str: The chosen clue.
+        """
+        if len(clues) == 1:
+            return clues[0]
+        try:
+            deck, target = self._deck_cards(card)
+            ranks, margins = self._similarity_checker.clue_ranks(clues, deck, target)
+        except Exception as e:
+            logger.warning(f"Could not rank clues against the deck for {card}: {e}")
+            return clues[0]
+
+        low = max(1, round(STORYTELLER_RANK_BAND[0] * len(deck)))
+        high = max(low, round(STORYTELLER_RANK_BAND[1] * len(deck)))
+
+        def miss(rank: int) -> int:
+            return low - rank if rank < low else max(0, rank - high)
+
+        order = sorted(range(len(clues)), key=lambda i: (miss(int(ranks[i])), abs(float(margins[i])), i))
+        best = order[0]
+        logger.debug(
+            "Clue %r ranks %s among %d cards (band %d-%d, margin %.4f).",
+            clues[best], ranks[best], len(deck), low, high, margins[best]
+        )
+        return clues[best]
 
     def choose_card_based_on_clue(self, clue) -> Optional[str]:
-        selected = []
         if not self.hand:
             logger.error(f"{self.name} has no cards left to choose from based on the clue.")
             return None
 
-        similarities = [
-            (self._similarity_checker.compare_image_and_text(card, clue), card)
-            for card in self.hand
-        ]
-
-        if not similarities:
+        scores, top = self._score_cards(self.hand, clue, top_k=5)
+        if len(top) == 0:
             logger.error(f"{self.name} could not find any matching cards based on the clue.")
             return None
-        
-        similarities.sort(reverse=True, key=lambda x: x[0])
-        x = 0 
-        while x < 5:
-            selected.append(similarities.pop(0))
-            x += 1
-        return selected
+
+        return [(float(scores[i]), self.hand[i]) for i in top]
 
     def vote(self, table, clue) -> int:
-        similarities = [
-            (self._similarity_checker.compare_image_and_text(card, clue), card)
-            for card in table
-        ]
-        similarities.sort(reverse=True, key=lambda x: x[0])
-        return similarities[0][1]
+        scores, top = self._score_cards(table, clue, top_k=1)
+        return table[top[0]]
+
+    def _score_cards(self, cards: List[str], clue: str, top_k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Score cards against a clue, by registry ID when every card is registered."""
+        if self._registry is not None:
+            try:
+                card_ids = self._registry.ids_of(cards)
+            except KeyError:
+                card_ids = None
+            if card_ids is not None:
+                scores, top = self._similarity_checker.score_card_ids(self._registry, card_ids, [clue], top_k)
+                return scores[0], top[0]
+        return self._similarity_checker.score_cards(cards, clue, top_k=top_k)
 
     def choose_card(self) -> Optional[str]:
         if not self.hand:
@@ -157,5 +272,6 @@ class Bot(Player):
 
         chosen_card = random.choice(self.hand)
         self.hand.remove(chosen_card)
+        self.on_hand_changed()
         logger.info(f"Bot {self.name} chose card: {chosen_card}")
         return chosen_card
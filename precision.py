@@ -0,0 +1,296 @@
+import io
+import os
+import copy
+import time
+import random
+import logging
+import argparse
+import contextlib
+import numpy as np
+import torch
+from PIL import Image
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger('precision')
+
+FP32 = "fp32"
+BF16 = "bf16"
+DYNAMIC_INT8 = "int8-dynamic"
+STATIC_INT8 = "int8-static"
+PRECISION_MODES = [FP32, BF16, DYNAMIC_INT8, STATIC_INT8]
+
+CARDS_DIRECTORY = "data/images/cards"
+DEFAULT_CALIBRATION_IMAGES = 64
+DEFAULT_CALIBRATION_TEXTS = [
+    "a painting of a child looking at the stars", "an old house in a dark forest",
+    "a boat floating on a calm sea", "two people dancing in the rain",
+    "a colorful bird sitting on a branch", "a door opening onto a bright light",
+]
+REPORT_CLUES = [
+    "silent longing", "a journey home", "forgotten dream", "fragile balance",
+    "midnight escape", "golden memory", "restless wonder", "hidden shelter",
+]
+
+
+def autocast_context(precision: str, device: torch.device):
+    """Return the autocast context for a precision mode; a no-op for every mode but bf16."""
+    if precision == BF16:
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+class QuantizedLinear(torch.nn.Module):
+    """Wraps an nn.Linear between quant/dequant stubs so eager-mode static quantization can convert it."""
+
+    def __init__(self, linear: torch.nn.Linear):
+        super().__init__()
+        self.quant = torch.ao.quantization.QuantStub()
+        self.linear = linear
+        self.dequant = torch.ao.quantization.DeQuantStub()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.dequant(self.linear(self.quant(x)))
+
+
+def tower_modules(model: torch.nn.Module) -> List[torch.nn.Module]:
+    """Return the visual and text towers of an open_clip model (CoCa/custom-text or plain CLIP)."""
+    towers = [getattr(model, "visual", None), getattr(model, "text", None) or getattr(model, "transformer", None)]
+    return [tower for tower in towers if tower is not None]
+
+
+def _wrap_linears(module: torch.nn.Module, qconfig) -> int:
+    """
+    Replace every nn.Linear under `module` with a QuantizedLinear.
+
+    MultiheadAttention projections are left alone: attention reads out_proj's
+    weight directly instead of calling it, so a wrapper would be bypassed.
+    """
+    wrapped = 0
+    for name, child in list(module.named_children()):
+        if isinstance(child, torch.nn.MultiheadAttention):
+            continue
+        if isinstance(child, torch.nn.Linear):
+            wrapper = QuantizedLinear(child)
+            wrapper.qconfig = qconfig
+            setattr(module, name, wrapper)
+            wrapped += 1
+        else:
+            wrapped += _wrap_linears(child, qconfig)
+    return wrapped
+
+
+def load_calibration_images(
+    directory: str,
+    transform,
+    limit: int = DEFAULT_CALIBRATION_IMAGES,
+    seed: int = 0
+) -> torch.Tensor:
+    """Load and transform a seeded sample of card images for calibration."""
+    from embedding_index import list_card_images
+
+    paths = list_card_images(directory)
+    paths = random.Random(seed).sample(paths, min(limit, len(paths)))
+    images = []
+    for path in paths:
+        try:
+            images.append(transform(Image.open(path).convert("RGB")))
+        except Exception as e:
+            logger.error(f"Failed to load calibration image {path}: {e}")
+    if not images:
+        raise ValueError(f"No calibration images could be loaded from {directory}.")
+    return torch.stack(images)
+
+
+def quantize_static(
+    model: torch.nn.Module,
+    calibration_images: torch.Tensor,
+    calibration_tokens: Optional[torch.Tensor] = None,
+    batch_size: int = 16
+) -> torch.nn.Module:
+    """
+    Statically quantize the Linear layers of the visual and text towers to int8.
+
+    Activation ranges are observed while running `calibration_images` (and
+    `calibration_tokens`, if given) through the towers, then the observed
+    layers are converted in place. The caption decoder is not touched.
+
+    Args:
+        model: The fp32 open_clip model, on the CPU.
+        calibration_images: (N, 3, H, W) preprocessed card images.
+        calibration_tokens: Optional tokenized texts for the text tower.
+        batch_size: Calibration batch size.
+
+    Returns:
+        The quantized model.
+    """
+    qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+    model.eval()
+    wrapped = sum(_wrap_linears(tower, qconfig) for tower in tower_modules(model))
+    for tower in tower_modules(model):
+        torch.ao.quantization.prepare(tower, inplace=True)
+
+    with torch.no_grad():
+        for start in range(0, len(calibration_images), batch_size):
+            model.encode_image(calibration_images[start:start + batch_size])
+        if calibration_tokens is not None:
+            for start in range(0, len(calibration_tokens), batch_size):
+                model.encode_text(calibration_tokens[start:start + batch_size])
+
+    for tower in tower_modules(model):
+        torch.ao.quantization.convert(tower, inplace=True)
+    logger.info(f"Statically quantized {wrapped} Linear layers using {len(calibration_images)} calibration images.")
+    return model
+
+
+def apply_precision(
+    model: torch.nn.Module,
+    precision: str,
+    calibration_images: Optional[torch.Tensor] = None,
+    calibration_tokens: Optional[torch.Tensor] = None
+) -> torch.nn.Module:
+    """
+    Prepare a model for a precision mode.
+
+    fp32 and bf16 leave the weights unchanged (bf16 is applied at call time
+    through autocast_context); the int8 modes return a quantized model.
+    """
+    if precision not in PRECISION_MODES:
+        raise ValueError(f"Unknown precision {precision!r}; choose one of {PRECISION_MODES}.")
+    if precision == DYNAMIC_INT8:
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if precision == STATIC_INT8:
+        if calibration_images is None:
+            raise ValueError("Static int8 quantization needs calibration images.")
+        return quantize_static(model, calibration_images, calibration_tokens)
+    return model
+
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    """Return the serialized size of a model's state dict in MiB, including packed int8 weights."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def _encode(model, precision: str, images: torch.Tensor, tokens: torch.Tensor):
+    with torch.no_grad(), autocast_context(precision, torch.device("cpu")):
+        image_features = model.encode_image(images)
+        text_features = model.encode_text(tokens)
+    image_features = torch.nn.functional.normalize(image_features.float(), dim=-1)
+    text_features = torch.nn.functional.normalize(text_features.float(), dim=-1)
+    return image_features.numpy(), text_features.numpy()
+
+
+def _bot_decisions(scores: np.ndarray, hands: List[np.ndarray], story_cards: List[int]):
+    """Replay Bot.choose_card_based_on_clue (top 5 of the hand) and Bot.vote (best card on the table)."""
+    choices, votes = [], []
+    for clue_scores, hand, story_card in zip(scores, hands, story_cards):
+        choice = hand[np.argsort(-clue_scores[hand], kind="stable")[:5]]
+        table = np.concatenate([[story_card], choice])
+        choices.append(frozenset(choice.tolist()))
+        votes.append(int(table[np.argmax(clue_scores[table])]))
+    return choices, votes
+
+
+def precision_report(
+    model_manager,
+    modes: Sequence[str] = PRECISION_MODES,
+    directory: str = CARDS_DIRECTORY,
+    clues: Sequence[str] = REPORT_CLUES,
+    hand_size: int = 30,
+    trials: int = 200,
+    repeats: int = 5,
+    seed: int = 0
+) -> List[Dict[str, object]]:
+    """
+    Compare precision modes against fp32 on the card deck.
+
+    Each mode encodes the deck and the clues with its own copy of the model.
+    Latency is the median time to encode one batch of cards and clues; memory
+    is the model's serialized size. Agreement replays bot decisions on random
+    hands: how often the five cards a guess bot puts on the table, and the card
+    it votes for, are the same as with fp32.
+
+    Returns:
+        One report row per mode, fp32 first; fp32 is added if `modes` lacks it.
+    """
+    from embedding_index import list_card_images
+
+    # Work on a CPU copy: the shared model may be in use on the GPU by bots or the inference server.
+    base_model = copy.deepcopy(model_manager.get_model()).cpu().eval()
+    transform = model_manager.get_transform()
+    tokenizer = model_manager.get_tokenizer()
+    deck_size = len(list_card_images(directory))
+    images = load_calibration_images(directory, transform, limit=deck_size, seed=seed)
+    tokens = tokenizer(list(clues))
+    calibration_tokens = tokenizer(DEFAULT_CALIBRATION_TEXTS + list(clues))
+
+    rng = np.random.default_rng(seed)
+    hand_size = min(hand_size, len(images) - 1)
+    clue_ids = rng.integers(len(clues), size=trials)
+    hands, story_cards = [], []
+    for _ in range(trials):
+        cards = rng.choice(len(images), size=hand_size + 1, replace=False)
+        story_cards.append(int(cards[0]))
+        hands.append(cards[1:])
+
+    # fp32 always runs first and is the reference every other mode is compared against.
+    modes = [FP32] + [mode for mode in modes if mode != FP32]
+    reference = None
+    rows = []
+    for mode in modes:
+        model = apply_precision(copy.deepcopy(base_model), mode, images[:DEFAULT_CALIBRATION_IMAGES], calibration_tokens)
+        batch = images[:16]
+        _encode(model, mode, batch, tokens)  # warmup
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _encode(model, mode, batch, tokens)
+            samples.append(time.perf_counter() - start)
+
+        image_features, text_features = _encode(model, mode, images, tokens)
+        scores = (text_features @ image_features.T)[clue_ids]
+        choices, votes = _bot_decisions(scores, hands, story_cards)
+        if reference is None:
+            reference = (choices, votes, float(np.median(samples)), model_size_mb(model))
+        row = {
+            "precision": mode,
+            "latency_ms": float(np.median(samples)) * 1000,
+            "speedup": reference[2] / float(np.median(samples)),
+            "model_mb": model_size_mb(model),
+            "memory_ratio": model_size_mb(model) / reference[3],
+            "card_choice_agreement": float(np.mean([a == b for a, b in zip(choices, reference[0])])),
+            "vote_agreement": float(np.mean([a == b for a, b in zip(votes, reference[1])])),
+        }
+        logger.info(
+            f"{mode:<13} latency={row['latency_ms']:.1f}ms ({row['speedup']:.2f}x) "
+            f"model={row['model_mb']:.0f}MB ({row['memory_ratio']:.2f}x) "
+            f"card choice agreement={row['card_choice_agreement']:.1%} vote agreement={row['vote_agreement']:.1%}"
+        )
+        rows.append(row)
+    return rows
+
+
+def fastest_safe_mode(rows: List[Dict[str, object]], min_agreement: float = 1.0) -> str:
+    """Return the fastest mode whose card choices and votes agree with fp32 at least `min_agreement` of the time."""
+    safe = [
+        row for row in rows
+        if row["card_choice_agreement"] >= min_agreement and row["vote_agreement"] >= min_agreement
+    ]
+    return min(safe, key=lambda row: row["latency_ms"])["precision"] if safe else FP32
+
+
+if __name__ == "__main__":
+    from model_manager import ModelManager
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Latency, memory and bot agreement of each precision mode vs fp32.")
+    parser.add_argument("--modes", nargs="+", choices=PRECISION_MODES, default=PRECISION_MODES)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    report = precision_report(ModelManager(use_snapshot=False), modes=args.modes, trials=args.trials)
+    logger.info(f"Fastest mode that keeps bot behaviour unchanged: {fastest_safe_mode(report)}")
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import types
+import logging
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from torchvision import transforms as T
+from typing import Dict, Iterable, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger('preprocess')
+
+DEFAULT_PIXEL_CACHE_DIR = "data/embeddings/pixels"
+PIXELS_FILE = "cards_pixels.npy"
+PIXEL_INDEX_FILE = "cards_pixels.json"
+DEFAULT_NUM_WORKERS = 4
+
+
+def _target_size(pil_transforms: List) -> Optional[int]:
+    """Return the smallest side the PIL transforms resize or crop to, if they do."""
+    sizes = []
+    for transform in pil_transforms:
+        size = getattr(transform, "size", None)
+        if isinstance(transform, (T.Resize, T.CenterCrop)) and size is not None:
+            sizes.append(min(size) if isinstance(size, (tuple, list)) else size)
+    return max(sizes) if sizes else None
+
+
+def _step_signature(step) -> list:
+    """Describe one transform step by its type and the fields that change its output."""
+    if isinstance(step, T.Lambda):
+        step = step.lambd
+    if isinstance(step, types.FunctionType):
+        return [step.__module__, step.__qualname__]
+    fields = {}
+    for name in ("size", "interpolation", "max_size", "antialias", "mean", "std", "fill", "padding_mode"):
+        value = getattr(step, name, None)
+        if value is not None:
+            fields[name] = value if isinstance(value, (int, float, list, tuple)) else str(value)
+    return [type(step).__module__, type(step).__qualname__, fields]
+
+
+class Preprocessor:
+    def __init__(self, transform, pixel_cache: Optional["PixelCache"] = None):
+        """
+        Image preprocessing split at ToTensor.
+
+        The PIL half (resize, crop, RGB) produces the uint8 pixels that the
+        pixel cache stores; the tensor half (scaling to [0, 1], normalization)
+        runs on every use. JPEGs are decoded at a reduced size when the target
+        resolution allows it.
+
+        Args:
+            transform: The open_clip image transform.
+            pixel_cache: Optional cache of already preprocessed uint8 pixels.
+        """
+        self.transform = transform
+        self.pixel_cache = pixel_cache
+        steps = list(getattr(transform, "transforms", []))
+        split = next((i for i, step in enumerate(steps) if isinstance(step, T.ToTensor)), None)
+        if split is None:
+            logger.warning("Image transform has no ToTensor step; preprocessing runs unsplit and uncached.")
+            self.pil_transform = None
+            self.tensor_transforms = []
+            self.target_size = None
+        else:
+            self.pil_transform = T.Compose(steps[:split])
+            self.tensor_transforms = steps[split + 1:]
+            self.target_size = _target_size(steps[:split])
+
+    @property
+    def signature(self) -> str:
+        """
+        Identifies the PIL half of the transform; cached pixels are only valid for the same one.
+
+        Built from stable fields only: repr() of a plain function step (such
+        as open_clip's _convert_to_rgb) carries a per-process memory address.
+        """
+        return json.dumps([_step_signature(step) for step in self.pil_transform.transforms])
+
+    def open_image(self, image_path: str) -> Image.Image:
+        """Open an image as RGB, decoding JPEGs at the smallest scale that still covers the target size."""
+        image = Image.open(image_path)
+        if self.target_size:
+            # A no-op for formats without reduced-size decoding.
+            image.draft("RGB", (self.target_size, self.target_size))
+        return image.convert("RGB")
+
+    def load_pixels(self, image_path: str) -> np.ndarray:
+        """Decode an image and apply the PIL half of the transform, returning (H, W, 3) uint8 pixels."""
+        with metrics.span("decode"):
+            image = self.open_image(image_path)
+        with metrics.span("preprocess"):
+            return np.asarray(self.pil_transform(image), dtype=np.uint8)
+
+    def to_tensor(self, pixels: np.ndarray) -> torch.Tensor:
+        """Turn (H, W, 3) or (N, H, W, 3) uint8 pixels into normalized (3, H, W) or (N, 3, H, W) tensors."""
+        with metrics.span("preprocess"):
+            # Copy: cached pixels are a read-only memmap, and PIL arrays may be read-only too.
+            tensor = torch.from_numpy(np.array(pixels, dtype=np.uint8)).movedim(-1, -3).float().div_(255)
+            for step in self.tensor_transforms:
+                tensor = step(tensor)
+            return tensor
+
+    def __call__(self, image_path: str) -> torch.Tensor:
+        """Return the model input tensor for an image, from the pixel cache when possible."""
+        if self.pil_transform is None:
+            return self.transform(Image.open(image_path).convert("RGB"))
+        if self.pixel_cache is not None:
+            pixels = self.pixel_cache.lookup(image_path)
+            if pixels is not None:
+                metrics.increment("pixel_cache_hits")
+                return self.to_tensor(pixels)
+            metrics.increment("pixel_cache_misses")
+        return self.to_tensor(self.load_pixels(image_path))
+
+
+class PixelCache:
+    def __init__(self, pixels: np.ndarray, entries: Dict[str, dict], signature: str):
+        """
+        Memory-mapped (N, H, W, 3) uint8 array of preprocessed card pixels.
+
+        Args:
+            pixels: The pixel array, usually a read-only memmap.
+            entries: Mapping of card path to {"row", "size", "mtime_ns"}.
+            signature: Preprocessor.signature the pixels were produced with.
+        """
+        self.pixels = pixels
+        self.signature = signature
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, image_path: str) -> Optional[np.ndarray]:
+        """Return the cached pixels for an image, or None if unknown or modified since caching."""
+        entry = self._entries.get(os.path.normpath(image_path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        return self.pixels[entry["row"]]
+
+    @classmethod
+    def load(cls, cache_dir: str = DEFAULT_PIXEL_CACHE_DIR) -> "PixelCache":
+        with open(os.path.join(cache_dir, PIXEL_INDEX_FILE), "r") as f:
+            meta = json.load(f)
+        pixels = np.load(os.path.join(cache_dir, PIXELS_FILE), mmap_mode="r")
+        logger.info(f"Loaded pixel cache with {pixels.shape[0]} cards from {cache_dir}")
+        return cls(pixels, meta["entries"], meta["signature"])
+
+    @classmethod
+    def load_if_exists(cls, cache_dir: str, preprocessor: Preprocessor) -> Optional["PixelCache"]:
+        """Load the cache if it exists and was built with the same preprocessing, otherwise return None."""
+        if preprocessor.pil_transform is None or not os.path.exists(os.path.join(cache_dir, PIXEL_INDEX_FILE)):
+            return None
+        try:
+            cache = cls.load(cache_dir)
+        except Exception as e:
+            logger.error(f"Failed to load pixel cache from {cache_dir}: {e}")
+            return None
+        if cache.signature != preprocessor.signature:
+            logger.warning(f"Pixel cache in {cache_dir} was built with different preprocessing; ignoring it.")
+            return None
+        return cache
+
+    @classmethod
+    def build(
+        cls,
+        image_paths: Iterable[str],
+        preprocessor: Preprocessor,
+        cache_dir: str = DEFAULT_PIXEL_CACHE_DIR,
+        num_workers: int = DEFAULT_NUM_WORKERS
+    ) -> "PixelCache":
+        """
+        Decode and preprocess every card once, writing the pixels to a memory-mappable file.
+
+        Images that fail to load are left out of the cache.
+        """
+        if preprocessor.pil_transform is None:
+            raise ValueError("The image transform can't be split at ToTensor, so its pixels can't be cached.")
+        paths = [os.path.normpath(path) for path in image_paths]
+        start_time = time.perf_counter()
+
+        def load(path):
+            try:
+                return preprocessor.load_pixels(path)
+            except Exception as e:
+                logger.error(f"Failed to load image {path}: {e}")
+                return None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        pixels_path = os.path.join(cache_dir, PIXELS_FILE)
+        tmp_pixels = pixels_path + ".tmp"
+        entries = {}
+        array = None
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # map() yields in order while workers decode ahead; rows are written as they arrive.
+            for path, pixels in zip(paths, executor.map(load, paths)):
+                if pixels is None:
+                    continue
+                if array is None:
+                    array = np.lib.format.open_memmap(
+                        tmp_pixels, mode="w+", dtype=np.uint8, shape=(len(paths),) + pixels.shape
+                    )
+                row = len(entries)
+                array[row] = pixels
+                stat = os.stat(path)
+                entries[path] = {"row": row, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if array is None:
+            raise ValueError("No images could be loaded into the pixel cache.")
+        array.flush()
+        shape = array.shape
+        del array
+
+        index_path = os.path.join(cache_dir, PIXEL_INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"signature": preprocessor.signature, "entries": entries}, f, indent=4)
+        os.replace(tmp_pixels, pixels_path)
+        os.replace(index_path + ".tmp", index_path)
+        logger.info(
+            f"Pixel cache with {len(entries)} cards ({len(entries) * int(np.prod(shape[1:])) / 2 ** 20:.1f} MiB) "
+            f"built in {time.perf_counter() - start_time:.2f} seconds."
+        )
+        return cls.load(cache_dir)
+
+
+if __name__ == "__main__":
+    from model_manager import ModelManager
+    from embedding_index import list_card_images
+
+    logging.basicConfig(level=logging.INFO)
+
+    cards_directory = "data/images/cards"
+    PixelCache.build(list_card_images(cards_directory), Preprocessor(ModelManager().get_transform()))
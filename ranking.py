@@ -0,0 +1,20 @@
+import numpy as np
+from typing import Optional
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Return the indices of the k highest scores along the last axis, best first.
+
+    Uses argpartition so only the k selected entries are sorted.
+    """
+    n = scores.shape[-1]
+    k = n if k is None else max(0, min(k, n))
+    if k == 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
@@ -0,0 +1,60 @@
+import time
+import threading
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None):
+        """
+        Thread-safe token bucket shared by every worker talking to one API.
+
+        Args:
+            rate_per_second: Sustained number of requests allowed per second.
+            capacity: Burst size. Defaults to one second's worth of tokens (at least 1).
+        """
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive")
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, capacity: Optional[float] = None) -> "TokenBucket":
+        return cls(requests_per_minute / 60.0, capacity)
+
+    def _refill(self, now: float):
+        # _updated sits in the future while paused, so nothing accrues during a pause.
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available (and any backoff pause is over), then take them."""
+        if tokens > self.capacity:
+            # The bucket never holds more than its capacity, so this would wait forever.
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket with capacity {self.capacity}.")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for `seconds` and drain the bucket.
+
+        Called when the API answers with a rate-limit error, so every worker
+        sharing the bucket backs off together instead of each retrying alone.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, Tuple
+from metrics import metrics
+
+logger = logging.getLogger('resources')
+
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+# When set (a Unix socket path or host:port), bots use a shared inference server instead of loading the model.
+INFERENCE_SERVER_ENV = "INFERENCE_SERVER_ADDRESS"
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of this process, or 0 if it can't be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere; it is a peak, not current.
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class ResourceRegistry:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ResourceRegistry, cls).__new__(cls)
+                    cls._instance.__initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Process-wide registry of heavy, read-only resources shared by every bot."""
+        if self.__initialized:
+            return
+        self._resources: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        # Re-entrant, because factories may request other resources while loading.
+        self._load_lock = threading.RLock()
+        self.__initialized = True
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the shared resource for `key`, building it with `factory` the first time.
+
+        Args:
+            key: Unique name of the resource.
+            factory: Zero-argument callable that builds the resource.
+        """
+        resource = self._resources.get(key)
+        if resource is not None:
+            return resource
+        with self._load_lock:
+            resource = self._resources.get(key)
+            if resource is None:
+                rss_before = current_rss_bytes()
+                start_time = time.perf_counter()
+                resource = factory()
+                load_seconds = time.perf_counter() - start_time
+                rss_after = current_rss_bytes()
+                self._resources[key] = resource
+                self._stats[key] = {
+                    "load_seconds": load_seconds,
+                    "rss_delta_bytes": max(0, rss_after - rss_before),
+                    "rss_after_bytes": rss_after,
+                }
+                logger.info(
+                    f"Loaded shared resource '{key}' in {load_seconds:.2f} seconds "
+                    f"(+{(rss_after - rss_before) / 2 ** 20:.1f} MiB resident)."
+                )
+        return resource
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._resources
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over (key, resource) pairs of the resources loaded so far."""
+        return iter(list(self._resources.items()))
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Return load time and resident-memory growth for each loaded resource."""
+        return {key: dict(stats) for key, stats in self._stats.items()}
+
+    def log_report(self):
+        for key, stats in self._stats.items():
+            logger.info(
+                f"{key}: loaded in {stats['load_seconds']:.2f}s, "
+                f"{stats['rss_delta_bytes'] / 2 ** 20:.1f} MiB resident"
+            )
+
+
+def report_session():
+    """
+    Log the per-session statistics of the shared resources and export session metrics.
+
+    Called once at the end of a game or simulation.
+    """
+    registry = ResourceRegistry()
+    registry.log_report()
+    metrics.add_report("resources", registry.report())
+    for key, resource in registry.items():
+        text_cache = getattr(resource, "text_cache", None) if key.startswith("similarity:") else None
+        if text_cache is not None:
+            stats = text_cache.stats()
+            logger.info(
+                f"Text feature cache: {stats['hit_rate']:.1%} hit rate ({stats['hits']} memory, "
+                f"{stats['disk_hits']} disk, {stats['misses']} misses), "
+                f"~{stats['estimated_seconds_saved']:.2f} seconds of text encoding saved."
+            )
+            metrics.add_report("text_cache", stats)
+        if key == "abstractor":
+            summary = resource.latency_summary()
+            time_to_clue = summary["time_to_clue"]
+            logger.info(
+                f"Time to clue over {time_to_clue['count']} clues: p50 {time_to_clue['p50']:.2f}s, "
+                f"p99 {time_to_clue['p99']:.2f}s; sources {summary['sources']}."
+            )
+            metrics.add_report("abstractor", summary)
+    metrics.export_session()
+
+
+def get_spacy_pipeline(name: str = DEFAULT_SPACY_MODEL):
+    """Return the shared spaCy pipeline, loading it once per process."""
+    def load():
+        import spacy
+        return spacy.load(name)
+    return ResourceRegistry().get(f"spacy:{name}", load)
+
+
+def get_text_processor():
+    """Return the shared TextProcessor built on the shared spaCy pipeline."""
+    def load():
+        from text_processor import TextProcessor
+        return TextProcessor(nlp_model=get_spacy_pipeline())
+    return ResourceRegistry().get("text_processor", load)
+
+
+def get_inference_client():
+    """Return the shared InferenceClient if INFERENCE_SERVER_ADDRESS is set, otherwise None."""
+    address = os.getenv(INFERENCE_SERVER_ENV)
+    if not address:
+        return None
+
+    def load():
+        from inference_server import InferenceClient, parse_address
+        return InferenceClient(parse_address(address))
+    return ResourceRegistry().get(f"inference_client:{address}", load)
+
+
+def get_similarity(model_manager):
+    """Return the shared ImageTextSimilarity engine for the model manager's model."""
+    def load():
+        from similarity import ImageTextSimilarity
+        return ImageTextSimilarity(model_manager, client=get_inference_client())
+    return ResourceRegistry().get(f"similarity:{model_manager.model_name}:{model_manager.pretrained}", load)
+
+
+def get_caption_generator(model_manager):
+    """Return the shared ImageCaptionGenerator for the model manager's model."""
+    def load():
+        from generate_image_caption import ImageCaptionGenerator
+        return ImageCaptionGenerator(model_manager, client=get_inference_client())
+    return ResourceRegistry().get(f"caption_generator:{model_manager.model_name}:{model_manager.pretrained}", load)
+
+
+def get_abstractor(model_manager):
+    """Return the shared Abstractor, whose local fallback uses the shared similarity engine and spaCy pipeline."""
+    def load():
+        from abstractor import Abstractor
+        return Abstractor(similarity=get_similarity(model_manager), nlp=get_spacy_pipeline())
+    return ResourceRegistry().get("abstractor", load)
@@ -0,0 +1,130 @@
+import os
+import csv
+import atexit
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('results')
+
+CSV_FORMAT = "csv"
+PARQUET_FORMAT = "parquet"
+DEFAULT_FLUSH_EVERY = 100
+
+
+class ResultsWriter:
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        fmt: Optional[str] = None,
+        flush_every: int = DEFAULT_FLUSH_EVERY
+    ):
+        """
+        Buffered experiment results sink with a fixed schema.
+
+        Rows are kept in memory and written in batches of `flush_every`, and
+        whatever is left is flushed on close or at interpreter exit. CSV files
+        get a single header row and are appended to across runs; Parquet files
+        (requires pyarrow) are written fresh, one row group per flush.
+
+        Args:
+            path: Output file.
+            columns: Column names, in order. Every row must use exactly these keys.
+            fmt: "csv" or "parquet". Defaults to the file extension.
+            flush_every: Number of buffered rows that triggers a write.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.flush_every = max(1, flush_every)
+        self.format = fmt or (PARQUET_FORMAT if path.endswith(".parquet") else CSV_FORMAT)
+        self._rows: List[Dict[str, object]] = []
+        self._parquet_writer = None
+        self._schema = None
+        self._closed = False
+
+        if self.format == PARQUET_FORMAT:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                self.path = os.path.splitext(path)[0] + ".csv"
+                self.format = CSV_FORMAT
+                logger.warning(f"pyarrow is not installed; writing CSV results to {self.path} instead.")
+        if self.format == CSV_FORMAT:
+            self._check_csv_header()
+
+        atexit.register(self.close)
+
+    def _check_csv_header(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "r", newline="") as f:
+            header = next(csv.reader(f), [])
+        if header != self.columns:
+            raise ValueError(
+                f"{self.path} already exists with columns {header}, not {self.columns}; "
+                f"choose another file name."
+            )
+
+    def write_row(self, row: Dict[str, object]):
+        """Buffer one row, flushing when the buffer is full."""
+        if self._closed:
+            raise ValueError("ResultsWriter is closed.")
+        unknown = set(row) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown result columns: {sorted(unknown)}")
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_every:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def flush(self):
+        """Write all buffered rows to disk."""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        if self.format == PARQUET_FORMAT:
+            self._flush_parquet(rows)
+        else:
+            self._flush_csv(rows)
+        logger.debug(f"Flushed {len(rows)} result rows to {self.path}.")
+
+    def _flush_csv(self, rows: List[Dict[str, object]]):
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def _flush_parquet(self, rows: List[Dict[str, object]]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist([{column: row.get(column) for column in self.columns} for row in rows])
+        if self._parquet_writer is None:
+            self._schema = table.schema
+            self._parquet_writer = pq.ParquetWriter(self.path, self._schema)
+        else:
+            # Keep every row group on the schema inferred from the first batch.
+            table = table.cast(self._schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        """Flush remaining rows and close the file."""
+        if self._closed:
+            return
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        self._closed = True
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
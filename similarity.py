@@ -1,7 +1,15 @@
 import warnings
 import logging
+import time
+import numpy as np
 import torch
-from PIL import Image
+from typing import List, Optional, Tuple
+from embedding_index import ImageEmbeddingIndex, DEFAULT_INDEX_DIR
+from text_cache import TextFeatureCache, DEFAULT_TEXT_CACHE_DB
+from precision import FP32, autocast_context
+from preprocess import DEFAULT_PIXEL_CACHE_DIR, PixelCache, Preprocessor
+from metrics import metrics
+from ranking import top_k_indices
 
 # Suppress specific FutureWarning related to `weights_only=False`
 warnings.filterwarnings(
@@ -10,55 +18,291 @@ warnings.filterwarnings(
 
 logger = logging.getLogger('similarity')
 
+
 class ImageTextSimilarity:
-    def __init__(self, model_manager):
+    def __init__(
+        self,
+        model_manager,
+        embedding_index: Optional[ImageEmbeddingIndex] = None,
+        text_cache: Optional[TextFeatureCache] = None,
+        precision: Optional[str] = None,
+        client=None
+    ):
         """
         Initialize the ImageTextSimilarity with a centralized ModelManager.
 
         Args:
             model_manager: The ModelManager instance managing the model and device.
+            embedding_index: Precomputed card embeddings. Defaults to the index in
+                data/embeddings when it has been built for the same model.
+            text_cache: Cache of text-tower features. Defaults to an LRU backed by
+                data/embeddings/text_features.sqlite.
+            precision: Precision mode of the towers (see precision.py). Defaults
+                to the model manager's. The default embedding index holds fp32
+                features, so it is only loaded in fp32 mode.
+            client: Optional InferenceClient. When given, encoding and scoring go
+                to the inference server and this process never loads the model.
         """
+        self.client = client
+        # (card paths, features) of the last deck passed to clue_ranks.
+        self._deck_features: Optional[Tuple[Tuple[str, ...], torch.Tensor]] = None
+        if client is not None:
+            self.model = self.preprocess = self.preprocessor = self.tokenizer = None
+            self.device = torch.device("cpu")
+            self.precision = client.precision
+            self.embedding_index = embedding_index
+            self.text_cache = text_cache
+            logger.info(f"ImageTextSimilarity initialized as a client of the inference server at {client.address}")
+            return
         self.model = model_manager.get_model()
         self.preprocess = model_manager.get_transform()
+        self.preprocessor = Preprocessor(self.preprocess)
+        self.preprocessor.pixel_cache = PixelCache.load_if_exists(DEFAULT_PIXEL_CACHE_DIR, self.preprocessor)
         self.tokenizer = model_manager.get_tokenizer()
         self.device = model_manager.get_device()
+        self.precision = precision or getattr(model_manager, "precision", FP32)
+        if embedding_index is None and self.precision == FP32:
+            embedding_index = ImageEmbeddingIndex.load_if_exists(
+                DEFAULT_INDEX_DIR, model_manager.model_name, model_manager.pretrained
+            )
+        self.embedding_index = embedding_index
+        # Cached text features are only valid for the precision they were computed in.
+        cache_tag = model_manager.pretrained if self.precision == FP32 else f"{model_manager.pretrained}:{self.precision}"
+        self.text_cache = text_cache if text_cache is not None else TextFeatureCache(
+            model_manager.model_name, cache_tag, db_path=DEFAULT_TEXT_CACHE_DB
+        )
         logger.info(f"ImageTextSimilarity initialized with model on device: {self.device}")
 
     def encode_image(self, image_path: str):
-        """Encode an image into a feature vector."""
+        """
+        Encode an image into a feature vector.
+
+        Cards found in the embedding index are returned straight from it (already
+        L2-normalized); only unknown or modified images go through the model.
+        """
+        if self.client is not None:
+            return self.encode_images([image_path])
+        if self.embedding_index is not None:
+            cached = self.embedding_index.lookup(image_path)
+            if cached is not None:
+                metrics.increment("embedding_index_hits")
+                logger.debug("Image features for %s served from the embedding index.", image_path)
+                return torch.from_numpy(cached).unsqueeze(0).to(self.device)
+            metrics.increment("embedding_index_misses")
+
         try:
-            image = Image.open(image_path).convert("RGB")
-            logger.info(f"Image {image_path} loaded successfully.")
+            image_input = self.preprocessor(image_path).unsqueeze(0).to(self.device)
+            logger.debug("Image %s loaded successfully.", image_path)
         except Exception as e:
             logger.error(f"Failed to load image {image_path}: {e}")
             return None
 
-        image_input = self.preprocess(image).unsqueeze(0).to(self.device)
-        logger.debug(f"Image tensor created for {image_path}.")
-
         try:
-            with torch.no_grad():
-                image_features = self.model.encode_image(image_input)
-            logger.info(f"Image features encoded successfully for {image_path}.")
+            with metrics.span("image_encode"), torch.no_grad(), autocast_context(self.precision, self.device):
+                image_features = self.model.encode_image(image_input).float()
+            metrics.increment("image_model_calls")
+            logger.debug("Image features encoded successfully for %s.", image_path)
             return image_features
         except Exception as e:
             logger.error(f"Error encoding image {image_path}: {e}", exc_info=True)
             return None
 
     def encode_text(self, text: str):
-        """Encode a text description into a feature vector."""
+        """Encode a text description into an L2-normalized feature vector, using the text cache."""
         try:
-            text_input = self.tokenizer([text]).to(self.device)
-            logger.debug(f"Text tokenized for encoding: {text}")
-
-            with torch.no_grad():
-                text_features = self.model.encode_text(text_input)
-            logger.info(f"Text features encoded successfully for text: {text}.")
+            text_features = self.encode_texts([text])
+            logger.debug("Text features encoded successfully for text: %s.", text)
             return text_features
         except Exception as e:
             logger.error(f"Error encoding text: {text}: {e}", exc_info=True)
             return None
 
+    def encode_images(self, image_paths: List[str]) -> torch.Tensor:
+        """
+        Encode many images into an (N, D) matrix of L2-normalized feature vectors.
+
+        Indexed cards are looked up; the remaining images are stacked into a
+        single batched forward pass. Images that fail to load get a zero row,
+        which scores 0.0 against any text, as compare_image_and_text does.
+        """
+        if self.client is not None:
+            return torch.from_numpy(self.client.encode_images(list(image_paths)))
+        rows: List[Optional[torch.Tensor]] = [None] * len(image_paths)
+        pending = []
+        for i, image_path in enumerate(image_paths):
+            if self.embedding_index is not None:
+                cached = self.embedding_index.lookup(image_path)
+                if cached is not None:
+                    rows[i] = torch.from_numpy(cached)
+                    continue
+            pending.append(i)
+        if self.embedding_index is not None:
+            metrics.increment("embedding_index_hits", len(image_paths) - len(pending))
+            metrics.increment("embedding_index_misses", len(pending))
+
+        if pending:
+            images = []
+            loaded = []
+            for i in pending:
+                try:
+                    images.append(self.preprocessor(image_paths[i]))
+                    loaded.append(i)
+                except Exception as e:
+                    logger.error(f"Failed to load image {image_paths[i]}: {e}")
+            if images:
+                with metrics.span("image_encode"), torch.no_grad(), autocast_context(self.precision, self.device):
+                    features = self.model.encode_image(torch.stack(images).to(self.device))
+                    features = torch.nn.functional.normalize(features.float(), dim=-1).cpu()
+                metrics.increment("image_model_calls")
+                for i, feature in zip(loaded, features):
+                    rows[i] = feature
+
+        dim = next((row.shape[-1] for row in rows if row is not None), 0)
+        matrix = torch.stack([row if row is not None else torch.zeros(dim) for row in rows]) if rows else torch.zeros(0, 0)
+        return matrix.to(self.device)
+
+    def encode_texts(self, texts: List[str]) -> torch.Tensor:
+        """
+        Encode many text descriptions into an (M, D) matrix of L2-normalized feature vectors.
+
+        Texts already in the text cache skip the text tower; the rest are
+        tokenized and encoded together in one batch and written back.
+        """
+        if self.client is not None:
+            return torch.from_numpy(self.client.encode_texts(list(texts)))
+        texts = list(texts)
+        rows = self.text_cache.get_many(texts)
+        pending = [i for i, row in enumerate(rows) if row is None]
+        metrics.increment("text_cache_hits", len(texts) - len(pending))
+        metrics.increment("text_cache_misses", len(pending))
+        if pending:
+            # Duplicates within one call only need to be encoded once.
+            unique = list(dict.fromkeys(texts[i] for i in pending))
+            start_time = time.perf_counter()
+            text_input = self.tokenizer(unique).to(self.device)
+            with metrics.span("text_encode"), torch.no_grad(), autocast_context(self.precision, self.device):
+                features = self.model.encode_text(text_input)
+                features = torch.nn.functional.normalize(features.float(), dim=-1).cpu().numpy()
+            metrics.increment("text_model_calls")
+            self.text_cache.record_encode_time(time.perf_counter() - start_time, len(unique))
+            self.text_cache.put_many(unique, list(features))
+            encoded = dict(zip(unique, features))
+            for i in pending:
+                rows[i] = encoded[texts[i]]
+        return torch.from_numpy(np.stack(rows)).to(self.device)
+
+    def score_cards(self, card_paths: List[str], clue: str, top_k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every card against a single clue.
+
+        Args:
+            card_paths: The card image paths to score.
+            clue: The clue text, encoded once for all cards.
+            top_k: Number of best card indices to return. Defaults to all cards.
+
+        Returns:
+            A (N,) array of cosine similarities and the top-k card indices, best first.
+        """
+        scores, top = self.score_cards_many(card_paths, [clue], top_k=top_k)
+        return scores[0], top[0]
+
+    def score_cards_many(
+        self,
+        card_paths: List[str],
+        clues: List[str],
+        top_k: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score many clues against many cards with a single normalized matrix multiply.
+
+        Args:
+            card_paths: The card image paths to score.
+            clues: The clue texts to score them against.
+            top_k: Number of best card indices to return per clue. Defaults to all cards.
+
+        Returns:
+            A (M, N) clues-by-cards similarity matrix and the (M, k) top card indices per clue.
+        """
+        if not card_paths or not clues:
+            scores = np.zeros((len(clues), len(card_paths)), dtype=np.float32)
+            return scores, top_k_indices(scores, top_k)
+
+        if self.client is not None:
+            with metrics.span("scoring"):
+                return self.client.score(list(card_paths), list(clues), top_k)
+        return self._score_features(self.encode_images(card_paths), clues, top_k)
+
+    def encode_card_ids(self, registry, card_ids: np.ndarray) -> torch.Tensor:
+        """
+        Encode cards given by CardRegistry IDs into an (N, D) feature matrix.
+
+        When every card has an indexed embedding this is a single array gather;
+        otherwise it falls back to encode_images on the cards' paths.
+        """
+        if registry.has_embeddings(card_ids):
+            return torch.from_numpy(registry.embeddings(card_ids)).to(self.device)
+        return self.encode_images(registry.paths_of(card_ids))
+
+    def score_card_ids(
+        self,
+        registry,
+        card_ids: np.ndarray,
+        clues: List[str],
+        top_k: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like score_cards_many, for cards given by CardRegistry IDs.
+
+        Returns:
+            A (M, N) clues-by-cards similarity matrix and the (M, k) top positions into `card_ids`.
+        """
+        if not len(card_ids) or not clues:
+            scores = np.zeros((len(clues), len(card_ids)), dtype=np.float32)
+            return scores, top_k_indices(scores, top_k)
+        return self._score_features(self.encode_card_ids(registry, card_ids), clues, top_k)
+
+    def _score_features(self, image_features: torch.Tensor, clues: List[str], top_k: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if image_features.shape[-1] == 0:
+            logger.warning("No card images could be encoded, returning zero similarities.")
+            scores = np.zeros((len(clues), image_features.shape[0]), dtype=np.float32)
+            return scores, top_k_indices(scores, top_k)
+
+        text_features = self.encode_texts(clues)
+        with metrics.span("scoring"):
+            scores = (text_features @ image_features.T).cpu().numpy()
+            return scores, top_k_indices(scores, top_k)
+
+    def clue_ranks(self, clues: List[str], card_paths: List[str], target: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank how strongly each clue points at one card among many.
+
+        All clues are scored against all cards in a single clues-by-cards
+        matrix product. The card features are cached, so repeated calls over
+        the same deck only encode the clues.
+
+        Args:
+            clues: K candidate clues.
+            card_paths: The cards to rank against, e.g. the whole deck.
+            target: Index in `card_paths` of the card the clues are for.
+
+        Returns:
+            (K,) ranks of the target card per clue (0 = best match of all cards)
+            and (K,) margins of its score over the best other card.
+        """
+        key = tuple(card_paths)
+        cached = self._deck_features
+        if cached is None or cached[0] != key:
+            cached = (key, self.encode_images(card_paths))
+            self._deck_features = cached
+        text_features = self.encode_texts(clues)
+        with metrics.span("scoring"):
+            scores = (text_features @ cached[1].T).cpu().numpy()
+            own = scores[:, target]
+            ranks = (scores > own[:, None]).sum(axis=1)
+            others = np.delete(scores, target, axis=1)
+            best_other = others.max(axis=1) if others.shape[1] else np.full(len(clues), -np.inf, dtype=scores.dtype)
+        return ranks, own - best_other
+
     def compute_similarity(self, image_features, text_features):
         """Compute the cosine similarity between image and text feature vectors."""
         if image_features is None or text_features is None:
@@ -67,7 +311,7 @@ class ImageTextSimilarity:
 
         try:
             similarities = torch.nn.functional.cosine_similarity(image_features, text_features)
-            logger.debug(f"Cosine similarity computed successfully.")
+            logger.debug("Cosine similarity computed successfully.")
             return similarities
         except Exception as e:
             logger.error("Error computing similarity:", exc_info=True)
@@ -75,12 +319,13 @@ class ImageTextSimilarity:
 
     def compare_image_and_text(self, image_path: str, text_description: str) -> float:
         """High-level method to compare an image with a text description."""
-        logger.info(f"Comparing image '{image_path}' with text '{text_description}'")
+        logger.debug("Comparing image '%s' with text '%s'", image_path, text_description)
         image_features = self.encode_image(image_path)
         text_features = self.encode_text(text_description)
-        similarity_score = self.compute_similarity(image_features, text_features)
-        logger.info(f"Similarity score for image '{image_path}' and text '{text_description}': {similarity_score.item()}")
-        return similarity_score.item()
+        with metrics.span("scoring"):
+            similarity_score = self.compute_similarity(image_features, text_features)
+        # compute_similarity returns a plain 0.0 on failure.
+        return float(similarity_score)
 
 
 if __name__ == "__main__":
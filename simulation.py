@@ -0,0 +1,262 @@
+import os
+import time
+import random
+import logging
+import argparse
+import multiprocessing
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from players import Player
+from card_registry import ArrayDeck, CardRegistry
+from results_writer import ResultsWriter
+
+logger = logging.getLogger('simulation')
+
+CARDS_DIRECTORY = "data/images/cards"
+RESULT_COLUMNS = [
+    "game", "round", "storyteller_success", "bot_correct", "human_correct",
+    "clue_seconds", "bot_vote_seconds", "round_seconds",
+]
+SCRIPTED_HUMAN = "scripted"
+BOT_HUMAN = "bot"
+
+# Per-worker bots, built once by _init_worker and reused for every game.
+_WORKER_STATE: Dict[str, object] = {}
+
+
+class ScriptedHuman(Player):
+    """Seeded stand-in for the human guesser: picks cards and votes at random."""
+
+    def __init__(self, name: str, player_id: int, rng: random.Random):
+        super().__init__(name=name, player_id=player_id)
+        self.rng = rng
+
+    def storyteller_turn(self) -> Tuple[str, str]:
+        return self.choose_card(), "scripted clue"
+
+    def choose_card(self) -> Optional[str]:
+        if not self.hand:
+            return None
+        return self.hand.pop(self.rng.randrange(len(self.hand)))
+
+    def choose_card_based_on_clue(self, clue: str) -> Optional[str]:
+        return self.choose_card()
+
+    def vote(self, table, clue) -> int:
+        return self.rng.randrange(len(table))
+
+
+def play_round(
+    story_bot,
+    guess_bots: List,
+    human: Player,
+    deck: ArrayDeck,
+    registry: CardRegistry,
+    rng: random.Random
+) -> Dict[str, int]:
+    """
+    Play one headless round with the same protocol as main.py.
+
+    The storyteller bot gets one card and gives a clue, each guess bot is dealt
+    its hand and puts its five best matches on the table, then the guess bots
+    and the human stand-in vote. Dealing works on card IDs in `deck`; bots see
+    card paths, which are only materialized when a hand is handed to them, and
+    score them by ID through the registry's embedding rows.
+
+    Table cards are played out of the hands and discarded, and the rest of each
+    hand is discarded at the end of the round, so every round is dealt fresh
+    hands as in main.py. The deck reshuffles its discard pile when it runs low.
+    """
+    deck.deal()
+    story_bot.hand = registry.paths_of(deck.hand(0))
+    story_bot.on_hand_changed()
+    start = time.perf_counter()
+    story_card, clue = story_bot.storyteller_turn()
+    clue_seconds = time.perf_counter() - start
+    played = [deck.play(0, registry.id_of(story_card))]
+
+    table = [story_card]
+    for player, bot in enumerate(guess_bots, start=1):
+        bot.hand = registry.paths_of(deck.hand(player))
+        cards = [card for _, card in bot.choose_card_based_on_clue(clue)]
+        played.extend(deck.play(player, card_id) for card_id in registry.ids_of(cards))
+        table.extend(cards)
+    rng.shuffle(table)
+    correct_index = table.index(story_card)
+
+    start = time.perf_counter()
+    bots_correct = sum(1 for bot in guess_bots if bot.vote(table, clue) == story_card)
+    bot_vote_seconds = time.perf_counter() - start
+    human_vote = human.vote(table, clue)
+    human_correct = 1 if human_vote == correct_index or human_vote == story_card else 0
+    deck.discard(np.asarray(played, dtype=np.int32))
+    deck.discard_hands()
+
+    guessers = len(guess_bots) + 1
+    correct = bots_correct + human_correct
+    return {
+        "storyteller_success": 0 if correct in (0, guessers) else 1,
+        "bot_correct": bots_correct,
+        "human_correct": human_correct,
+        "clue_seconds": clue_seconds,
+        "bot_vote_seconds": bot_vote_seconds,
+    }
+
+
+def _init_worker(threads_per_worker: int, guess_bots: int, human: str, clue_backend: str):
+    """Build this worker's bots once. Forked workers inherit the model weights from the parent."""
+    import torch
+    from model_manager import ModelManager
+    from players import Bot
+    from caption_store import CaptionStore
+    from resources import ResourceRegistry, get_similarity, get_spacy_pipeline
+
+    torch.set_num_threads(threads_per_worker)
+    model_manager = ModelManager()
+    registry = CardRegistry.from_directory(CARDS_DIRECTORY, CaptionStore(), get_similarity(model_manager).embedding_index)
+    _WORKER_STATE["registry"] = registry
+
+    def build_abstractor():
+        from abstractor import Abstractor
+        return Abstractor(backend=clue_backend, similarity=get_similarity(model_manager), nlp=get_spacy_pipeline())
+
+    ResourceRegistry().get("abstractor", build_abstractor)
+    _WORKER_STATE["story_bot"] = Bot(name="Storyteller bot", model_manager=model_manager, prefetch_workers=1, registry=registry)
+    _WORKER_STATE["guess_bots"] = [
+        Bot(name=f"Guess bot #{i + 1}", model_manager=model_manager, prefetch_workers=1, registry=registry)
+        for i in range(guess_bots)
+    ]
+    _WORKER_STATE["human_bot"] = (
+        Bot(name="Human stand-in bot", model_manager=model_manager, prefetch_workers=1, registry=registry)
+        if human == BOT_HUMAN else None
+    )
+
+
+def play_game(task: Tuple[int, int, int, int]) -> List[Dict[str, int]]:
+    """Play all rounds of one game in a worker. `task` is (game, rounds, bot_cards, seed)."""
+    game, rounds, bot_cards, seed = task
+    rng = random.Random(seed)
+    # Bots draw their storyteller card with the global RNG.
+    random.seed(seed)
+    human = _WORKER_STATE["human_bot"] or ScriptedHuman(name="Scripted human", player_id=1, rng=rng)
+    registry = _WORKER_STATE["registry"]
+    guess_bots = _WORKER_STATE["guess_bots"]
+    # Player 0 is the storyteller bot, players 1..n the guess bots.
+    deck = ArrayDeck(len(registry), [1] + [bot_cards] * len(guess_bots), np.random.default_rng(seed))
+
+    results = []
+    for round_number in range(1, rounds + 1):
+        start_time = time.perf_counter()
+        row = play_round(_WORKER_STATE["story_bot"], guess_bots, human, deck, registry, rng)
+        row.update({"game": game, "round": round_number, "round_seconds": time.perf_counter() - start_time})
+        results.append(row)
+    return results
+
+
+def run_simulation(
+    games: int,
+    rounds: int,
+    bot_cards: int = 30,
+    guess_bots: int = 1,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    threads_per_worker: int = 1,
+    human: str = SCRIPTED_HUMAN,
+    clue_backend: str = "local",
+    start_method: str = "fork"
+) -> List[Dict[str, int]]:
+    """
+    Run many headless bot-vs-bot games across a process pool.
+
+    With "fork", the model is loaded once in the parent before the pool forks,
+    so workers share its weights copy-on-write instead of each loading ViT-L-14.
+    A forked child inherits the locks of torch's OpenMP thread pool but not its
+    threads, and can deadlock on its first parallel op. The parent therefore
+    loads with a single torch thread, which never starts that pool. With
+    "spawn", each worker loads its own model in _init_worker.
+
+    Args:
+        games: Number of games to play.
+        rounds: Rounds per game.
+        bot_cards: Cards dealt to each guess bot per round.
+        guess_bots: Number of guessing bots.
+        seed: Base seed; game i uses seed + i, so runs are reproducible.
+        workers: Worker processes. Defaults to all cores.
+        threads_per_worker: torch threads per worker, to avoid oversubscription.
+        human: "scripted" for a random voter, or "bot" for a bot stand-in.
+        clue_backend: Abstractor backend used by the storyteller.
+        start_method: multiprocessing start method, "fork" or "spawn".
+
+    Returns:
+        One result row per round, ordered by game and round.
+    """
+    from model_manager import ModelManager
+    from caption_store import CaptionStore
+    from embedding_index import list_card_images
+    from resources import get_spacy_pipeline, report_session
+
+    deck_size = len(list_card_images(CARDS_DIRECTORY))
+    if guess_bots * bot_cards + 1 > deck_size:
+        raise ValueError(f"A deck of {deck_size} cards can't deal {bot_cards} cards to {guess_bots} guess bots.")
+
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    try:
+        context = multiprocessing.get_context(start_method)
+    except ValueError:
+        logger.warning(f"{start_method} is unavailable; each worker will load its own copy of the model.")
+        context = multiprocessing.get_context("spawn")
+
+    if context.get_start_method() == "fork":
+        import torch
+
+        parent_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            ModelManager().initialize_model()
+        finally:
+            torch.set_num_threads(parent_threads)
+        get_spacy_pipeline()
+        CaptionStore()
+        logger.info(f"Shared resources loaded in {time.perf_counter() - start_time:.2f} seconds.")
+
+    tasks = [(game, rounds, bot_cards, seed + game) for game in range(1, games + 1)]
+    results: List[Dict[str, int]] = []
+    with context.Pool(
+        processes=workers,
+        initializer=_init_worker,
+        initargs=(threads_per_worker, guess_bots, human, clue_backend)
+    ) as pool:
+        for game_results in pool.imap(play_game, tasks, chunksize=max(1, games // (workers * 4))):
+            results.extend(game_results)
+
+    elapsed = time.perf_counter() - start_time
+    report_session()
+    logger.info(f"Simulated {len(results)} rounds in {elapsed:.2f} seconds ({len(results) / elapsed:.1f} rounds/sec).")
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Headless parallel bot-vs-bot simulation.")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--bot-cards", type=int, default=30)
+    parser.add_argument("--guess-bots", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--human", choices=[SCRIPTED_HUMAN, BOT_HUMAN], default=SCRIPTED_HUMAN)
+    parser.add_argument("--clue-backend", default="local")
+    parser.add_argument("--start-method", choices=["fork", "spawn"], default="fork")
+    parser.add_argument("--output", default=None, help="Results file; a .parquet extension writes Parquet.")
+    args = parser.parse_args()
+
+    results = run_simulation(
+        args.games, args.rounds, args.bot_cards, args.guess_bots, args.seed,
+        args.workers, args.threads_per_worker, args.human, args.clue_backend, args.start_method
+    )
+    output = args.output or f"simulationGames{args.games}Rounds{args.rounds}botCards{args.bot_cards}.csv"
+    with ResultsWriter(output, RESULT_COLUMNS, flush_every=1000) as writer:
+        writer.write_rows(results)
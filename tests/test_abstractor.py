@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from abstractor import Abstractor
+from clue_backends import ClueBackend
+from clue_bank import ClueBank
+
+CAPTION = "a lighthouse on a cliff at night"
+
+
+class SlowBackend(ClueBackend):
+    """Answers each request after the next delay in `delays`; the last delay repeats."""
+
+    model_name = "slow-test-model"
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, description, max_tokens, temperature, top_p):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        time.sleep(self.delays[min(call, len(self.delays) - 1)])
+        return f"clue {call}"
+
+    def generate_batch(self, prompt, descriptions, clues_per_card, max_tokens, temperature, top_p):
+        return [[] for _ in descriptions]
+
+
+class FixedFallback:
+    def generate_clues(self, description, count, temperature):
+        return ["local clue"] * count
+
+
+@pytest.fixture
+def make_abstractor(tmp_path):
+    abstractors = []
+
+    def build(delays, soft_deadline=0.05, hard_deadline=0.5):
+        abstractor = Abstractor(
+            backend=SlowBackend(delays),
+            clue_bank=ClueBank(str(tmp_path / "bank.sqlite")),
+            soft_deadline=soft_deadline,
+            hard_deadline=hard_deadline,
+        )
+        abstractor.fallback_backend = FixedFallback()
+        abstractors.append(abstractor)
+        return abstractor
+
+    yield build
+    for abstractor in abstractors:
+        abstractor.close()
+
+
+def test_fast_primary_answers(make_abstractor):
+    abstractor = make_abstractor([0.0])
+
+    assert abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8) == ("clue 0", "primary")
+    assert abstractor.backend.calls == 1
+
+
+def test_slow_primary_is_hedged(make_abstractor):
+    abstractor = make_abstractor([1.0, 0.0], hard_deadline=5.0)
+
+    assert abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8) == ("clue 1", "hedge")
+    assert abstractor.backend.calls == 2
+
+
+def test_hard_deadline_falls_back_to_a_local_clue(make_abstractor):
+    abstractor = make_abstractor([1.0], hard_deadline=0.2)
+
+    start = time.perf_counter()
+    assert abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8) == ("local clue", "fallback")
+    assert time.perf_counter() - start < 0.9
+
+
+def test_abandoned_requests_stop_retrying(make_abstractor):
+    abstractor = make_abstractor([0.3], soft_deadline=None, hard_deadline=0.1)
+    # Every answer is banned, so a live request would retry.
+    assert abstractor._generate_within_budget(CAPTION, ["clue"], 20, 0.9, 0.8)[1] == "fallback"
+    time.sleep(0.6)
+    assert abstractor.backend.calls == 1
+
+
+def test_time_to_clue_records_every_clue(make_abstractor):
+    abstractor = make_abstractor([0.0])
+
+    abstractor.generate_creative_abstract(CAPTION)
+    abstractor.generate_creative_abstract(CAPTION)
+
+    summary = abstractor.latency_summary()
+    assert summary["time_to_clue"]["count"] == 2
+    assert summary["sources"] == {"primary": 2}
+
+
+def test_close_stops_requests_and_a_later_request_starts_a_new_pool(make_abstractor):
+    abstractor = make_abstractor([0.0])
+    abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8)
+
+    abstractor.close()
+    assert abstractor._executor is None
+    assert abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8)[1] == "primary"
+
+
+def test_request_slots_are_released(tmp_path):
+    abstractor = Abstractor(
+        backend=SlowBackend([0.0]), clue_bank=ClueBank(str(tmp_path / "bank.sqlite")),
+        soft_deadline=0.05, hard_deadline=0.5, max_concurrent_clues=1,
+    )
+    try:
+        for _ in range(5):
+            assert abstractor._generate_within_budget(CAPTION, [], 20, 0.9, 0.8)[1] == "primary"
+    finally:
+        abstractor.close()
@@ -0,0 +1,78 @@
+import csv
+import json
+
+import pytest
+
+from caption_store import CaptionStore, canonical_card_key
+
+
+class FakeCaptionGenerator:
+    def __init__(self, caption):
+        self.caption = caption
+        self.calls = []
+
+    def generate_caption(self, card):
+        self.calls.append(card)
+        return self.caption
+
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch):
+    """Build a fresh CaptionStore over temporary files, bypassing the process-wide singleton."""
+    def build(csv_text=None, json_captions=None):
+        monkeypatch.setattr(CaptionStore, "_instance", None)
+        csv_path, json_path = tmp_path / "cache.csv", tmp_path / "captions.json"
+        if csv_text is not None:
+            csv_path.write_text(csv_text)
+        if json_captions is not None:
+            json_path.write_text(json.dumps(json_captions))
+        return CaptionStore(str(csv_path), str(json_path))
+
+    return build
+
+
+def test_card_key_is_the_file_name():
+    assert canonical_card_key("data/images/cards/card_00001.jpg") == "card_00001.jpg"
+    assert canonical_card_key("/data/images/cards/./card_00001.jpg ") == "card_00001.jpg"
+    # cache.csv glued the directory onto the file name.
+    assert canonical_card_key("data/images/cardscard_00001.jpg") == "card_00001.jpg"
+    assert canonical_card_key("data/images/cards/cards_of_fate.jpg") == "cards_of_fate.jpg"
+
+
+def test_every_path_spelling_finds_the_caption(make_store):
+    store = make_store(
+        csv_text="data/images/cardscard_00001.jpg,a fox in the snow\n",
+        json_captions={"/data/images/cards/card_00002.jpg": " a red door "},
+    )
+
+    assert store.get("data/images/cards/card_00001.jpg") == "a fox in the snow"
+    assert store.get("card_00002.jpg") == "a red door"
+    assert "other/dir/card_00001.jpg" in store
+    assert store.get("data/images/cards/card_00003.jpg") is None
+
+
+def test_csv_captions_take_precedence_over_json(make_store):
+    store = make_store(
+        csv_text="data/images/cardscard_00001.jpg,newer caption\n",
+        json_captions={"data/images/cards/card_00001.jpg": "older caption"},
+    )
+    assert store.get("card_00001.jpg") == "newer caption"
+
+
+def test_on_demand_captions_are_appended_to_the_csv(make_store, tmp_path):
+    # The existing file lacks a trailing newline, so the append must add one.
+    store = make_store(csv_text="data/images/cardscard_00001.jpg,a fox in the snow")
+    generator = FakeCaptionGenerator("a lighthouse, at night")
+
+    assert store.get("data/images/cards/card_00009.jpg", generator) == "a lighthouse, at night"
+    assert store.get("data/images/cards/card_00009.jpg", generator) == "a lighthouse, at night"
+    assert generator.calls == ["data/images/cards/card_00009.jpg"]
+
+    with open(tmp_path / "cache.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["data/images/cardscard_00001.jpg", "a fox in the snow"],
+        ["data/images/cards/card_00009.jpg", "a lighthouse, at night"],
+    ]
+    # A new process reads the appended caption back.
+    assert make_store().get("card_00009.jpg") == "a lighthouse, at night"
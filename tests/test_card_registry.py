@@ -0,0 +1,114 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from card_registry import EMPTY_SLOT, ArrayDeck, CardRegistry
+
+
+class FakeEmbeddingIndex:
+    def __init__(self, rows, dim=3):
+        self.rows = rows
+        self.embeddings = np.arange(len(rows) * dim, dtype=np.float16).reshape(len(rows), dim)
+
+    def lookup_row(self, path):
+        return self.rows.get(path)
+
+
+def test_ids_follow_path_order_and_canonicalize():
+    registry = CardRegistry(["cards/a.jpg", "cards/./b.jpg"])
+    assert registry.id_of("cards/b.jpg") == 1
+    np.testing.assert_array_equal(registry.ids_of(["cards/b.jpg", "cards/a.jpg"]), [1, 0])
+    assert registry.paths_of(np.array([1, 0])) == ["cards/b.jpg", "cards/a.jpg"]
+    with pytest.raises(KeyError):
+        registry.id_of("cards/missing.jpg")
+
+
+def test_embeddings_gather_indexed_rows():
+    index = FakeEmbeddingIndex({"a.jpg": 1, "b.jpg": 0})
+    registry = CardRegistry(["a.jpg", "b.jpg", "c.jpg"], embedding_index=index)
+
+    assert registry.has_embeddings(np.array([0, 1]))
+    assert not registry.has_embeddings(np.array([2]))
+    embeddings = registry.embeddings(np.array([0, 1]))
+    assert embeddings.dtype == np.float32
+    np.testing.assert_array_equal(embeddings, index.embeddings[[1, 0]])
+    with pytest.raises(KeyError):
+        registry.embeddings(np.array([2]))
+
+
+def test_deal_fills_every_hand_with_distinct_cards():
+    deck = ArrayDeck(20, [1, 5, 5], np.random.default_rng(0))
+
+    assert deck.deal() == 11
+    hands = [deck.hand(player) for player in range(3)]
+    assert [len(hand) for hand in hands] == [1, 5, 5]
+    dealt = np.concatenate(hands)
+    assert len(set(dealt.tolist())) == 11
+    assert deck.cards_left == 9
+    # Slots beyond a player's hand size stay empty.
+    assert (deck.hands[0, 1:] == EMPTY_SLOT).all()
+
+
+def test_deal_only_fills_empty_slots():
+    deck = ArrayDeck(20, [3], np.random.default_rng(0))
+    deck.deal()
+    assert deck.deal() == 0
+    assert deck.cards_left == 17
+
+
+def test_deal_warns_when_the_deck_runs_out(caplog):
+    deck = ArrayDeck(4, [3, 3], np.random.default_rng(0))
+    assert deck.deal() == 4
+    assert "insufficient cards" in caplog.text
+
+
+def test_collect_all_restores_a_full_shuffled_deck():
+    deck = ArrayDeck(10, [4], np.random.default_rng(0))
+    deck.deal()
+    deck.collect_all()
+    assert deck.cards_left == 10
+    assert len(deck.hand(0)) == 0
+    assert sorted(deck.draw_pile.tolist()) == list(range(10))
+
+
+def test_captions_follow_card_ids():
+    registry = CardRegistry(["a.jpg", "b.jpg"], captions=["a cat", "a dog"])
+    assert registry.captions_of(np.array([1, 0])) == ["a dog", "a cat"]
+
+
+def test_play_removes_the_card_from_the_hand():
+    deck = ArrayDeck(10, [3], np.random.default_rng(0))
+    deck.deal()
+    card = int(deck.hand(0)[1])
+
+    assert deck.play(0, card) == card
+    assert card not in deck.hand(0).tolist()
+    assert len(deck.hand(0)) == 2
+    with pytest.raises(ValueError):
+        deck.play(0, card)
+
+
+def test_deal_reshuffles_discards_when_the_draw_pile_runs_low():
+    deck = ArrayDeck(6, [4], np.random.default_rng(0))
+    deck.deal()
+    first_hand = deck.hand(0).copy()
+    deck.discard_hands()
+    assert len(deck.hand(0)) == 0
+    assert deck.cards_left == 2
+
+    assert deck.deal() == 4
+    assert deck.cards_left == 2
+    # Both undealt cards and the reshuffled discards are dealt, and no card is lost or duplicated.
+    assert deck.cards_discarded == 0
+    held = deck.hand(0).tolist()
+    assert sorted(held + deck.draw_pile[:deck.cards_left].tolist()) == list(range(6))
+    assert set(held) & set(first_hand.tolist())
+
+
+def test_collect_all_empties_the_discard_pile():
+    deck = ArrayDeck(10, [4], np.random.default_rng(0))
+    deck.deal()
+    deck.discard(np.array([deck.play(0, int(deck.hand(0)[0]))]))
+    deck.collect_all()
+    assert deck.cards_discarded == 0
+    assert deck.cards_left == 10
@@ -0,0 +1,71 @@
+import threading
+
+from clue_bank import ClueBank, caption_hash, params_key
+
+MODEL = "gpt-4"
+PARAMS = params_key(max_tokens=20, temperature=0.9, top_p=0.8)
+CAPTION = "a lighthouse on a cliff at night"
+
+
+def make_bank(tmp_path, clues=("lonely light", "the last watch", "salt and stone")):
+    bank = ClueBank(str(tmp_path / "bank.sqlite"), seed=0)
+    bank.add(CAPTION, MODEL, PARAMS, clues)
+    return bank
+
+
+def test_caption_hash_ignores_case_and_whitespace():
+    assert caption_hash("A  Lighthouse") == caption_hash("a lighthouse ")
+
+
+def test_add_ignores_duplicates_and_blanks(tmp_path):
+    bank = make_bank(tmp_path)
+    assert bank.add(CAPTION, MODEL, PARAMS, ["lonely light", " ", "new clue"]) == 1
+    assert bank.count(CAPTION, MODEL, PARAMS) == 4
+
+
+def test_draw_never_repeats_and_runs_out(tmp_path):
+    bank = make_bank(tmp_path)
+    drawn = [bank.draw(CAPTION, MODEL, PARAMS) for _ in range(3)]
+    assert sorted(drawn) == sorted(bank.clues(CAPTION, MODEL, PARAMS))
+    assert bank.draw(CAPTION, MODEL, PARAMS) is None
+
+
+def test_draw_is_keyed_by_model_and_params(tmp_path):
+    bank = make_bank(tmp_path)
+    assert bank.draw(CAPTION, "other-model", PARAMS) is None
+    assert bank.draw(CAPTION, MODEL, params_key(temperature=0.1)) is None
+
+
+def test_mark_drawn_removes_clue_from_undrawn_and_draw(tmp_path):
+    bank = make_bank(tmp_path, clues=("lonely light", "the last watch"))
+    bank.mark_drawn(CAPTION, MODEL, PARAMS, "lonely light ")
+
+    assert bank.undrawn(CAPTION, MODEL, PARAMS) == ["the last watch"]
+    assert bank.draw(CAPTION, MODEL, PARAMS) == "the last watch"
+    assert bank.draw(CAPTION, MODEL, PARAMS) is None
+
+
+def test_concurrent_draws_never_share_a_clue(tmp_path):
+    clues = [f"clue {i}" for i in range(40)]
+    bank = make_bank(tmp_path, clues=clues)
+    drawn = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        for _ in range(5):
+            drawn.append(bank.draw(CAPTION, MODEL, PARAMS))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(drawn) == sorted(clues)
+
+
+def test_open_if_exists(tmp_path):
+    assert ClueBank.open_if_exists(str(tmp_path / "missing.sqlite")) is None
+    make_bank(tmp_path).close()
+    assert ClueBank.open_if_exists(str(tmp_path / "bank.sqlite")) is not None
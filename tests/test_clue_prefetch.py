@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from clue_prefetch import CluePrefetcher
+from players import Bot
+
+
+class RecordingGenerator:
+    """generate_fn stand-in that records every card and can hold jobs until released."""
+
+    def __init__(self, blocking=False):
+        self.cards = []
+        self.release = threading.Event()
+        if not blocking:
+            self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, card):
+        with self._lock:
+            self.cards.append(card)
+        self.release.wait(timeout=5)
+        return f"clue for {card}"
+
+
+@pytest.fixture
+def prefetcher_factory():
+    prefetchers = []
+
+    def build(generate_fn, max_workers=4):
+        prefetcher = CluePrefetcher(generate_fn, max_workers=max_workers)
+        prefetchers.append(prefetcher)
+        return prefetcher
+
+    yield build
+    for prefetcher in prefetchers:
+        prefetcher.shutdown()
+
+
+def test_sync_submits_one_job_per_card(prefetcher_factory):
+    generate = RecordingGenerator()
+    prefetcher = prefetcher_factory(generate)
+
+    prefetcher.sync(["a.jpg", "b.jpg", "c.jpg"])
+    prefetcher.sync(["a.jpg", "b.jpg", "c.jpg"])
+
+    assert [prefetcher.get(card, timeout=5) for card in ["a.jpg", "b.jpg", "c.jpg"]] == [
+        "clue for a.jpg", "clue for b.jpg", "clue for c.jpg"
+    ]
+    assert sorted(generate.cards) == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_cards_that_leave_the_hand_are_cancelled(prefetcher_factory):
+    generate = RecordingGenerator(blocking=True)
+    prefetcher = prefetcher_factory(generate, max_workers=1)
+
+    prefetcher.sync(["a.jpg"])
+    # b.jpg queues behind the running a.jpg, then leaves the hand before it starts.
+    prefetcher.sync(["a.jpg", "b.jpg"])
+    prefetcher.sync(["a.jpg"])
+    generate.release.set()
+
+    assert prefetcher.get("a.jpg", timeout=5) == "clue for a.jpg"
+    assert prefetcher.get("b.jpg") is None
+    assert generate.cards == ["a.jpg"]
+
+
+def test_get_gives_up_after_the_timeout(prefetcher_factory):
+    generate = RecordingGenerator(blocking=True)
+    prefetcher = prefetcher_factory(generate)
+
+    prefetcher.sync(["a.jpg"])
+    assert prefetcher.get("a.jpg", timeout=0.05) is None
+    generate.release.set()
+
+
+class RecordingAbstractor:
+    def __init__(self):
+        self.used = []
+
+    def mark_used(self, description, clue):
+        self.used.append((description, clue))
+
+
+def test_storyteller_turn_takes_the_prefetched_clue(prefetcher_factory):
+    bot = Bot.__new__(Bot)
+    bot.name = "Test bot"
+    bot.hand = ["a.jpg", "b.jpg", "c.jpg"]
+    bot._abstractor = RecordingAbstractor()
+    prepared = []
+
+    def prepare_clue(card):
+        prepared.append(card)
+        return f"clue for {card}", f"caption of {card}", f"banked clue for {card}"
+
+    bot._prepare_clue = prepare_clue
+    bot._clue_prefetcher = prefetcher_factory(prepare_clue)
+    bot.on_hand_changed()
+
+    card, clue = bot.storyteller_turn()
+
+    assert clue == f"clue for {card}"
+    assert prepared.count(card) == 1
+    # Only the played card's clue is used up, not the ones prefetched for the rest of the hand.
+    assert bot._abstractor.used == [(f"caption of {card}", f"banked clue for {card}")]
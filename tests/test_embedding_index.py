@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import embedding_index
+from embedding_index import ImageEmbeddingIndex, update_index
+
+MODEL, PRETRAINED = "test-model", "test-tag"
+
+
+def write_card(directory, name, content):
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def unit(values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index_with_card(tmp_path):
+    card = write_card(tmp_path, "card.jpg", b"original pixels")
+    index = update_index({card: unit([1, 0, 0])}, MODEL, PRETRAINED, str(tmp_path / "index"))
+    return index, card
+
+
+def test_touched_but_unchanged_file_still_hits(index_with_card):
+    index, card = index_with_card
+    stat = os.stat(card)
+    os.utime(card, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert index.lookup_row(card) == 0
+    np.testing.assert_allclose(index.lookup(card), [1, 0, 0], atol=1e-3)
+    # The re-hashed entry records the new mtime, so the next lookup takes the stat-match fast path.
+    assert index.is_current(card)
+
+
+def test_edited_file_misses_and_warns(index_with_card, caplog):
+    index, card = index_with_card
+    with open(card, "wb") as f:
+        f.write(b"edited pixels, longer")
+
+    assert index.lookup_row(card) is None
+    assert "stale" in caplog.text
+    assert card not in index
+
+
+def test_a_repeated_miss_is_not_hashed_again(index_with_card, monkeypatch):
+    index, card = index_with_card
+    with open(card, "wb") as f:
+        f.write(b"edited pixels, longer")
+    hashed = []
+    real_hash = embedding_index.file_content_hash
+    monkeypatch.setattr(embedding_index, "file_content_hash", lambda path: hashed.append(path) or real_hash(path))
+
+    assert index.lookup_row(card) is None
+    assert index.lookup_row(card) is None
+    assert len(hashed) == 1
+
+    # Changing the file again invalidates the remembered miss.
+    with open(card, "wb") as f:
+        f.write(b"edited once more, even longer")
+    assert index.lookup_row(card) is None
+    assert len(hashed) == 2
+
+
+def test_update_index_keeps_rows_and_appends_new_cards(index_with_card, tmp_path):
+    index, card = index_with_card
+    new_card = write_card(tmp_path, "new.jpg", b"new pixels")
+
+    updated = update_index({new_card: unit([0, 1, 0])}, MODEL, PRETRAINED, str(tmp_path / "index"))
+
+    assert len(updated) == 2
+    assert updated.lookup_row(card) == 0
+    assert updated.lookup_row(new_card) == 1
+    np.testing.assert_allclose(updated.lookup(card), [1, 0, 0], atol=1e-3)
+    np.testing.assert_allclose(updated.lookup(new_card), [0, 1, 0], atol=1e-3)
+    # The existing card's recorded file state survives the rewrite.
+    assert ImageEmbeddingIndex.load(str(tmp_path / "index")).is_current(card)
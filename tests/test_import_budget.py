@@ -0,0 +1,14 @@
+import pytest
+
+from import_budget import BUDGETED_MODULES, HEAVY_MODULES, check_import_budget, measure_import
+
+
+def test_budgeted_modules_stay_within_budget():
+    assert check_import_budget() == []
+
+
+@pytest.mark.parametrize("module", BUDGETED_MODULES)
+def test_budgeted_modules_skip_the_model_stack(module):
+    _, imported = measure_import(module)
+    assert module in imported
+    assert [name for name in HEAVY_MODULES if name in imported] == []
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from inference_server import InferenceClient, InferenceServer
+
+AUTHKEY = b"test-key"
+
+
+class StubModelManager:
+    model_name = "stub-model"
+    pretrained = "stub-tag"
+
+
+class StubCaptionGenerator:
+    """Records every batch it is asked to caption; `release` holds batches until set."""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_captions(self, paths):
+        self.batches.append(list(paths))
+        self.release.wait(timeout=5)
+        return {path: f"caption of {path}" for path in paths}
+
+
+@pytest.fixture
+def start_server():
+    servers, clients = [], []
+    # A short directory: Unix socket paths are limited to about 100 characters.
+    directory = tempfile.mkdtemp(prefix="inf")
+
+    def start(**kwargs):
+        address = os.path.join(directory, f"s{len(servers)}.sock")
+        captions = StubCaptionGenerator()
+        server = InferenceServer(
+            StubModelManager(), address, authkey=AUTHKEY,
+            similarity=object(), caption_generator=captions, **kwargs
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(address) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        servers.append(server)
+
+        def connect(authkey=AUTHKEY):
+            client = InferenceClient(address, authkey=authkey)
+            clients.append(client)
+            return client
+
+        return server, captions, connect
+
+    yield start
+    for client in clients:
+        client.close()
+    for server in servers:
+        server.shutdown()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_concurrent_clients_share_one_batch(start_server):
+    server, captions, connect = start_server(max_batch_size=2, max_wait_ms=2000)
+    client = connect()
+    results = {}
+
+    # Each thread uses its own connection, as concurrent bots in one process do.
+    threads = [
+        threading.Thread(target=lambda path=path: results.update({path: client.caption([path])}))
+        for path in ["a.jpg", "b.jpg"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == {"a.jpg": ["caption of a.jpg"], "b.jpg": ["caption of b.jpg"]}
+    assert len(captions.batches) == 1 and sorted(captions.batches[0]) == ["a.jpg", "b.jpg"]
+    assert server.batched_requests == 2
+
+
+def test_a_wrong_authkey_is_rejected(start_server):
+    server, _, connect = start_server()
+
+    with pytest.raises(AuthenticationError):
+        Client(server.address, family="AF_UNIX", authkey=b"wrong key")
+    # The server keeps serving clients with the right key.
+    assert connect().model_name == "stub-model"
+
+
+def test_timed_out_requests_fail_and_are_dropped(start_server):
+    server, captions, connect = start_server(max_batch_size=1, max_wait_ms=0, request_timeout=0.2)
+    captions.release.clear()
+    client = connect()
+    errors = []
+
+    def caption(path):
+        try:
+            client.caption([path])
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    # a.jpg holds the batcher; b.jpg times out in the queue behind it.
+    first = threading.Thread(target=caption, args=("a.jpg",))
+    first.start()
+    time.sleep(0.05)
+    caption("b.jpg")
+    first.join(timeout=5)
+    captions.release.set()
+    time.sleep(0.3)
+
+    assert len(errors) == 2 and all("Timed out" in error for error in errors)
+    assert captions.batches == [["a.jpg"]]
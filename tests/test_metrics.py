@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from metrics import LatencyHistogram, Metrics, _NULL_SPAN
+
+
+def test_percentiles_on_a_known_sample():
+    histogram = LatencyHistogram(buckets=[0.01, 0.1, 1.0])
+    for seconds in [0.005] * 5 + [0.05] * 4 + [0.5]:
+        histogram.record(seconds)
+
+    # A percentile is its bucket's upper bound, clamped to the largest value seen.
+    assert histogram.percentile(50) == 0.01
+    assert histogram.percentile(90) == 0.1
+    assert histogram.percentile(99) == 0.5
+    summary = histogram.summary()
+    assert summary["count"] == 10
+    assert summary["min"] == 0.005 and summary["max"] == 0.5
+    assert summary["mean"] == pytest.approx(0.0725)
+
+
+def test_values_beyond_the_last_bucket_report_the_maximum():
+    histogram = LatencyHistogram(buckets=[0.01])
+    histogram.record(3.0)
+    assert histogram.percentile(50) == 3.0
+    assert LatencyHistogram().percentile(99) == 0.0
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+
+    span = metrics.span("caption")
+    assert span is _NULL_SPAN
+    with span:
+        pass
+    metrics.increment("caption_model_calls")
+    metrics.add_report("resources", {"loaded": 1})
+
+    snapshot = metrics.snapshot()
+    assert snapshot["spans"] == {} and snapshot["counters"] == {} and snapshot["reports"] == {}
+
+
+@pytest.fixture
+def recorded_metrics():
+    metrics = Metrics(enabled=True)
+    with metrics.span("caption"):
+        pass
+    metrics._spans["caption"].record(0.003)
+    metrics.increment("caption_model_calls", 2)
+    metrics.add_report("text_cache", {"hits": 3, "hit_rate": 0.75, "model": "ViT-L-14", "nested": {"size": 4}})
+    return metrics
+
+
+def test_json_export(recorded_metrics, tmp_path):
+    path = str(tmp_path / "metrics.json")
+    recorded_metrics.export(path)
+
+    with open(path) as f:
+        exported = json.load(f)
+    assert exported["spans"]["caption"]["count"] == 2
+    assert exported["counters"] == {"caption_model_calls": 2}
+    assert exported["reports"]["text_cache"]["model"] == "ViT-L-14"
+
+
+def test_prometheus_export(recorded_metrics, tmp_path):
+    path = str(tmp_path / "metrics.prom")
+    recorded_metrics.export(path)
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert "# TYPE storyteller_caption_seconds histogram" in lines
+    assert 'storyteller_caption_seconds_bucket{le="+Inf"} 2' in lines
+    assert "storyteller_caption_seconds_count 2" in lines
+    assert 'storyteller_caption_seconds_bucket{le="0.005"} 2' in lines
+    assert "# TYPE storyteller_caption_model_calls_total counter" in lines
+    assert "storyteller_caption_model_calls_total 2" in lines
+    # Numeric report fields become gauges; strings are dropped.
+    assert "storyteller_text_cache_hits 3" in lines
+    assert "storyteller_text_cache_hit_rate 0.75" in lines
+    assert "storyteller_text_cache_nested_size 4" in lines
+    assert not any("model" in line and "text_cache" in line for line in lines)
+
+
+def test_reset_clears_everything(recorded_metrics):
+    recorded_metrics.reset()
+    snapshot = recorded_metrics.snapshot()
+    assert snapshot["spans"] == {} and snapshot["counters"] == {} and snapshot["reports"] == {}
@@ -0,0 +1,128 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import players
+from card_registry import CardRegistry
+from players import Bot
+
+
+class FakeSimilarity:
+    def __init__(self):
+        self.calls = []
+
+    def score_card_ids(self, registry, card_ids, clues, top_k):
+        self.calls.append(("ids", card_ids.tolist()))
+        scores = np.array([card_ids], dtype=np.float32)
+        return scores, np.argsort(-scores, axis=-1)[:, :top_k]
+
+    def score_cards(self, cards, clue, top_k=None):
+        self.calls.append(("paths", list(cards)))
+        scores = np.arange(len(cards), dtype=np.float32)
+        return scores, np.argsort(-scores)[:top_k]
+
+
+def make_bot(registry=None, similarity=None):
+    """A Bot without models: only the attributes the tested methods use."""
+    bot = Bot.__new__(Bot)
+    bot.name = "Test bot"
+    bot.hand = []
+    bot._registry = registry
+    bot._registry_deck = registry.paths.tolist() if registry is not None else None
+    bot._similarity_checker = similarity or FakeSimilarity()
+    return bot
+
+
+def test_scores_registered_cards_by_id():
+    registry = CardRegistry(["a.jpg", "b.jpg", "c.jpg"])
+    bot = make_bot(registry)
+
+    assert bot.vote(["c.jpg", "a.jpg"], "clue") == "c.jpg"
+    assert bot._similarity_checker.calls == [("ids", [2, 0])]
+
+
+def test_falls_back_to_paths_for_unregistered_cards():
+    bot = make_bot(CardRegistry(["a.jpg"]))
+
+    bot.vote(["a.jpg", "elsewhere.jpg"], "clue")
+    assert bot._similarity_checker.calls[0][0] == "paths"
+
+
+class RankingSimilarity:
+    def __init__(self, ranks, margins):
+        self.ranks = np.asarray(ranks)
+        self.margins = np.asarray(margins)
+        self.calls = []
+
+    def clue_ranks(self, clues, card_paths, target):
+        self.calls.append((list(clues), list(card_paths), target))
+        return self.ranks, self.margins
+
+
+@pytest.fixture(autouse=True)
+def fresh_directory_decks(monkeypatch):
+    monkeypatch.setattr(players, "_DIRECTORY_DECKS", {})
+
+
+def make_card_directory(tmp_path, count=100):
+    """Create `count` empty card files and return the path of the one at index count // 2."""
+    for i in range(count):
+        (tmp_path / f"card_{i:03d}.jpg").write_bytes(b"")
+    return str(tmp_path / f"card_{count // 2:03d}.jpg")
+
+
+def test_picks_the_clue_inside_the_rank_band(tmp_path):
+    card = make_card_directory(tmp_path)
+    similarity = RankingSimilarity(ranks=[0, 25, 4, 12], margins=[0.05, -0.2, -0.01, -0.1])
+    bot = make_bot(similarity=similarity)
+
+    # A 100-card deck gives a band of ranks 1-10: only "c" lands in it.
+    assert bot.choose_clue_for_deck(card, ["a", "b", "c", "d"]) == "c"
+    _, deck, target = similarity.calls[0]
+    assert len(deck) == 100 and deck[target].endswith("card_050.jpg")
+
+
+def test_outside_the_band_prefers_the_smallest_miss_then_margin(tmp_path):
+    card = make_card_directory(tmp_path)
+    similarity = RankingSimilarity(ranks=[0, 12, 12, 40], margins=[0.3, -0.2, -0.05, -0.4])
+    bot = make_bot(similarity=similarity)
+
+    # With a band of 1-10, rank 0 misses it by one place and rank 12 by two.
+    assert bot.choose_clue_for_deck(card, ["a", "b", "c", "d"]) == "a"
+
+    # Equal misses: the narrower margin wins.
+    similarity.ranks = np.array([12, 12, 40])
+    similarity.margins = np.array([-0.2, -0.05, -0.4])
+    assert bot.choose_clue_for_deck(card, ["b", "c", "d"]) == "c"
+
+
+def test_single_clue_and_scoring_failures_skip_ranking(tmp_path):
+    card = make_card_directory(tmp_path)
+
+    class Failing:
+        def clue_ranks(self, *args):
+            raise RuntimeError("model unavailable")
+
+    bot = make_bot(similarity=Failing())
+    assert bot.choose_clue_for_deck(card, ["only"]) == "only"
+    assert bot.choose_clue_for_deck(card, ["first", "second"]) == "first"
+
+
+def test_directory_deck_is_listed_once(tmp_path):
+    card = make_card_directory(tmp_path, count=5)
+    bot = make_bot()
+    deck, target = bot._deck_cards(card)
+    assert len(deck) == 5
+
+    (tmp_path / "card_999.jpg").write_bytes(b"")
+    assert bot._deck_cards(card)[0] is deck
+
+    outsider_deck, outsider = bot._deck_cards(str(tmp_path / "card_999.jpg"))
+    assert outsider == 5 and len(outsider_deck) == 6 and len(deck) == 5
+
+
+def test_registry_supplies_the_deck():
+    registry = CardRegistry(["x/a.jpg", "x/b.jpg", "x/c.jpg"])
+    bot = make_bot(registry)
+    deck, target = bot._deck_cards("x/b.jpg")
+    assert deck == ["x/a.jpg", "x/b.jpg", "x/c.jpg"] and target == 1
@@ -0,0 +1,59 @@
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that time.sleep advances instantly (exact binary fractions only)."""
+    now = [64.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limit.time, "sleep", sleep)
+    return now, sleeps
+
+
+def test_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_per_minute_converts_to_per_second():
+    bucket = TokenBucket.per_minute(120)
+    assert bucket.rate == pytest.approx(2.0)
+    assert bucket.capacity == pytest.approx(2.0)
+
+
+def test_burst_up_to_capacity_then_waits(clock):
+    now, sleeps = clock
+    bucket = TokenBucket(rate_per_second=2.0, capacity=2.0)
+
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == []
+
+    bucket.acquire()
+    assert sum(sleeps) == pytest.approx(0.5)
+
+
+def test_acquire_more_than_capacity_raises(clock):
+    bucket = TokenBucket(rate_per_second=1.0, capacity=2.0)
+    with pytest.raises(ValueError):
+        bucket.acquire(3.0)
+
+
+def test_pause_drains_bucket_and_blocks_until_over(clock):
+    now, sleeps = clock
+    bucket = TokenBucket(rate_per_second=4.0, capacity=4.0)
+
+    bucket.pause(2.0)
+    bucket.acquire()
+
+    # The pause itself, then one token's worth of refill after it ends.
+    assert sum(sleeps) == pytest.approx(2.25)
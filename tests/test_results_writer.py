@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+
+from results_writer import ResultsWriter
+
+COLUMNS = ["round", "bot_correct", "clue_seconds"]
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_buffers_until_flush_every(tmp_path):
+    path = str(tmp_path / "results.csv")
+    writer = ResultsWriter(path, COLUMNS, flush_every=2)
+
+    writer.write_row({"round": 1, "bot_correct": 0, "clue_seconds": 0.5})
+    assert not (tmp_path / "results.csv").exists()
+
+    writer.write_row({"round": 2, "bot_correct": 1, "clue_seconds": 0.25})
+    assert read_csv(path) == [COLUMNS, ["1", "0", "0.5"], ["2", "1", "0.25"]]
+    writer.close()
+
+
+def test_close_flushes_remaining_rows_and_fills_missing_columns(tmp_path):
+    path = str(tmp_path / "results.csv")
+    with ResultsWriter(path, COLUMNS, flush_every=100) as writer:
+        writer.write_row({"round": 1, "bot_correct": 1})
+    assert read_csv(path) == [COLUMNS, ["1", "1", ""]]
+
+
+def test_appends_across_runs_with_a_single_header(tmp_path):
+    path = str(tmp_path / "results.csv")
+    for round_number in (1, 2):
+        with ResultsWriter(path, COLUMNS) as writer:
+            writer.write_row({"round": round_number, "bot_correct": 0, "clue_seconds": 1.0})
+    rows = read_csv(path)
+    assert rows[0] == COLUMNS
+    assert [row[0] for row in rows[1:]] == ["1", "2"]
+
+
+def test_rejects_existing_file_with_other_columns(tmp_path):
+    path = str(tmp_path / "results.csv")
+    with ResultsWriter(path, ["other"]) as writer:
+        writer.write_row({"other": 1})
+    with pytest.raises(ValueError):
+        ResultsWriter(path, COLUMNS)
+
+
+def test_rejects_unknown_columns_and_writes_after_close(tmp_path):
+    writer = ResultsWriter(str(tmp_path / "results.csv"), COLUMNS)
+    with pytest.raises(ValueError):
+        writer.write_row({"round": 1, "surprise": 2})
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.write_row({"round": 1})
+
+
+def test_parquet_without_pyarrow_falls_back_to_csv(tmp_path, monkeypatch):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def no_pyarrow(name, *args, **kwargs):
+        if name == "pyarrow":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_pyarrow)
+    writer = ResultsWriter(str(tmp_path / "results.parquet"), COLUMNS)
+    assert writer.format == "csv"
+    assert writer.path.endswith("results.csv")
+    writer.close()
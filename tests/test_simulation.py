@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import simulation
+from card_registry import ArrayDeck, CardRegistry
+from players import Player
+from simulation import ScriptedHuman, play_game, play_round
+
+TIMING_FIELDS = ("clue_seconds", "bot_vote_seconds", "round_seconds")
+
+
+class StubPlayer(Player):
+    """Model-free player. `table` holds the storyteller card of the current round, shared by all stubs."""
+
+    def __init__(self, name, table, vote=None):
+        super().__init__(name=name, player_id=None)
+        self.table = table
+        self._vote = vote or (lambda cards: self.table["story_card"])
+
+    def storyteller_turn(self):
+        self.table["story_card"] = self.hand[0]
+        return self.hand[0], "stub clue"
+
+    def choose_card(self):
+        return self.hand[0]
+
+    def choose_card_based_on_clue(self, clue):
+        return [(1.0, card) for card in self.hand[:5]]
+
+    def vote(self, table, clue):
+        return self._vote(table)
+
+
+def make_game(num_cards=20, bot_cards=6, guess_bots=2):
+    registry = CardRegistry([f"cards/card_{i:02d}.jpg" for i in range(num_cards)])
+    deck = ArrayDeck(len(registry), [1] + [bot_cards] * guess_bots, np.random.default_rng(0))
+    table = {}
+    story_bot = StubPlayer("Storyteller", table)
+    guess_bots = [StubPlayer(f"Guesser {i}", table) for i in range(guess_bots)]
+    return registry, deck, table, story_bot, guess_bots
+
+
+def wrong_card(table):
+    return lambda cards: next(card for card in cards if card != table["story_card"])
+
+
+@pytest.mark.parametrize("vote", ["index", "path"])
+def test_human_correct_accepts_an_index_or_a_path(vote):
+    registry, deck, table, story_bot, guess_bots = make_game()
+    if vote == "index":
+        human = StubPlayer("Human", table, vote=lambda cards: cards.index(table["story_card"]))
+    else:
+        human = StubPlayer("Human", table)
+
+    row = play_round(story_bot, guess_bots, human, deck, registry, random.Random(0))
+
+    assert (row["bot_correct"], row["human_correct"]) == (2, 1)
+    # Every guesser found the card, so the storyteller fails.
+    assert row["storyteller_success"] == 0
+
+
+def test_storyteller_succeeds_when_only_some_guessers_find_the_card():
+    registry, deck, table, story_bot, guess_bots = make_game()
+    guess_bots[1]._vote = wrong_card(table)
+    human = StubPlayer("Human", table, vote=lambda cards: next(
+        i for i, card in enumerate(cards) if card != table["story_card"]
+    ))
+
+    row = play_round(story_bot, guess_bots, human, deck, registry, random.Random(0))
+
+    assert (row["bot_correct"], row["human_correct"], row["storyteller_success"]) == (1, 0, 1)
+
+
+def test_round_discards_every_card_it_dealt():
+    registry, deck, table, story_bot, guess_bots = make_game()
+    play_round(story_bot, guess_bots, ScriptedHuman("Scripted", 1, random.Random(0)), deck, registry, random.Random(0))
+
+    assert all(len(deck.hand(player)) == 0 for player in range(3))
+    assert deck.cards_discarded == 13
+    assert deck.cards_left + deck.cards_discarded == len(registry)
+
+
+def test_play_game_is_reproducible_across_reshuffles(monkeypatch):
+    registry, _, table, story_bot, guess_bots = make_game(num_cards=12, guess_bots=1)
+    guess_bots[0]._vote = wrong_card(table)
+    for key, value in {"registry": registry, "story_bot": story_bot, "guess_bots": guess_bots, "human_bot": None}.items():
+        monkeypatch.setitem(simulation._WORKER_STATE, key, value)
+
+    # Each round deals 1 + 5 of the 12 cards, so later rounds need the discards back.
+    first = play_game((1, 5, 5, 0))
+    second = play_game((1, 5, 5, 0))
+
+    assert [(row["game"], row["round"]) for row in first] == [(1, r) for r in range(1, 6)]
+    assert all(row["bot_correct"] == 0 for row in first)
+
+    def outcome(rows):
+        return [{key: value for key, value in row.items() if key not in TIMING_FIELDS} for row in rows]
+
+    assert outcome(first) == outcome(second)
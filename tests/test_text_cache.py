@@ -0,0 +1,76 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from text_cache import TextFeatureCache, normalize_text
+
+
+def features(value: float, dim: int = 4) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_normalize_text_collapses_case_and_whitespace():
+    assert normalize_text("  Silent   LONGING ") == "silent longing"
+
+
+def test_get_many_counts_hits_and_misses():
+    cache = TextFeatureCache("model", "tag")
+    cache.put("a dream", features(1.0))
+
+    found = cache.get_many(["A  Dream", "unknown"])
+
+    np.testing.assert_array_equal(found[0], features(1.0))
+    assert found[1] is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TextFeatureCache("model", "tag", max_entries=2)
+    cache.put("first", features(1.0))
+    cache.put("second", features(2.0))
+    cache.get("first")
+    cache.put("third", features(3.0))
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert len(cache) == 2
+
+
+def test_persistent_tier_survives_a_new_instance(tmp_path):
+    db_path = str(tmp_path / "text.sqlite")
+    cache = TextFeatureCache("model", "tag", db_path=db_path)
+    cache.put("a journey home", features(0.5))
+    cache.close()
+
+    reopened = TextFeatureCache("model", "tag", db_path=db_path)
+    found = reopened.get("a journey home")
+
+    # Stored as float16 on disk.
+    np.testing.assert_allclose(found, features(0.5), atol=1e-3)
+    assert reopened.disk_hits == 1
+    reopened.close()
+
+
+def test_persistent_tier_is_keyed_by_model(tmp_path):
+    db_path = str(tmp_path / "text.sqlite")
+    cache = TextFeatureCache("model-a", "tag", db_path=db_path)
+    cache.put("clue", features(1.0))
+    cache.close()
+
+    other = TextFeatureCache("model-b", "tag", db_path=db_path)
+    assert other.get("clue") is None
+    other.close()
+
+
+def test_stats_estimate_time_saved():
+    cache = TextFeatureCache("model", "tag")
+    cache.record_encode_time(2.0, count=4)
+    cache.put("clue", features(1.0))
+    cache.get("clue")
+    cache.get("clue")
+
+    stats = cache.stats()
+
+    assert stats["hits"] == 2
+    assert stats["hit_rate"] == 1.0
+    assert stats["estimated_seconds_saved"] == pytest.approx(1.0)
@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+from abstractor import Abstractor
+from clue_bank import ClueBank
+from text_processor import TextProcessor
+
+STOP_WORDS = {"a", "an", "the", "of", "on", "in", "at", "and"}
+
+
+class FakeNLP:
+    """Stand-in spaCy pipeline: lowercases and strips a plural 's' as its lemmatizer."""
+
+    pipe_names = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]
+
+    def __init__(self):
+        self.pipe_calls = []
+
+    def _doc(self, text):
+        return [
+            SimpleNamespace(
+                lemma_=word.lower().rstrip("s") if len(word) > 3 else word.lower(),
+                is_alpha=word.isalpha(),
+                is_stop=word.lower() in STOP_WORDS,
+            )
+            for word in text.split()
+        ]
+
+    def pipe(self, texts, disable=(), batch_size=None):
+        texts = list(texts)
+        self.pipe_calls.append((texts, list(disable)))
+        return [self._doc(text) for text in texts]
+
+
+CAPTION = "a lighthouse on a cliff at night"
+
+
+def test_rank_clues_rejects_leaks_in_one_pipe_call():
+    nlp = FakeNLP()
+    processor = TextProcessor(nlp)
+
+    ranked = processor.rank_clues(
+        ["lighthouse night", "lonely watch", "the of", "cliffs of silence"],
+        CAPTION,
+        other_captions=["a cat asleep on a windowsill"],
+    )
+
+    # "lighthouse night" and "cliffs of silence" (cliff) leak; "the of" has no content words.
+    assert ranked == [("lonely watch", 0.0)]
+    assert len(nlp.pipe_calls) == 1
+    assert nlp.pipe_calls[0][1] == ["parser", "ner"]
+
+
+def test_rank_clues_prefers_clues_that_fit_other_cards_less():
+    processor = TextProcessor(FakeNLP())
+
+    ranked = processor.rank_clues(
+        ["sleeping cat", "distant signal"], CAPTION, other_captions=["a sleeping cat in the sun"]
+    )
+
+    assert [clue for clue, _ in ranked] == ["distant signal", "sleeping cat"]
+
+
+def test_caption_lemmas_are_reused_and_bounded():
+    nlp = FakeNLP()
+    processor = TextProcessor(nlp, max_caption_entries=2)
+
+    processor.rank_clues(["lonely watch"], CAPTION)
+    processor.rank_clues(["lonely watch"], CAPTION)
+    assert nlp.pipe_calls[1][0] == ["lonely watch"]
+
+    processor.rank_clues(["x"], "second caption")
+    processor.rank_clues(["x"], "third caption")
+    assert len(processor._caption_lemmas) == 2
+    assert CAPTION not in processor._caption_lemmas
+
+
+def test_source_candidate_maps_back_to_the_raw_candidate():
+    processor = TextProcessor(FakeNLP())
+    candidates = ["Quiet Harbor", "Echo of Echo"]
+    assert processor.source_candidate("echo of", candidates) == "Echo of Echo"
+    assert processor.source_candidate("unknown", ["other"]) == "unknown"
+
+
+def make_abstractor(tmp_path, bank_clues):
+    bank = ClueBank(str(tmp_path / "bank.sqlite"), seed=0)
+    abstractor = Abstractor(backend="local", clue_bank=bank, soft_deadline=None, hard_deadline=None)
+    bank.add(CAPTION, abstractor.model_name, abstractor.clue_params(), bank_clues)
+    return abstractor
+
+
+def test_candidate_clues_skip_drawn_bank_clues(tmp_path):
+    abstractor = make_abstractor(tmp_path, ["lonely light", "the last watch", "salt and stone"])
+
+    first = abstractor.candidate_clues(CAPTION, count=8)
+    abstractor.mark_used(CAPTION, first[1])
+    second = abstractor.candidate_clues(CAPTION, count=8)
+
+    banked = {"lonely light", "the last watch", "salt and stone"}
+    assert banked <= set(first)
+    # Only the clue marked as used left the bank.
+    assert first[1] not in second
+    assert banked - {first[1]} <= set(second)
+    assert len(second) == 8
+
+
+def test_candidate_clues_leave_the_bank_untouched(tmp_path):
+    abstractor = make_abstractor(tmp_path, ["lonely light", "the last watch"])
+    bank = abstractor.clue_bank
+    params = abstractor.clue_params()
+
+    for _ in range(3):
+        abstractor.candidate_clues(CAPTION, count=4)
+    assert sorted(bank.undrawn(CAPTION, abstractor.model_name, params)) == ["lonely light", "the last watch"]
+    assert abstractor.clue_sources["bank"] == 3
+
+
+def test_obfuscate_description_marks_the_chosen_clue(tmp_path):
+    abstractor = make_abstractor(tmp_path, ["lonely light", "the last watch"])
+    processor = TextProcessor(FakeNLP())
+
+    clue = processor.obfuscate_description(CAPTION, abstractor)
+
+    bank = abstractor.clue_bank
+    assert clue not in bank.undrawn(CAPTION, abstractor.model_name, abstractor.clue_params())
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ranking import top_k_indices
+from card_registry import CardRegistry
+from vector_index import FlatIndex, IVFIndex, index_from_registry, recall_at_k
+
+
+def random_unit_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_top_k_indices_returns_best_first():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]])
+    np.testing.assert_array_equal(top_k_indices(scores, 2), [[1, 3], [0, 1]])
+    np.testing.assert_array_equal(top_k_indices(scores[0]), [1, 3, 2, 0])
+    assert top_k_indices(scores, 0).shape == (2, 0)
+
+
+def test_flat_search_matches_brute_force():
+    embeddings = random_unit_vectors(50)
+    queries = random_unit_vectors(3, seed=1)
+    index = FlatIndex(embeddings)
+
+    scores, ids = index.search(queries, k=5)
+
+    expected = np.argsort(-(queries @ embeddings.T), axis=1)[:, :5]
+    np.testing.assert_array_equal(ids, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ embeddings.T, expected, axis=1), rtol=1e-6)
+
+
+def test_search_returns_card_ids_and_honours_subsets():
+    embeddings = random_unit_vectors(10)
+    card_ids = np.arange(100, 110)
+    index = FlatIndex(embeddings, card_ids)
+
+    _, ids = index.search(embeddings[3], k=1)
+    assert ids[0, 0] == 103
+
+    _, ids = index.search(embeddings[3], k=2, subset=np.array([105, 107]))
+    assert set(ids[0].tolist()) == {105, 107}
+
+
+@pytest.mark.parametrize("card_ids", [None, np.array([10, 20, 30])])
+def test_rows_for_rejects_unknown_ids(card_ids):
+    index = FlatIndex(random_unit_vectors(3), card_ids)
+    known = np.array([0, 2]) if card_ids is None else np.array([10, 30])
+    np.testing.assert_array_equal(index.rows_for(known), [0, 2])
+    with pytest.raises(KeyError):
+        index.rows_for(np.array([3]) if card_ids is None else np.array([15]))
+    with pytest.raises(KeyError):
+        index.rows_for(np.array([-1]) if card_ids is None else np.array([99]))
+
+
+def test_ivf_with_every_list_probed_is_exact():
+    embeddings = random_unit_vectors(200)
+    queries = random_unit_vectors(20, seed=2)
+    exact = FlatIndex(embeddings)
+    ivf = IVFIndex(embeddings, nlist=8, nprobe=8)
+
+    assert recall_at_k(ivf, exact, queries, k=5) == 1.0
+
+
+def test_ivf_recall_grows_with_nprobe():
+    embeddings = random_unit_vectors(400)
+    queries = random_unit_vectors(50, seed=3)
+    exact = FlatIndex(embeddings)
+    ivf = IVFIndex(embeddings, nlist=16, nprobe=1)
+
+    low = recall_at_k(ivf, exact, queries, k=5, nprobe=1)
+    high = recall_at_k(ivf, exact, queries, k=5, nprobe=8)
+    assert low <= high
+
+
+def test_vector_index_does_not_import_torch():
+    code = "import sys, vector_index; print('torch' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    assert result.stdout.strip() == "False", result.stderr
+
+
+def test_empty_ivf_index_returns_padding():
+    index = IVFIndex(np.zeros((0, 16), dtype=np.float32))
+
+    scores, ids = index.search(random_unit_vectors(2), k=3)
+    assert index.nlist == 0 and index.centroids.shape == (0, 16)
+    assert scores.shape == (2, 3) and np.isneginf(scores).all()
+    assert (ids == -1).all()
+
+
+def test_index_from_a_registry_without_indexed_cards():
+    registry = CardRegistry(["a.jpg", "b.jpg"])
+
+    index = index_from_registry(registry, kind="ivf")
+    assert len(index) == 0
+    assert (index.search(random_unit_vectors(1, dim=4), k=2)[1] == -1).all()
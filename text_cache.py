@@ -0,0 +1,189 @@
+import os
+import logging
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('text_cache')
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TEXT_CACHE_DB = "data/embeddings/text_features.sqlite"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text the way the CLIP tokenizer sees it.
+
+    The open_clip tokenizer lowercases and collapses whitespace, so texts that
+    differ only in case or spacing produce identical features.
+    """
+    return " ".join(text.split()).lower()
+
+
+class TextFeatureCache:
+    def __init__(
+        self,
+        model_name: str,
+        pretrained: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        db_path: Optional[str] = None
+    ):
+        """
+        Initialize a two-tier cache of text-tower features.
+
+        Args:
+            model_name: The open_clip model name the features belong to.
+            pretrained: The pretrained tag the features belong to.
+            max_entries: Capacity of the in-process LRU tier.
+            db_path: Optional SQLite file backing a persistent tier that survives restarts.
+        """
+        self.model_name = model_name
+        self.pretrained = pretrained
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._encode_seconds = 0.0
+        self._encoded_texts = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS text_features ("
+                "model TEXT NOT NULL, pretrained TEXT NOT NULL, text TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, features BLOB NOT NULL, "
+                "PRIMARY KEY (model, pretrained, text))"
+            )
+            self._db.commit()
+            logger.info(f"Text feature cache persisted to {db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open text feature cache {db_path}, using memory only: {e}")
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return cached float32 features for a text, or None on a miss."""
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up many texts at once; misses come back as None."""
+        keys = [normalize_text(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        pending = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                features = self._memory.get(key)
+                if features is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    results[i] = features
+                else:
+                    pending.append(i)
+
+            if pending and self._db is not None:
+                found = self._load_from_db({keys[i] for i in pending})
+                still_pending = []
+                for i in pending:
+                    features = found.get(keys[i])
+                    if features is not None:
+                        self.disk_hits += 1
+                        self._remember(keys[i], features)
+                        results[i] = features
+                    else:
+                        still_pending.append(i)
+                pending = still_pending
+
+            self.misses += len(pending)
+        return results
+
+    def put(self, text: str, features: np.ndarray):
+        """Store the features for a text in both tiers."""
+        self.put_many([text], [features])
+
+    def put_many(self, texts: List[str], features: List[np.ndarray]):
+        """Store features for many texts in both tiers."""
+        rows = []
+        with self._lock:
+            for text, feature in zip(texts, features):
+                key = normalize_text(text)
+                feature = np.asarray(feature, dtype=np.float32).reshape(-1)
+                self._remember(key, feature)
+                rows.append((self.model_name, self.pretrained, key, feature.shape[0],
+                             feature.astype(np.float16).tobytes()))
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO text_features VALUES (?, ?, ?, ?, ?)", rows
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to persist text features: {e}")
+
+    def record_encode_time(self, seconds: float, count: int = 1):
+        """Record time spent in the text tower for texts that missed the cache."""
+        self._encode_seconds += seconds
+        self._encoded_texts += count
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/eviction counters and the estimated text-tower time saved."""
+        per_text = self._encode_seconds / self._encoded_texts if self._encoded_texts else 0.0
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._memory),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "encode_seconds": self._encode_seconds,
+            "estimated_seconds_saved": (self.hits + self.disk_hits) * per_text,
+        }
+
+    def close(self):
+        """Close the persistent tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, features: np.ndarray):
+        self._memory[key] = features
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_db(self, keys) -> Dict[str, np.ndarray]:
+        keys = list(keys)
+        found = {}
+        try:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT text, features FROM text_features "
+                    f"WHERE model = ? AND pretrained = ? AND text IN ({placeholders})",
+                    [self.model_name, self.pretrained, *chunk]
+                ).fetchall()
+                for text, blob in rows:
+                    found[text] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read text features from cache: {e}")
+        return found
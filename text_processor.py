@@ -1,16 +1,43 @@
-import spacy
-from typing import Optional
-from abstractor import Abstractor
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import spacy
+    from abstractor import Abstractor
+
+# Pipeline components the rule-based English lemmatizer depends on; the rest
+# (parser, ner, ...) are disabled while validating clues.
+LEMMA_COMPONENTS = ("tok2vec", "tagger", "attribute_ruler", "lemmatizer")
+# A clue is rejected when more than this fraction of its content lemmas appear in its own caption.
+DEFAULT_MAX_OVERLAP = 0.34
+# Captions whose lemmas are kept between turns, least recently used evicted first.
+DEFAULT_CAPTION_LEMMA_ENTRIES = 4096
+
 
 class TextProcessor:
-    def __init__(self, nlp_model: Optional[spacy.language.Language] = None):
+    def __init__(
+        self,
+        nlp_model: Optional["spacy.language.Language"] = None,
+        max_caption_entries: int = DEFAULT_CAPTION_LEMMA_ENTRIES
+    ):
         """
         Initialize the TextProcessor with an NLP model.
 
         Args:
             nlp_model (Optional[spacy.language.Language]): A spaCy language model. Defaults to 'en_core_web_sm' if not provided.
+            max_caption_entries (int): Number of captions whose lemmas are cached.
         """
-        self.nlp = nlp_model or spacy.load("en_core_web_sm")
+        if nlp_model is None:
+            import spacy
+            nlp_model = spacy.load("en_core_web_sm")
+        self.nlp = nlp_model
+        self._disabled = [name for name in self.nlp.pipe_names if name not in LEMMA_COMPONENTS]
+        # Captions repeat across turns, so their lemmas are kept in a bounded LRU.
+        self.max_caption_entries = max_caption_entries
+        self._caption_lemmas: "OrderedDict[str, Set[str]]" = OrderedDict()
+        # Clue prefetch threads validate clues concurrently.
+        self._caption_lock = threading.Lock()
 
     def remove_repetitions(self, phrase: str) -> str:
         """
@@ -26,17 +53,123 @@ class TextProcessor:
         unique_words = dict.fromkeys(word.lower() for word in words)
         return " ".join(unique_words)
 
-    def obfuscate_description(self, description: str, abstractor: Abstractor) -> str:
+    def lemma_sets(self, texts: List[str]) -> List[Set[str]]:
+        """
+        Lemmatize many texts in one nlp.pipe batch and return each text's content lemmas.
+
+        Args:
+            texts (List[str]): The texts to lemmatize.
+
+        Returns:
+            List[Set[str]]: Lowercased lemmas of the alphabetic, non-stop-word tokens of each text.
+        """
+        return [
+            {token.lemma_.lower() for token in doc if token.is_alpha and not token.is_stop}
+            for doc in self.nlp.pipe(texts, disable=self._disabled, batch_size=64)
+        ]
+
+    @staticmethod
+    def overlap(clue_lemmas: Set[str], caption_lemmas: Set[str]) -> float:
+        """Return the fraction of a clue's content lemmas that also appear in a caption."""
+        if not clue_lemmas:
+            return 0.0
+        return len(clue_lemmas & caption_lemmas) / len(clue_lemmas)
+
+    def rank_clues(
+        self,
+        candidates: List[str],
+        caption: str,
+        other_captions: Optional[List[str]] = None,
+        max_overlap: float = DEFAULT_MAX_OVERLAP
+    ) -> List[Tuple[str, float]]:
+        """
+        Drop candidate clues that leak their card's caption and rank the survivors.
+
+        Candidates and any captions not seen before are lemmatized together in
+        a single nlp.pipe call. A clue survives when it has at least one content
+        word and at most `max_overlap` of its lemmas appear in `caption`.
+        Survivors are ordered by overlap with their own caption, then by how
+        many lemmas they share with the other cards' captions (a clue that also
+        describes another card in hand is less useful), then by input order.
+
+        Args:
+            candidates (List[str]): Candidate clues, best source first.
+            caption (str): The caption of the card the clue is for.
+            other_captions (Optional[List[str]]): Captions of the other cards in hand.
+            max_overlap (float): Largest accepted fraction of clue lemmas found in the caption.
+
+        Returns:
+            List[Tuple[str, float]]: (clue, overlap) pairs of the surviving clues, best first.
+        """
+        other_captions = [c for c in (other_captions or []) if c]
+        clues = list(dict.fromkeys(self.remove_repetitions(c) for c in candidates if c and c.strip()))
+        captions = list(dict.fromkeys([caption] + other_captions))
+        with self._caption_lock:
+            known = {c: self._caption_lemmas.get(c) for c in captions}
+        new_captions = [c for c in captions if known[c] is None]
+        lemmas = self.lemma_sets(clues + new_captions)
+        known.update(zip(new_captions, lemmas[len(clues):]))
+        self._remember_captions(known)
+
+        caption_lemmas = known[caption]
+        others = set().union(*(known[c] for c in other_captions)) if other_captions else set()
+        ranked = []
+        for order, (clue, clue_lemmas) in enumerate(zip(clues, lemmas)):
+            if not clue_lemmas:
+                continue
+            own = self.overlap(clue_lemmas, caption_lemmas)
+            if own > max_overlap:
+                continue
+            ranked.append((own, len(clue_lemmas & others), order, clue))
+        ranked.sort()
+        return [(clue, own) for own, _, _, clue in ranked]
+
+    def _remember_captions(self, lemmas_by_caption: dict):
+        with self._caption_lock:
+            for caption, lemmas in lemmas_by_caption.items():
+                self._caption_lemmas[caption] = lemmas
+                self._caption_lemmas.move_to_end(caption)
+            while len(self._caption_lemmas) > self.max_caption_entries:
+                self._caption_lemmas.popitem(last=False)
+
+    def source_candidate(self, clue: str, candidates: List[str]) -> str:
+        """Return the candidate that rank_clues turned into `clue`, or `clue` itself if none did."""
+        return next((c for c in candidates if c and self.remove_repetitions(c) == clue), clue)
+
+    def select_clue(
+        self,
+        candidates: List[str],
+        caption: str,
+        other_captions: Optional[List[str]] = None,
+        max_overlap: float = DEFAULT_MAX_OVERLAP
+    ) -> Optional[str]:
+        """Return the best candidate clue that doesn't leak its caption, or None if all are rejected."""
+        ranked = self.rank_clues(candidates, caption, other_captions, max_overlap)
+        return ranked[0][0] if ranked else None
+
+    def obfuscate_description(
+        self,
+        description: str,
+        abstractor: "Abstractor",
+        other_captions: Optional[List[str]] = None,
+        candidates: Optional[int] = None
+    ) -> str:
         """
-        Obfuscate a text description by generating a creative abstraction and processing it.
+        Obfuscate a text description by generating creative abstractions and keeping the best one.
 
         Args:
             description (str): The description to be obfuscated.
             abstractor (Abstractor): The Abstractor instance used to generate creative abstractions.
+            other_captions (Optional[List[str]]): Captions of the other cards in hand.
+            candidates (Optional[int]): Number of candidate clues to choose from. Defaults to the Abstractor's.
 
         Returns:
             str: The obfuscated and processed description.
         """
-        abstracted_phrase = abstractor.generate_creative_abstract(description)
-        processed_phrase = self.remove_repetitions(abstracted_phrase)
-        return processed_phrase
+        clues = abstractor.candidate_clues(description) if candidates is None else abstractor.candidate_clues(description, candidates)
+        best = self.select_clue(clues, description, other_captions)
+        if best is None:
+            # Every candidate leaked the caption; the first one is still the best available.
+            best = self.remove_repetitions(clues[0]) if clues else ""
+        abstractor.mark_used(description, self.source_candidate(best, clues))
+        return best
@@ -0,0 +1,264 @@
+import time
+import logging
+import argparse
+import numpy as np
+from typing import List, Optional, Tuple
+from ranking import top_k_indices
+
+logger = logging.getLogger('vector_index')
+
+DEFAULT_NPROBE = 8
+DEFAULT_KMEANS_ITERATIONS = 10
+# Subsets this small (a hand, the table) are always scored exactly.
+EXACT_SUBSET_SIZE = 1024
+
+
+def _as_queries(query: np.ndarray) -> np.ndarray:
+    query = np.asarray(query, dtype=np.float32)
+    return query[None, :] if query.ndim == 1 else query
+
+
+class FlatIndex:
+    def __init__(self, embeddings: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Exact inner-product index: every card is scored and argpartition picks the top k.
+
+        Args:
+            embeddings: (N, D) L2-normalized card embeddings.
+            ids: Card ID of each row (e.g. CardRegistry IDs). Defaults to the row number.
+        """
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.ids = np.arange(len(self.embeddings)) if ids is None else np.asarray(ids)
+        self._identity = ids is None
+        self._id_order = None if self._identity else np.argsort(self.ids, kind="stable")
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def rows_for(self, card_ids: np.ndarray) -> np.ndarray:
+        """Map card IDs to rows of the embedding matrix, raising KeyError for IDs not in the index."""
+        card_ids = np.asarray(card_ids)
+        if self._identity:
+            rows = card_ids
+            known = (card_ids >= 0) & (card_ids < len(self.ids))
+        elif len(self.ids):
+            positions = np.searchsorted(self.ids, card_ids, sorter=self._id_order)
+            rows = self._id_order[np.minimum(positions, len(self.ids) - 1)]
+            known = self.ids[rows] == card_ids
+        else:
+            rows, known = card_ids, np.zeros(card_ids.shape, dtype=bool)
+        if not known.all():
+            raise KeyError(f"Card IDs not in the index: {card_ids[~known].tolist()[:10]}")
+        return rows
+
+    def _search_rows(self, queries: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self.embeddings[rows].T
+        top = top_k_indices(scores, k)
+        return np.take_along_axis(scores, top, axis=-1), self.ids[rows[top]]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        subset: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the k best cards for each query vector.
+
+        Args:
+            query: (D,) or (M, D) L2-normalized text features.
+            k: Number of cards to return.
+            subset: Optional card IDs to restrict the search to, such as a hand or the table.
+
+        Returns:
+            (M, k) scores and (M, k) card IDs, best first.
+        """
+        queries = _as_queries(query)
+        if subset is not None:
+            return self._search_rows(queries, self.rows_for(subset), k)
+        scores = queries @ self.embeddings.T
+        top = top_k_indices(scores, k)
+        return np.take_along_axis(scores, top, axis=-1), self.ids[top]
+
+
+class IVFIndex(FlatIndex):
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: Optional[np.ndarray] = None,
+        nlist: Optional[int] = None,
+        nprobe: int = DEFAULT_NPROBE,
+        iterations: int = DEFAULT_KMEANS_ITERATIONS,
+        seed: int = 0
+    ):
+        """
+        Approximate inverted-file index in pure NumPy.
+
+        Cards are clustered with spherical k-means into `nlist` lists. A query
+        only scores the cards in its `nprobe` closest lists, so raising nprobe
+        trades speed for recall (nprobe == nlist is exact).
+
+        Args:
+            embeddings: (N, D) L2-normalized card embeddings.
+            ids: Card ID of each row. Defaults to the row number.
+            nlist: Number of clusters. Defaults to about sqrt(N).
+            nprobe: Lists searched per query.
+            iterations: k-means iterations.
+            seed: Seed for the k-means initialization.
+        """
+        super().__init__(embeddings, ids)
+        self.nlist = min(max(1, nlist or int(np.sqrt(len(self.embeddings)))), len(self.embeddings))
+        self.nprobe = nprobe
+        start_time = time.perf_counter()
+        if len(self.embeddings):
+            self.centroids, assignments = self._train(iterations, np.random.default_rng(seed))
+        else:
+            # Nothing to cluster: no lists, and search() only returns padding.
+            dim = self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+            self.centroids = np.zeros((0, dim), dtype=np.float32)
+            assignments = np.zeros(0, dtype=np.int64)
+        self._list_rows = np.argsort(assignments, kind="stable")
+        self._list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.nlist))])
+        logger.info(
+            f"IVF index built over {len(self)} cards with {self.nlist} lists "
+            f"in {time.perf_counter() - start_time:.2f} seconds."
+        )
+
+    def _assign(self, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(self.embeddings[start:start + chunk_size] @ centroids.T, axis=1)
+            for start in range(0, len(self.embeddings), chunk_size)
+        ]) if len(self.embeddings) else np.zeros(0, dtype=np.int64)
+
+    def _train(self, iterations: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        centroids = self.embeddings[rng.choice(len(self.embeddings), size=self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._assign(centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.embeddings)
+            counts = np.bincount(assignments, minlength=self.nlist)
+            # Reseed empty clusters with random cards.
+            empty = counts == 0
+            sums[empty] = self.embeddings[rng.choice(len(self.embeddings), size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return centroids, self._assign(centroids)
+
+    def _probe_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = top_k_indices(self.centroids @ query, nprobe)
+        return np.concatenate([
+            self._list_rows[self._list_offsets[i]:self._list_offsets[i + 1]] for i in lists
+        ])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        subset: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return approximately the k best cards for each query vector.
+
+        Small subsets are scored exactly; larger ones are intersected with the
+        probed lists. Rows with fewer than k candidates are padded with -inf
+        scores and -1 IDs.
+        """
+        queries = _as_queries(query)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        subset_rows = None if subset is None else self.rows_for(subset)
+        if subset_rows is not None and len(subset_rows) <= EXACT_SUBSET_SIZE:
+            return self._search_rows(queries, subset_rows, k)
+
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=self.ids.dtype)
+        if not self.nlist:
+            return all_scores, all_ids
+        for i, q in enumerate(queries):
+            rows = self._probe_rows(q, nprobe)
+            if subset_rows is not None:
+                rows = rows[np.isin(rows, subset_rows)]
+            scores, ids = self._search_rows(q[None, :], rows, k)
+            all_scores[i, :scores.shape[1]] = scores[0]
+            all_ids[i, :ids.shape[1]] = ids[0]
+        return all_scores, all_ids
+
+
+def index_from_registry(registry, kind: str = "flat", **kwargs) -> FlatIndex:
+    """
+    Build a "flat" or "ivf" index over every indexed card of a CardRegistry.
+
+    Card IDs in search results are registry IDs.
+    """
+    card_ids = np.flatnonzero(registry.embedding_rows >= 0)
+    if len(card_ids):
+        embeddings = registry.embeddings(card_ids)
+    else:
+        dim = registry.embedding_index.embeddings.shape[1] if registry.embedding_index is not None else 0
+        embeddings = np.zeros((0, dim), dtype=np.float32)
+    if kind == "ivf":
+        return IVFIndex(embeddings, card_ids, **kwargs)
+    if kind == "flat":
+        return FlatIndex(embeddings, card_ids)
+    raise ValueError(f"Unknown index kind {kind!r}; choose 'flat' or 'ivf'.")
+
+
+def query_clue(
+    index: FlatIndex,
+    similarity,
+    clue: str,
+    k: int = 5,
+    subset: Optional[np.ndarray] = None
+) -> List[Tuple[float, int]]:
+    """
+    Return the top-k (score, card ID) pairs for a clue, best first.
+
+    Args:
+        index: A FlatIndex or IVFIndex.
+        similarity: ImageTextSimilarity used to encode the clue (through its text cache).
+        clue: The clue text.
+        k: Number of cards to return.
+        subset: Optional card IDs to restrict the search to, such as a hand or the table.
+    """
+    query = similarity.encode_texts([clue]).cpu().numpy()
+    scores, ids = index.search(query, k, subset)
+    return [(float(score), int(card_id)) for score, card_id in zip(scores[0], ids[0]) if card_id >= 0]
+
+
+def recall_at_k(approximate: FlatIndex, exact: FlatIndex, queries: np.ndarray, k: int = 5, **search_kwargs) -> float:
+    """Fraction of the exact top-k cards that the approximate index also returns."""
+    _, expected = exact.search(queries, k)
+    _, found = approximate.search(queries, k, **search_kwargs)
+    hits = sum(len(np.intersect1d(e, f)) for e, f in zip(expected, found))
+    return hits / expected.size if expected.size else 1.0
+
+
+if __name__ == "__main__":
+    from card_registry import CardRegistry
+    from embedding_index import ImageEmbeddingIndex, DEFAULT_INDEX_DIR
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF index against exact search.")
+    parser.add_argument("--cards", default="data/images/cards")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    registry = CardRegistry.from_directory(args.cards, embedding_index=ImageEmbeddingIndex.load(args.index_dir))
+    flat = index_from_registry(registry, "flat")
+    ivf = index_from_registry(registry, "ivf")
+    # Card embeddings stand in for clue embeddings when measuring recall.
+    sample = np.random.default_rng(0).choice(len(flat), size=min(args.queries, len(flat)), replace=False)
+    queries = flat.embeddings[sample]
+
+    for name, search in [("flat", lambda: flat.search(queries, args.k))] + [
+        (f"ivf nprobe={n}", lambda n=n: ivf.search(queries, args.k, nprobe=n)) for n in args.nprobe
+    ]:
+        start = time.perf_counter()
+        search()
+        per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        nprobe = int(name.split("=")[1]) if "=" in name else None
+        recall = 1.0 if nprobe is None else recall_at_k(ivf, flat, queries, args.k, nprobe=nprobe)
+        logger.info(f"{name:<16} {per_query_ms:.3f} ms/query, recall@{args.k}={recall:.3f}")